@@ -11,6 +11,7 @@ TESTED_VERSIONS = ["2.6", "2.7"]
 PRIMARY_VERSION = "2.7"  # Used when only one version is tested
 import sys
 import json
+import asyncio
 import tempfile
 import shutil
 from pathlib import Path
@@ -70,6 +71,50 @@ def run_configurator(monkeypatch, capsys):
     return _run
 
 
+@pytest.fixture
+def packager():
+    """
+    Fixture making Packagers for a template version and platform.
+
+    Usage:
+        pkg = packager(primary_version, 'gcp-k8s')
+        pkg = packager(primary_version, 'gcp-k8s', cache_dir=tmp_path)
+    """
+    def _make(version, platform, cache_dir=None):
+        from trustgraph_configurator import Packager
+
+        return Packager(
+            version=None, template=version, platform=platform,
+            latest=False, latest_stable=False,
+            cache_dir=None if cache_dir is None else str(cache_dir),
+        )
+
+    return _make
+
+
+@pytest.fixture
+def fetch():
+    """
+    Fixture running a coroutine, which takes a test client, against a
+    fresh Api.
+
+    Usage:
+        result, api = fetch(requests)
+    """
+    def _fetch(requests):
+        from aiohttp.test_utils import TestClient, TestServer
+        from trustgraph_configurator.api import Api
+
+        async def run():
+            api = Api()
+            async with TestClient(TestServer(api.app)) as client:
+                return await requests(client), api
+
+        return asyncio.run(run())
+
+    return _fetch
+
+
 @pytest.fixture(scope="session")
 def golden_dir():
     """Path to the golden files directory."""
@@ -87,3 +87,82 @@ class TestCLIInterface:
                 '-O'
             ])
             assert code == 0, f"Failed for template {template}"
+
+    def test_split_platforms(self, run_configurator, test_config_dir,
+                             primary_version, tmp_path):
+        """Test -p with a platform list and --split writes a zip each."""
+        config_file = str(test_config_dir / "minimal.json")
+        output = tmp_path / "deploy.zip"
+
+        stdout, stderr, code = run_configurator([
+            '-t', primary_version,
+            '-p', 'docker-compose,minikube-k8s',
+            '-i', config_file,
+            '-o', str(output),
+            '--split',
+        ])
+        assert code == 0, stderr
+
+        assert (tmp_path / "deploy-docker-compose.zip").exists()
+        assert (tmp_path / "deploy-minikube-k8s.zip").exists()
+        assert not output.exists()
+
+    @pytest.mark.parametrize("compression", ["stored", "deflate:9"])
+    def test_compression(self, run_configurator, test_config_dir,
+                         primary_version, tmp_path, compression):
+        """Test -z writes a valid zip with the chosen compression."""
+        import zipfile
+
+        config_file = str(test_config_dir / "minimal.json")
+        output = tmp_path / "deploy.zip"
+
+        stdout, stderr, code = run_configurator([
+            '-t', primary_version,
+            '-i', config_file,
+            '-o', str(output),
+            '-z', compression,
+        ])
+        assert code == 0, stderr
+
+        with zipfile.ZipFile(output) as z:
+            assert z.testzip() is None
+            info = z.getinfo("docker-compose.yaml")
+
+        expected = zipfile.ZIP_STORED if compression == "stored" else \
+            zipfile.ZIP_DEFLATED
+        assert info.compress_type == expected
+
+    @pytest.mark.parametrize("compression,name", [
+        ("deflate", "deploy.zip"),
+        ("zstd", "deploy.tar.zst"),
+    ])
+    def test_default_output_extension(
+            self, run_configurator, test_config_dir, primary_version,
+            tmp_path, monkeypatch, compression, name
+    ):
+        """Test the default output is named for the archive format."""
+        if compression == "zstd":
+            pytest.importorskip("zstandard")
+
+        monkeypatch.chdir(tmp_path)
+
+        stdout, stderr, code = run_configurator([
+            '-t', primary_version,
+            '-i', str(test_config_dir / "minimal.json"),
+            '-z', compression,
+        ])
+        assert code == 0, stderr
+
+        assert [p.name for p in tmp_path.iterdir()] == [name]
+
+    def test_bad_compression(self, run_configurator, test_config_dir,
+                             primary_version, tmp_path):
+        """Test that an unknown -z setting fails."""
+        stdout, stderr, code = run_configurator([
+            '-t', primary_version,
+            '-i', str(test_config_dir / "minimal.json"),
+            '-o', str(tmp_path / "deploy.zip"),
+            '-z', 'gzip',
+        ])
+        assert code != 0
+        assert "compression" in stderr
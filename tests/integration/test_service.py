@@ -0,0 +1,150 @@
+"""
+Integration tests for the tg-config-svc service process.
+"""
+
+import json
+import signal
+import socket
+import subprocess
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start(port, workers):
+    return subprocess.Popen(
+        [
+            "tg-config-svc", "--port", str(port), "--workers",
+            str(workers), "--render-workers", "1", "--warm-up", "none",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def request(port, path, data=None, method="GET"):
+    """Status and body of a request, each on a new connection"""
+    req = urllib.request.Request(
+        f"http://127.0.0.1:{port}{path}", data=data, method=method,
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def wait_ready(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(
+                f"http://127.0.0.1:{port}/readyz", timeout=5
+            ) as resp:
+                return json.load(resp)
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.5)
+    raise TimeoutError("Service not ready")
+
+
+@pytest.mark.integration
+@pytest.mark.slow
+class TestService:
+    """Tests for running tg-config-svc."""
+
+    def test_workers_share_port(self, test_config_dir, primary_version):
+        """Test several server processes serve one port, and stop
+        cleanly on SIGTERM."""
+        config = (test_config_dir / "minimal.json").read_bytes()
+        port = free_port()
+
+        proc = start(port, 2)
+
+        try:
+
+            wait_ready(port)
+
+            for i in range(4):
+                req = urllib.request.Request(
+                    f"http://127.0.0.1:{port}/api/generate/"
+                    f"docker-compose/{primary_version}",
+                    data=config, method="POST",
+                )
+                with urllib.request.urlopen(req, timeout=60) as resp:
+                    assert resp.status == 200
+
+            proc.send_signal(signal.SIGTERM)
+            assert proc.wait(timeout=90) == 0
+
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+    def test_jobs_across_workers(self, test_config_dir, primary_version):
+        """Test a job created on one server process can be polled,
+        fetched and deleted through any of them, and that metrics are
+        scraped from all of them."""
+        config = (test_config_dir / "minimal.json").read_bytes()
+        port = free_port()
+
+        proc = start(port, 3)
+
+        try:
+
+            wait_ready(port)
+
+            status, body = request(
+                port, f"/api/jobs/docker-compose/{primary_version}",
+                data=config, method="POST",
+            )
+            assert status == 202
+            job = json.loads(body)
+
+            # Each poll is a new connection, spread across the servers
+            statuses = []
+            for i in range(600):
+                status, body = request(port, job["url"])
+                statuses.append(status)
+                if json.loads(body)["status"] in ("done", "failed"):
+                    break
+                time.sleep(0.1)
+
+            for i in range(6):
+                statuses.append(request(port, job["url"])[0])
+
+            assert set(statuses) == {200}
+            assert json.loads(body)["status"] == "done"
+
+            status, data = request(port, job["result"])
+            assert status == 200
+            assert data[:2] == b"PK"
+
+            assert request(port, job["url"], method="DELETE")[0] == 204
+            assert request(port, job["url"])[0] == 404
+
+            # Any server's scrape has every server's series
+            for i in range(3):
+                status, body = request(port, "/metrics")
+                assert status == 200
+                for index in range(3):
+                    assert (
+                        f'tg_config_render_limit{{server="{index}"}}'
+                        in body.decode("utf-8")
+                    )
+
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            try:
+                proc.wait(timeout=90)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
@@ -0,0 +1,87 @@
+"""
+Start-up benchmark for the console scripts.
+
+Each script's entry point is imported in a fresh interpreter, as the
+console script wrapper does, and must stay within its import-time
+budget and leave out the modules it has no use for.  Budgets are in
+CPU seconds, which a busy machine (or a parallel test run) inflates
+far less than wall time, with plenty of headroom over the measured
+times; pulling aiohttp or the Jsonnet VM back in where they aren't
+needed costs more than that.
+
+    python -X importtime -c \\
+        "from trustgraph_configurator import generate_deployment"
+
+shows where the time goes when a budget is exceeded.
+"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+
+# Console script -> (entry point, seconds, modules it must not import)
+BUDGETS = {
+    "tg-build-deployment": (
+        "generate_deployment", 0.25, ["aiohttp", "asyncio", "tabulate"],
+    ),
+    "tg-show-config-params": (
+        "list_templates", 0.25, ["aiohttp", "_gojsonnet", "yaml"],
+    ),
+    "tg-config-svc": (
+        "run_service", 0.35, ["aiohttp", "tabulate"],
+    ),
+}
+
+# Best of this many imports, to ride out a noisy machine
+RUNS = 5
+
+MEASURE = """
+import json, sys, time
+start = time.process_time()
+from trustgraph_configurator import {entry}
+print(json.dumps({{
+    "seconds": time.process_time() - start,
+    "modules": sorted(sys.modules),
+}}))
+"""
+
+
+def startup(entry):
+    """Import CPU time in seconds, and modules loaded, for an entry
+    point"""
+
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE.format(entry=entry)],
+        capture_output=True, text=True, check=True,
+    )
+
+    measured = json.loads(result.stdout)
+    return measured["seconds"], set(measured["modules"])
+
+
+@pytest.mark.integration
+class TestStartup:
+    """Import-time budgets for the console scripts."""
+
+    @pytest.mark.parametrize("script", list(BUDGETS))
+    def test_import_budget(self, script):
+        """Test the entry point imports within its budget."""
+        entry, budget, excluded = BUDGETS[script]
+
+        seconds = min(startup(entry)[0] for i in range(RUNS))
+
+        assert seconds < budget, (
+            f"{script} imports in {seconds:.3f}s, budget {budget}s"
+        )
+
+    @pytest.mark.parametrize("script", list(BUDGETS))
+    def test_excluded_modules(self, script):
+        """Test the entry point doesn't import modules it doesn't use."""
+        entry, budget, excluded = BUDGETS[script]
+
+        seconds, modules = startup(entry)
+
+        assert [m for m in excluded if m in modules] == []
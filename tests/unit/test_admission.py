@@ -0,0 +1,110 @@
+"""
+Unit tests for admission control.
+"""
+
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from trustgraph_configurator.admission import Admission, Saturated
+from trustgraph_configurator.api import Api
+
+
+@pytest.mark.unit
+class TestAdmission:
+    """Tests for the Admission class."""
+
+    def test_limit_queue_and_reject(self):
+        """Test that requests run up to the limit, then queue, then are
+        rejected."""
+
+        async def run():
+            admission = Admission(limit=2, queue=1)
+            release = asyncio.Event()
+            order = []
+
+            async def request(n):
+                async with admission.slot():
+                    order.append(n)
+                    await release.wait()
+
+            tasks = [asyncio.create_task(request(n)) for n in range(3)]
+            await asyncio.sleep(0.01)
+
+            assert order == [0, 1]
+            assert admission.stats()["running"] == 2
+            assert admission.stats()["waiting"] == 1
+
+            with pytest.raises(Saturated) as e:
+                await admission.acquire()
+            assert e.value.retry_after >= 1
+
+            release.set()
+            await asyncio.gather(*tasks)
+
+            assert order == [0, 1, 2]
+            return admission.stats()
+
+        stats = asyncio.run(run())
+
+        assert stats["running"] == 0
+        assert stats["admitted"] == 3
+        assert stats["queued"] == 1
+        assert stats["rejected"] == 1
+        assert stats["queue_seconds"] > 0
+
+    def test_cancelled_waiter_leaves_queue(self):
+        """Test that a cancelled wait frees its queue place."""
+
+        async def run():
+            admission = Admission(limit=1, queue=1)
+            await admission.acquire()
+
+            waiter = asyncio.create_task(admission.acquire())
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+
+            assert admission.stats()["waiting"] == 0
+            admission.release()
+            return admission.stats()
+
+        assert asyncio.run(run())["running"] == 0
+
+
+@pytest.mark.unit
+class TestApiAdmission:
+    """Tests for admission control in Api.generate."""
+
+    def test_saturated_returns_429(self, primary_version, test_config_dir):
+        """Test that a full queue gets 429 with Retry-After."""
+        config = (test_config_dir / "minimal.json").read_text()
+        url = f"/api/generate/docker-compose/{primary_version}"
+
+        async def run():
+            api = Api(max_renders=1, max_queued_renders=0)
+            async with TestClient(TestServer(api.app)) as client:
+                await api.admission.acquire()
+                resp = await client.post(url, data=config)
+                assert resp.status == 429
+                assert int(resp.headers["Retry-After"]) >= 1
+
+                api.admission.release()
+                resp = await client.post(url, data=config)
+                assert resp.status == 200
+
+        asyncio.run(run())
+
+    def test_body_too_large_returns_413(self, primary_version):
+        """Test that bodies over the limit are refused."""
+        url = f"/api/generate/docker-compose/{primary_version}"
+
+        async def run():
+            api = Api(max_body_bytes=100)
+            async with TestClient(TestServer(api.app)) as client:
+                resp = await client.post(url, data="[" + " " * 200 + "]")
+                assert resp.status == 413
+
+        asyncio.run(run())
@@ -2,6 +2,10 @@
 Unit tests for Index class.
 """
 
+import json
+import os
+import time
+
 import pytest
 from trustgraph_configurator import Index
 
@@ -36,3 +40,39 @@ class TestAPI:
         assert latest_stable is not None
         assert hasattr(latest_stable, 'name')
         assert hasattr(latest_stable, 'version')
+
+    def test_get_template(self):
+        """Test templates are looked up by name."""
+        latest = Index.get_latest()
+        assert Index.get_template(latest.name).name == latest.name
+        assert Index.get_template("no-such-template") is None
+
+    def test_loaded_once(self):
+        """Test the index is only re-read when it changes."""
+        assert Index.load() is Index.load()
+        assert Index.get_latest() is Index.get_latest()
+
+    def test_reload_on_change(self, tmp_path, monkeypatch):
+        """Test a changed index.json is re-read."""
+        # Index.path is set by the first load
+        Index.load()
+        index = json.loads(Index.path.read_text())
+        path = tmp_path / "index.json"
+        path.write_text(json.dumps(index))
+
+        monkeypatch.setattr(Index, "path", path)
+        monkeypatch.setattr(Index, "snapshot", None)
+
+        before = Index.get_latest()
+
+        index["templates"].append({
+            "name": "99.0", "description": "New", "version": "99.0.0",
+            "status": "stable",
+        })
+        path.write_text(json.dumps(index))
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+
+        assert Index.get_latest().version == "99.0.0"
+        assert Index.get_latest_stable().version == "99.0.0"
+        assert Index.get_template("99.0").description == "New"
+        assert before.version != "99.0.0"
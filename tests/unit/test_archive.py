@@ -0,0 +1,230 @@
+"""
+Unit tests for archive output.
+"""
+
+import asyncio
+import io
+import tarfile
+import time
+import zipfile
+
+import pytest
+
+from trustgraph_configurator import archive
+from trustgraph_configurator.archive import (
+    Compression, archive_bytes, build_async, stream_archive, write_archive
+)
+
+
+FILES = [
+    ("docker-compose.yaml", "services: {}\n"),
+    ("trustgraph/config.json", "{}"),
+    ("grafana/dashboard.json", "x" * 100000),
+    ("café.txt", "café"),
+]
+
+
+class Sink:
+    """File object recording each write"""
+
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+        return len(data)
+
+
+class Writer:
+    """Async sink recording each write"""
+
+    def __init__(self):
+        self.writes = []
+
+    async def write(self, data):
+        self.writes.append(data)
+
+
+def contents(data):
+    z = zipfile.ZipFile(io.BytesIO(data))
+    assert z.testzip() is None
+    return {name: z.read(name).decode("utf-8") for name in z.namelist()}
+
+
+@pytest.mark.unit
+class TestCompression:
+    """Tests for parsing compression settings."""
+
+    @pytest.mark.parametrize("spec,expected", [
+        (None, "stored"),
+        ("stored", "stored"),
+        ("deflate", "deflate:6"),
+        ("deflate:9", "deflate:9"),
+        ("zstd", "zstd:3"),
+        ("zstd:19", "zstd:19"),
+    ])
+    def test_parse(self, spec, expected):
+        """Test that settings parse, filling in default levels."""
+        if expected.startswith("zstd"):
+            pytest.importorskip("zstandard")
+        assert str(Compression(spec)) == expected
+
+    @pytest.mark.parametrize("spec", [
+        "gzip", "stored:1", "deflate:10", "deflate:x", "zstd:0",
+    ])
+    def test_bad(self, spec):
+        """Test that unknown methods and levels are rejected."""
+        with pytest.raises(RuntimeError):
+            Compression(spec)
+
+    def test_zstd_needs_package(self, monkeypatch):
+        """Test zstd is refused when zstandard can't be imported."""
+        monkeypatch.setattr(archive, "have_zstandard", lambda: False)
+        with pytest.raises(RuntimeError, match="zstandard"):
+            Compression("zstd")
+        assert str(Compression("deflate")) == "deflate:6"
+
+
+@pytest.mark.unit
+class TestArchive:
+    """Tests for writing archives of entries."""
+
+    @pytest.mark.parametrize("spec", ["stored", "deflate:1", "deflate:9"])
+    def test_zip(self, spec):
+        """Test that zips read back with zipfile."""
+        data = archive_bytes(FILES, Compression(spec))
+        assert contents(data) == dict(FILES)
+
+        method = zipfile.ZipFile(io.BytesIO(data)).getinfo(
+            "grafana/dashboard.json"
+        ).compress_type
+        expected = zipfile.ZIP_STORED if spec == "stored" else \
+            zipfile.ZIP_DEFLATED
+        assert method == expected
+
+    def test_stats(self):
+        """Test that stats record sizes and the compression ratio."""
+        built = archive.build(FILES, Compression("deflate"))
+        stats = built.stats()
+
+        assert stats["compression"] == "deflate:6"
+        assert stats["bytes"] == sum(
+            len(c.encode("utf-8")) for n, c in FILES
+        )
+        assert stats["compressed"] == len(b"".join(built.chunks()))
+        assert stats["ratio"] > 10
+        assert stats["seconds"] >= 0
+
+    def test_getvalue_keeps_one_copy(self):
+        """Test the parts are joined once and replaced by the result."""
+        built = archive.build(FILES, Compression("deflate"))
+        assert len(built.parts) == 2 * len(FILES) + 1
+
+        data = built.getvalue()
+
+        assert built.parts == [data]
+        assert built.getvalue() is data
+        assert list(built.chunks()) == [data]
+        assert contents(data) == dict(FILES)
+
+    def test_large_entries_use_pool(self, monkeypatch):
+        """Test that only large entries go to the thread pool."""
+        submitted = []
+        pool = archive.compression_pool()
+
+        class Pool:
+            def submit(self, fn, name, *args):
+                submitted.append(name)
+                return pool.submit(fn, name, *args)
+
+        monkeypatch.setattr(archive, "compression_pool", lambda: Pool())
+
+        data = archive_bytes(FILES, Compression("deflate"))
+
+        assert submitted == ["grafana/dashboard.json"]
+        assert contents(data) == dict(FILES)
+
+    def test_write_archive(self, tmp_path):
+        """Test writing to a file."""
+        path = tmp_path / "out.zip"
+        with open(path, "wb") as f:
+            write_archive(FILES, f, Compression("deflate"))
+        assert contents(path.read_bytes()) == dict(FILES)
+
+    def test_write_archive_streams(self):
+        """Test each entry is written as it is produced, not kept."""
+        sink = Sink()
+
+        written = write_archive(FILES, sink, Compression("deflate"))
+
+        assert len(sink.writes) == 2 * len(FILES) + 1
+        assert written.parts == []
+        assert written.compressed == len(b"".join(sink.writes))
+        assert written.stats()["bytes"] == sum(
+            len(c.encode("utf-8")) for n, c in FILES
+        )
+        assert contents(b"".join(sink.writes)) == dict(FILES)
+
+    @pytest.mark.parametrize("spec", ["stored", "deflate", "zstd"])
+    def test_reproducible(self, spec, monkeypatch):
+        """Test the same entries always give the same bytes."""
+        if spec == "zstd":
+            pytest.importorskip("zstandard")
+
+        first = archive_bytes(FILES, Compression(spec))
+        monkeypatch.setattr(time, "time", lambda: 2000000000.0)
+        assert archive_bytes(FILES, Compression(spec)) == first
+
+    def test_source_date_epoch(self, monkeypatch):
+        """Test entries are stamped with SOURCE_DATE_EPOCH if set."""
+        default = archive_bytes(FILES)
+        info = zipfile.ZipFile(io.BytesIO(default)).infolist()[0]
+        assert info.date_time == (1980, 1, 1, 0, 0, 0)
+
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+        data = archive_bytes(FILES)
+        info = zipfile.ZipFile(io.BytesIO(data)).infolist()[0]
+        assert info.date_time == (2023, 11, 14, 22, 13, 20)
+
+    def test_zstd(self):
+        """Test a zstd-compressed tar."""
+        zstandard = pytest.importorskip("zstandard")
+
+        data = archive_bytes(FILES, Compression("zstd"))
+        tar = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+        with tarfile.open(fileobj=io.BytesIO(tar)) as t:
+            assert {m.mtime for m in t.getmembers()} == {
+                archive.ZIP_EPOCH
+            }
+            assert {
+                m.name: t.extractfile(m).read().decode("utf-8")
+                for m in t.getmembers()
+            } == dict(FILES)
+
+    def test_zstd_write_archive(self, tmp_path):
+        """Test a zstd tar is streamed to the file."""
+        pytest.importorskip("zstandard")
+
+        path = tmp_path / "out.tar.zst"
+        with open(path, "wb") as f:
+            written = write_archive(FILES, f, Compression("zstd"))
+
+        assert written.parts == []
+        assert path.read_bytes() == archive_bytes(FILES, Compression("zstd"))
+
+    def test_stream_archive(self):
+        """Test that a built archive is streamed a part at a time."""
+
+        async def run():
+            built = await build_async(FILES, Compression("deflate"))
+            writer = Writer()
+            await stream_archive(built, writer)
+            return built, writer
+
+        built, writer = asyncio.run(run())
+
+        assert len(writer.writes) == 2 * len(FILES) + 1
+        data = b"".join(writer.writes)
+        assert len(data) == built.compressed
+        assert contents(data) == dict(FILES)
@@ -0,0 +1,176 @@
+"""
+Unit tests for single-artifact rendering and the artifact endpoints.
+"""
+
+import io
+import json
+import urllib.parse
+import zipfile
+
+import pytest
+import yaml
+
+from trustgraph_configurator.api import negotiate_format
+
+
+@pytest.mark.unit
+class TestRenderArtifact:
+    """Tests for Packager.render_artifact."""
+
+    def test_resources_match_archive(
+            self, packager, primary_version, test_config_dir
+    ):
+        """Test resources are the same as the archive's."""
+        config = (test_config_dir / "minimal.json").read_text()
+
+        pkg = packager(primary_version, "docker-compose")
+        data = pkg.generate(config)
+        archived = zipfile.ZipFile(io.BytesIO(data)).read(
+            "docker-compose.yaml"
+        )
+
+        pkg = packager(primary_version, "docker-compose")
+        resources = pkg.render_artifact(config, "resources")
+
+        assert resources.encode("utf-8") == archived
+
+    def test_runs_only_needed_renderers(
+            self, packager, primary_version, test_config_dir
+    ):
+        """Test only the platform renderer, and what it imports, run."""
+        config = (test_config_dir / "minimal.json").read_text()
+
+        pkg = packager(primary_version, "minikube-k8s")
+        pkg.render_artifact(config, "resources", "json")
+
+        renderers = [name for stage, name, seconds in pkg.timings]
+        assert "config-to-minikube-k8s.jsonnet" in renderers
+        assert "config-to-additionals.jsonnet" not in renderers
+        assert "config-to-platforms.jsonnet" not in renderers
+
+    def test_formats(self, packager, primary_version, test_config_dir):
+        """Test resources in YAML and JSON are the same data."""
+        config = (test_config_dir / "minimal.json").read_text()
+        pkg = packager(primary_version, "gcp-k8s")
+
+        as_yaml = yaml.safe_load(pkg.render_artifact(config, "resources"))
+        as_json = json.loads(
+            pkg.render_artifact(config, "resources", "json")
+        )
+
+        assert as_yaml == as_json
+
+    def test_bad_artifact(self, packager, primary_version, test_config_dir):
+        """Test unknown artifacts, formats and platforms raise."""
+        config = (test_config_dir / "minimal.json").read_text()
+        pkg = packager(primary_version, "docker-compose")
+
+        with pytest.raises(RuntimeError, match="Bad artifact"):
+            pkg.render_artifact(config, "everything")
+        with pytest.raises(RuntimeError, match="Bad format"):
+            pkg.render_artifact(config, "resources", "toml")
+
+        pkg = packager(primary_version, "bogus")
+        with pytest.raises(RuntimeError, match="Bad platform"):
+            pkg.render_artifact(config, "resources")
+
+
+@pytest.mark.unit
+class TestNegotiateFormat:
+    """Tests for Accept header negotiation."""
+
+    @pytest.mark.parametrize("accept,default,expected", [
+        (None, "yaml", "yaml"),
+        (None, "json", "json"),
+        ("*/*", "yaml", "yaml"),
+        ("application/json", "yaml", "json"),
+        ("application/yaml", "json", "yaml"),
+        ("text/yaml;q=0.5, application/json", "yaml", "json"),
+        ("application/json, application/x-yaml", "yaml", "yaml"),
+        ("text/html", "yaml", None),
+    ])
+    def test_negotiate(self, accept, default, expected):
+        """Test the preferred format is chosen."""
+        assert negotiate_format(accept, default) == expected
+
+
+@pytest.mark.unit
+class TestArtifactEndpoints:
+    """Tests for /api/resources, /api/tg-config and /api/additionals."""
+
+    def test_resources(self, fetch, primary_version, test_config_dir):
+        """Test resources in YAML, and JSON by content negotiation."""
+        config = (test_config_dir / "minimal.json").read_text()
+        url = f"/api/resources/gcp-k8s/{primary_version}"
+
+        async def requests(client):
+            as_yaml = await client.post(url, data=config)
+            as_json = await client.post(
+                url, data=config, headers={"Accept": "application/json"}
+            )
+            return (
+                as_yaml.headers["Content-Type"], await as_yaml.text(),
+                as_json.headers["Content-Type"], await as_json.text(),
+            )
+
+        (yaml_type, yaml_body, json_type, json_body), api = fetch(requests)
+
+        assert yaml_type.startswith("application/x-yaml")
+        assert json_type.startswith("application/json")
+        assert yaml.safe_load(yaml_body) == json.loads(json_body)
+
+    def test_tg_config_get(self, fetch, primary_version, test_config_dir):
+        """Test the TG config by GET, with the config in the query."""
+        config = (test_config_dir / "minimal.json").read_text()
+        url = f"/api/tg-config/{primary_version}?config=" + (
+            urllib.parse.quote(config)
+        )
+
+        async def requests(client):
+            first = await client.get(url)
+            body = await first.json()
+            again = await client.get(
+                url, headers={"If-None-Match": first.headers["ETag"]}
+            )
+            return first.status, body, again.status
+
+        (status, body, again), api = fetch(requests)
+
+        assert status == 200
+        assert isinstance(body, dict)
+        assert again == 304
+
+    def test_additionals(self, fetch, primary_version, test_config_dir):
+        """Test the additionals list, served from cache when repeated."""
+        config = (test_config_dir / "minimal.json").read_text()
+        url = f"/api/additionals/{primary_version}"
+
+        async def requests(client):
+            first = await client.post(url, data=config)
+            second = await client.post(url, data=config)
+            return await first.json(), await second.json()
+
+        (first, second), api = fetch(requests)
+
+        assert isinstance(first, list)
+        assert all("path" in item for item in first)
+        assert first == second
+        assert api.render_cache.stats()["hits"] == 1
+
+    @pytest.mark.parametrize("url,headers,status", [
+        ("/api/resources/all/{v}", {}, 400),
+        ("/api/resources/gcp-k8s/{v}", {"Accept": "text/html"}, 406),
+        ("/api/tg-config/{v}", {}, 400),
+    ])
+    def test_errors(self, fetch, url, headers, status, primary_version):
+        """Test multi-platform, unacceptable and missing configs."""
+
+        async def requests(client):
+            url_v = url.format(v=primary_version)
+            if "tg-config" in url:
+                return (await client.get(url_v)).status
+            return (await client.post(
+                url_v, data="[]", headers=headers
+            )).status
+
+        assert fetch(requests)[0] == status
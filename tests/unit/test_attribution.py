@@ -0,0 +1,119 @@
+"""
+Unit tests for per-component render cost attribution.
+"""
+
+import json
+
+import pytest
+
+from trustgraph_configurator.attribution import (
+    component_costs, count_resources, format_costs, labels
+)
+
+
+@pytest.mark.unit
+class TestAttributionHelpers:
+    """Tests for resource counting and component labels."""
+
+    @pytest.mark.parametrize("output, count", [
+        ({"apiVersion": "v1", "kind": "List", "items": [1, 2, 3]}, 3),
+        ({"$schema": "x", "resources": [1, 2]}, 2),
+        ({"services": {"a": {}, "b": {}}, "volumes": {"c": {}}}, 3),
+        ([1, 2], 2),
+    ])
+    def test_count_resources(self, output, count):
+        """Test each artifact shape is counted."""
+        assert count_resources(output) == count
+
+    def test_labels(self):
+        """Test repeated component names are numbered."""
+        entries = [{"name": "a"}, {"name": "b"}, {"name": "a"}, {}]
+        assert labels(entries) == ["a#1", "b", "a#2", "?"]
+
+
+@pytest.mark.unit
+class TestComponentCosts:
+    """Tests for component_costs."""
+
+    def test_all_components_added(
+            self, packager, primary_version, test_config_dir
+    ):
+        """Test every entry is measured, adding up to the full render."""
+        config = (test_config_dir / "complex-rag.json").read_text()
+        pkg = packager(primary_version, "docker-compose")
+
+        costs = component_costs(pkg, config)
+
+        names = [e["name"] for e in json.loads(config)]
+        rows = costs["components"]
+        assert sorted(r["component"] for r in rows) == sorted(names)
+        assert costs["unrendered"] == 0
+
+        full = json.loads(pkg.render_artifact(config, "resources", "json"))
+        assert costs["total"]["resources"] == count_resources(full)
+        assert sum(
+            r["incremental"]["resources"] for r in rows
+        ) == costs["total"]["resources"] - costs["baseline"]["resources"]
+
+        # Most expensive first
+        seconds = [r["incremental"]["seconds"] for r in rows]
+        assert seconds == sorted(seconds, reverse=True)
+
+    def test_isolated_errors_reported(
+            self, packager, primary_version, test_config_dir
+    ):
+        """Test entries which can't render alone report the error."""
+        config = (test_config_dir / "complex-rag.json").read_text()
+        pkg = packager(primary_version, "gcp-k8s")
+
+        costs = component_costs(pkg, config)
+        text = format_costs(costs)
+
+        failed = [
+            r for r in costs["components"] if "error" in r["isolated"]
+        ]
+        assert failed
+        assert "Alone: " in text
+        assert "All added:" in text
+
+    def test_disk_cache_bypassed(
+            self, packager, primary_version, test_config_dir, tmp_path
+    ):
+        """Test renders are measured, not read from or written to the
+        disk cache."""
+        config = (test_config_dir / "minimal.json").read_text()
+        pkg = packager(primary_version, "gcp-k8s", tmp_path)
+        pkg.render_artifact(config, "resources")
+        before = sorted(tmp_path.rglob("*.json"))
+
+        for n in range(2):
+            costs = component_costs(pkg, config)
+            assert costs["total"]["seconds"] > 0
+            assert all(
+                r["incremental"]["seconds"] != 0
+                for r in costs["components"]
+            )
+
+        assert sorted(tmp_path.rglob("*.json")) == before
+        assert pkg.disk_cache is not None
+
+    def test_rejects_multiple_platforms(
+            self, packager, primary_version, test_config_dir
+    ):
+        """Test resource attribution needs a single platform."""
+        config = (test_config_dir / "minimal.json").read_text()
+        pkg = packager(primary_version, "gcp-k8s,docker-compose")
+
+        with pytest.raises(RuntimeError):
+            component_costs(pkg, config)
+
+    def test_cli(self, run_configurator, primary_version, test_config_dir):
+        """Test --component-costs prints the table instead of building."""
+        stdout, stderr, code = run_configurator([
+            "-t", primary_version, "-p", "gcp-k8s", "--component-costs",
+            "-i", str(test_config_dir / "minimal.json"),
+        ])
+
+        assert code == 0
+        assert stdout.splitlines()[0].split()[:2] == ["component", "alone"]
+        assert "Empty config:" in stdout
@@ -0,0 +1,112 @@
+"""
+Unit tests for batch rendering.
+"""
+
+import json
+import zipfile
+
+import pytest
+
+from trustgraph_configurator.batch import load_batch, run_batch
+
+
+DEFAULTS = {
+    "template": None,
+    "version": None,
+    "platform": "docker-compose",
+    "latest": False,
+    "latest_stable": False,
+}
+
+
+@pytest.mark.unit
+class TestLoadBatch:
+    """Tests for reading batch inputs."""
+
+    def test_directory(self, test_config_dir, primary_version):
+        """Test that a directory yields one entry per .json file."""
+        defaults = {**DEFAULTS, "template": primary_version}
+        entries = load_batch(str(test_config_dir), defaults)
+
+        names = [e["name"] for e in entries]
+        assert "minimal" in names
+        assert names == sorted(names)
+        assert all(e["template"] == primary_version for e in entries)
+
+    def test_jsonl(self, tmp_path, test_config_dir):
+        """Test per-entry fields, inline configs and input paths."""
+        (tmp_path / "minimal.json").write_text(
+            (test_config_dir / "minimal.json").read_text()
+        )
+        batch = tmp_path / "batch.jsonl"
+        batch.write_text(
+            json.dumps({"name": "a", "input": "minimal.json",
+                        "platform": "eks-k8s"}) + "\n" +
+            "\n" +
+            json.dumps({"config": [], "template": "2.6"}) + "\n"
+        )
+
+        entries = load_batch(str(batch), {**DEFAULTS, "template": "2.7"})
+
+        assert len(entries) == 2
+        assert entries[0]["name"] == "a"
+        assert entries[0]["platform"] == "eks-k8s"
+        assert entries[0]["template"] == "2.7"
+        assert json.loads(entries[0]["config"])[0]["name"] == "openai"
+        assert entries[1]["name"] == "entry-3"
+        assert entries[1]["config"] == "[]"
+        assert entries[1]["template"] == "2.6"
+
+    def test_jsonl_duplicate_names(self, tmp_path):
+        """Test that duplicate entry names are rejected."""
+        batch = tmp_path / "batch.jsonl"
+        batch.write_text(
+            json.dumps({"name": "a", "config": []}) + "\n" +
+            json.dumps({"name": "a", "config": []}) + "\n"
+        )
+        with pytest.raises(RuntimeError, match="unique"):
+            load_batch(str(batch), DEFAULTS)
+
+    @pytest.mark.parametrize("name", ["../x", "a/b", "..", "", 7])
+    def test_jsonl_bad_names(self, tmp_path, name):
+        """Test names which would escape the output directory are
+        rejected."""
+        batch = tmp_path / "batch.jsonl"
+        batch.write_text(json.dumps({"name": name, "config": []}) + "\n")
+
+        with pytest.raises(RuntimeError, match="Bad name"):
+            load_batch(str(batch), DEFAULTS)
+
+
+@pytest.mark.unit
+class TestRunBatch:
+    """Tests for rendering a batch."""
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_successes_and_failures(
+            self, workers, tmp_path, test_config_dir, primary_version
+    ):
+        """Test that outputs and the summary record each entry."""
+        defaults = {**DEFAULTS, "template": primary_version}
+        config = (test_config_dir / "minimal.json").read_text()
+        entries = [
+            {**defaults, "name": "good", "config": config},
+            {**defaults, "name": "bad", "config": '[{"name": "bogus"}]'},
+        ]
+
+        summary = run_batch(entries, str(tmp_path), workers)
+
+        assert summary["succeeded"] == 1
+        assert summary["failed"] == 1
+
+        good, bad = summary["results"]
+        assert good["status"] == "ok"
+        assert bad["status"] == "error"
+        assert "bogus" in bad["error"]
+
+        names = zipfile.ZipFile(tmp_path / "good.zip").namelist()
+        assert "docker-compose.yaml" in names
+        assert not (tmp_path / "bad.zip").exists()
+
+        with open(tmp_path / "summary.json") as f:
+            assert json.load(f)["failed"] == 1
@@ -0,0 +1,189 @@
+"""
+Unit tests for packed template bundles.
+"""
+
+import importlib.resources
+import json
+import os
+import shutil
+
+import pytest
+
+from trustgraph_configurator.bundle import Bundle, pack, pack_all
+from trustgraph_configurator.packager import Packager
+from trustgraph_configurator.resolver import Resolver, current_bundle
+
+
+def tree(templates, resources):
+    """Write a small version's templates and resources"""
+    (templates / "engine").mkdir(parents=True)
+    resources.mkdir(parents=True)
+    (templates / "components.jsonnet").write_bytes(b"{}")
+    (resources / "dashboard.json").write_bytes(b"[]")
+    return templates, resources
+
+
+@pytest.mark.unit
+class TestBundle:
+    """Tests for bundle packing and loading."""
+
+    def test_round_trip(self, tmp_path):
+        """Test that packed files are read back unchanged."""
+        templates = tmp_path / "templates"
+        resources = tmp_path / "resources"
+        (templates / "engine").mkdir(parents=True)
+        resources.mkdir()
+
+        (templates / "components.jsonnet").write_bytes(b"{}")
+        (templates / "engine" / "noop.jsonnet").write_bytes(b"{ a: 1 }")
+        (resources / "dashboard.json").write_bytes(b"")
+
+        output = str(tmp_path / "test.tgb")
+        pack(str(templates), str(resources), output)
+
+        bundle = Bundle(output)
+        files = {name: bytes(content) for name, content in bundle.files()}
+
+        assert files == {
+            "templates/components.jsonnet": b"{}",
+            "templates/engine/noop.jsonnet": b"{ a: 1 }",
+            "resources/dashboard.json": b"",
+        }
+        assert set(bundle.dirs) == {
+            "templates", "templates/engine", "resources"
+        }
+
+    def test_bad_magic_rejected(self, tmp_path):
+        """Test that a file which is not a bundle is rejected."""
+        path = tmp_path / "bad.tgb"
+        path.write_bytes(b"\0" * 64)
+
+        with pytest.raises(RuntimeError, match="Bad template bundle"):
+            Bundle(str(path))
+
+    def test_bundle_resolver_matches_tree(
+            self, tmp_path, primary_version, test_config_dir
+    ):
+        """Test that rendering from a bundle matches the loose files."""
+        files = importlib.resources.files("trustgraph_configurator")
+        templates = files.joinpath("templates").joinpath(primary_version)
+        resources = files.joinpath("resources").joinpath(primary_version)
+
+        output = str(tmp_path / f"{primary_version}.tgb")
+        pack(str(templates), str(resources), output)
+
+        tree = Resolver(templates, resources)
+        bundled = Resolver(templates, resources, bundle=output)
+
+        assert bundled.dirs == tree.dirs
+        assert {
+            path: bytes(content) for path, content in bundled.files.items()
+        } == tree.files
+
+        config = (test_config_dir / "minimal.json").read_text()
+
+        def render(resolver):
+            pkg = Packager(
+                version=None,
+                template=primary_version,
+                platform="docker-compose",
+                latest=False,
+                latest_stable=False
+            )
+            pkg.resolver = resolver
+            pkg.config = config
+            return pkg.generate_resources(config)
+
+        assert render(bundled) == render(tree)
+
+    def test_stale_bundle_ignored(self, tmp_path):
+        """Test a bundle is only used while it matches the loose files,
+        or where they aren't installed."""
+        templates, resources = tree(
+            tmp_path / "templates", tmp_path / "resources"
+        )
+        output = str(tmp_path / "test.tgb")
+        pack(str(templates), str(resources), output)
+
+        assert current_bundle(output, templates, resources) == output
+
+        path = templates / "components.jsonnet"
+        path.write_bytes(b"{ a: 1 }")
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+        assert current_bundle(output, templates, resources) is None
+
+        missing = tmp_path / "missing"
+        assert current_bundle(output, missing, missing) == output
+        assert current_bundle(
+            str(tmp_path / "none.tgb"), templates, resources
+        ) is None
+
+    def test_prune(self, tmp_path):
+        """Test --prune removes only the packed version trees."""
+        tree(tmp_path / "templates" / "1.0", tmp_path / "resources" / "1.0")
+        (tmp_path / "templates" / "index.json").write_text("{}")
+        (tmp_path / "resources" / "dialog").mkdir()
+
+        pack_all(str(tmp_path), prune=True)
+
+        assert sorted(os.listdir(tmp_path / "templates")) == ["index.json"]
+        assert sorted(os.listdir(tmp_path / "resources")) == ["dialog"]
+
+        bundle = Bundle(str(tmp_path / "bundles" / "1.0.tgb"))
+        assert "templates/components.jsonnet" in bundle.index
+
+    @pytest.mark.parametrize("template", ["1.6", "1.7"])
+    def test_pruned_resources_fallback(
+            self, tmp_path, template, test_config_dir
+    ):
+        """Test a version with no additionals renderer still ships its
+        resource files when served from a pruned bundle."""
+        files = importlib.resources.files("trustgraph_configurator")
+
+        for top in ["templates", "resources"]:
+            shutil.copytree(
+                str(files.joinpath(top).joinpath(template)),
+                tmp_path / top / template,
+            )
+
+        pack_all(str(tmp_path), prune=True)
+
+        templates = tmp_path / "templates" / template
+        resources = tmp_path / "resources" / template
+        assert not resources.exists()
+
+        # minimal.json, with the 1.x names of its stores
+        config = json.dumps([
+            c for c in json.loads(
+                (test_config_dir / "minimal.json").read_text()
+            )
+            if c["name"] != "cassandra"
+        ] + [
+            { "name": "triple-store-cassandra", "parameters": {} },
+            { "name": "vector-store-qdrant", "parameters": {} },
+        ])
+
+        def render(pruned):
+            pkg = Packager(
+                version=f"{template}.0",
+                template=template,
+                platform="docker-compose",
+                latest=False,
+                latest_stable=False
+            )
+            if pruned:
+                pkg.templates = templates
+                pkg.resources = resources
+                pkg.resolver = Resolver(
+                    templates, resources,
+                    bundle=str(tmp_path / "bundles" / f"{template}.tgb"),
+                )
+            assert not pkg.has_renderer("config-to-additionals.jsonnet")
+            return dict(pkg.generate_files(config))
+
+        entries = render(pruned=True)
+
+        assert "prometheus/prometheus.yml" in entries
+        assert entries == render(pruned=False)
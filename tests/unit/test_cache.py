@@ -0,0 +1,264 @@
+"""
+Unit tests for the render cache.
+"""
+
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from trustgraph_configurator.api import Api
+from trustgraph_configurator.cache import (
+    RenderCache, SingleFlight, canonical_config, config_hash
+)
+
+
+@pytest.mark.unit
+class TestCanonicalConfig:
+    """Tests for config canonicalization."""
+
+    def test_key_order_is_ignored(self):
+        """Test that configs differing only in key order match."""
+        a = canonical_config('[{"name": "x", "parameters": {"a": 1, "b": 2}}]')
+        b = canonical_config('[{"parameters": {"b": 2, "a": 1}, "name": "x"}]')
+        assert a == b
+        assert config_hash(a) == config_hash(b)
+
+    def test_list_order_is_significant(self):
+        """Test that component order still distinguishes configs."""
+        a = canonical_config('[{"name": "x"}, {"name": "y"}]')
+        b = canonical_config('[{"name": "y"}, {"name": "x"}]')
+        assert config_hash(a) != config_hash(b)
+
+    def test_bad_json_raises(self):
+        """Test that non-JSON input is rejected."""
+        with pytest.raises(ValueError):
+            canonical_config('{ not: json }')
+
+
+@pytest.mark.unit
+class TestRenderCache:
+    """Tests for the RenderCache LRU."""
+
+    def test_hit_and_miss_counters(self):
+        """Test that lookups update hit and miss counters."""
+        cache = RenderCache()
+        key = RenderCache.key("2.7", "2.7.1", "docker-compose", "[]")
+
+        assert cache.get(key) is None
+        cache.put(key, b"zip")
+        assert cache.get(key) == b"zip"
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["entries"] == 1
+        assert stats["bytes"] == 3
+
+    def test_entry_limit_evicts_least_recently_used(self):
+        """Test that the oldest unused entry is evicted first."""
+        cache = RenderCache(max_entries=2)
+        cache.put("a", b"1")
+        cache.put("b", b"2")
+        cache.get("a")
+        cache.put("c", b"3")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1"
+        assert cache.get("c") == b"3"
+        assert cache.evictions == 1
+
+    def test_byte_limit_evicts(self):
+        """Test that the total size limit is enforced."""
+        cache = RenderCache(max_bytes=10)
+        cache.put("a", b"x" * 6)
+        cache.put("b", b"x" * 6)
+
+        assert cache.get("a") is None
+        assert cache.stats()["bytes"] == 6
+        assert cache.evictions == 1
+
+    def test_oversized_entry_not_cached(self):
+        """Test that an entry larger than the cache is skipped."""
+        cache = RenderCache(max_bytes=4)
+        cache.put("a", b"x" * 5)
+        assert cache.get("a") is None
+        assert cache.evictions == 0
+
+    def test_zero_entries_disables_cache(self):
+        """Test that max_entries=0 disables caching."""
+        cache = RenderCache(max_entries=0)
+        cache.put("a", b"1")
+        assert cache.get("a") is None
+
+
+@pytest.mark.unit
+class TestSingleFlight:
+    """Tests for coalescing identical in-flight calls."""
+
+    def test_concurrent_calls_share_one_run(self):
+        """Test that concurrent calls for a key run fn once."""
+
+        async def run():
+            flights = SingleFlight()
+            calls = []
+
+            async def fn():
+                calls.append(1)
+                await asyncio.sleep(0.01)
+                return b"zip"
+
+            results = await asyncio.gather(*[
+                flights.run("a", fn) for i in range(5)
+            ])
+            other = await flights.run("b", fn)
+            return flights, calls, results, other
+
+        flights, calls, results, other = asyncio.run(run())
+
+        assert results == [b"zip"] * 5
+        assert other == b"zip"
+        assert len(calls) == 2
+        assert flights.stats() == {
+            "in_flight": 0, "started": 2, "coalesced": 4
+        }
+
+    def test_errors_are_shared(self):
+        """Test that every waiter sees the error."""
+
+        async def run():
+            flights = SingleFlight()
+
+            async def fn():
+                await asyncio.sleep(0.01)
+                raise RuntimeError("Bad platform")
+
+            return await asyncio.gather(
+                *[flights.run("a", fn) for i in range(3)],
+                return_exceptions=True
+            )
+
+        results = asyncio.run(run())
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    def test_cancelled_waiter_does_not_cancel_flight(self):
+        """Test that other waiters still get the result."""
+
+        async def run():
+            flights = SingleFlight()
+
+            async def fn():
+                await asyncio.sleep(0.05)
+                return b"zip"
+
+            first = asyncio.create_task(flights.run("a", fn))
+            second = asyncio.create_task(flights.run("a", fn))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(run()) == b"zip"
+
+
+@pytest.mark.unit
+class TestApiRenderCache:
+    """Tests for render cache use in Api.generate."""
+
+    def test_identical_configs_render_once(
+            self, primary_version, test_config_dir
+    ):
+        """Test that a repeated config is served from the cache."""
+        config = (test_config_dir / "minimal.json").read_text()
+        url = f"/api/generate/docker-compose/{primary_version}"
+
+        async def run():
+            api = Api()
+            async with TestClient(TestServer(api.app)) as client:
+                first = await client.post(url, data=config)
+                second = await client.post(url, data=config)
+                assert first.status == 200
+                assert second.status == 200
+                assert await first.read() == await second.read()
+            return api.render_cache.stats()
+
+        stats = asyncio.run(run())
+        assert stats["misses"] == 1
+        assert stats["hits"] == 1
+
+    def test_concurrent_identical_configs_render_once(
+            self, primary_version, test_config_dir
+    ):
+        """Test that identical concurrent requests share a render."""
+        config = (test_config_dir / "minimal.json").read_text()
+        url = f"/api/generate/docker-compose/{primary_version}"
+
+        async def run():
+            api = Api()
+            async with TestClient(TestServer(api.app)) as client:
+                responses = await asyncio.gather(*[
+                    client.post(url, data=config) for i in range(4)
+                ])
+                bodies = [await r.read() for r in responses]
+                assert all(r.status == 200 for r in responses)
+                assert all(b == bodies[0] for b in bodies)
+            return api.flights.stats()
+
+        stats = asyncio.run(run())
+        assert stats["started"] == 1
+        assert stats["coalesced"] == 3
+
+    def test_compression_is_part_of_the_key(
+            self, primary_version, test_config_dir
+    ):
+        """Test the compression query parameter and its headers."""
+        config = (test_config_dir / "minimal.json").read_text()
+        url = f"/api/generate/docker-compose/{primary_version}"
+
+        async def run():
+            api = Api()
+            async with TestClient(TestServer(api.app)) as client:
+                stored = await client.post(url, data=config)
+                deflated = await client.post(
+                    url + "?compression=deflate:9", data=config
+                )
+                bad = await client.post(
+                    url + "?compression=gzip", data=config
+                )
+                assert stored.status == 200
+                assert deflated.status == 200
+                assert bad.status == 400
+                assert stored.headers["X-Compression"] == "stored"
+                assert deflated.headers["X-Compression"] == "deflate:9"
+                assert float(deflated.headers["X-Compression-Ratio"]) > 1
+                assert (
+                    len(await deflated.read()) <
+                    len(await stored.read())
+                )
+            return api.render_cache.stats()
+
+        stats = asyncio.run(run())
+        assert stats["misses"] == 2
+        assert stats["entries"] == 2
+
+    def test_zstd_without_package_is_bad_request(
+            self, primary_version, test_config_dir, monkeypatch
+    ):
+        """Test zstd without zstandard is refused before rendering."""
+        from trustgraph_configurator import archive
+
+        monkeypatch.setattr(archive, "have_zstandard", lambda: False)
+
+        config = (test_config_dir / "minimal.json").read_text()
+        url = f"/api/generate/docker-compose/{primary_version}"
+
+        async def run():
+            api = Api()
+            async with TestClient(TestServer(api.app)) as client:
+                resp = await client.post(
+                    url + "?compression=zstd", data=config
+                )
+                assert resp.status == 400
+            return api.render_cache.stats()
+
+        stats = asyncio.run(run())
+        assert stats["misses"] == 0
@@ -0,0 +1,196 @@
+"""
+Unit tests for the on-disk render cache.
+"""
+
+import io
+import json
+import os
+import time
+import zipfile
+
+import pytest
+
+from trustgraph_configurator.disk_cache import (
+    DiskCache, STALE_SECONDS, default_cache_dir
+)
+
+
+def key(config='{"a": 1}', **kwargs):
+    parts = {
+        "template": "2.8", "version": "2.8.1", "platform": "gcp-k8s",
+        "artifact": "resources", "tree": "abc",
+    }
+    parts.update(kwargs)
+    return DiskCache.key(config=config, **parts)
+
+
+def renderers(pkg):
+    return [name for stage, name, s in pkg.timings if stage == "jsonnet"]
+
+
+@pytest.mark.unit
+class TestDiskCache:
+    """Tests for DiskCache."""
+
+    def test_put_get(self, tmp_path):
+        """Test values round-trip, and misses return None."""
+        cache = DiskCache(str(tmp_path))
+
+        assert cache.get(key()) is None
+        cache.put(key(), {"services": [1, 2]})
+
+        assert cache.get(key()) == {"services": [1, 2]}
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_key(self):
+        """Test keys use the canonical config, and every part."""
+        assert key('{"a": 1, "b": 2}') == key('{ "b":2,"a":1 }')
+        assert key('{"a": 1}') != key('{"a": 2}')
+        assert key() != key(tree="def")
+        assert key() != key(platform="eks-k8s")
+        assert key() != key(artifact="tg-config")
+
+        with pytest.raises(ValueError):
+            key("not json")
+
+    def test_no_partial_entries(self, tmp_path):
+        """Test writes leave only complete entries behind."""
+        cache = DiskCache(str(tmp_path))
+
+        cache.put(key(), list(range(1000)))
+
+        files = [f for d, s, fs in os.walk(tmp_path) for f in fs]
+        assert files == [f"{key()}.json"]
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        """Test the oldest entries go once the size limit is passed."""
+        cache = DiskCache(str(tmp_path), max_bytes=250)
+        value = "x" * 98
+
+        for n in range(3):
+            cache.put(key(f'{{"n": {n}}}'), value)
+            # Distinct, increasing modification times
+            os.utime(
+                cache.entry_path(key(f'{{"n": {n}}}')),
+                (n * 10, n * 10),
+            )
+
+        assert cache.get(key('{"n": 0}')) is None
+        assert cache.get(key('{"n": 1}')) == value
+        assert cache.get(key('{"n": 2}')) == value
+        assert cache.stats()["evictions"] == 1
+
+    def test_scans_only_past_the_limit(self, tmp_path, monkeypatch):
+        """Test writes keep a running total, scanning the directory on
+        the first write and then only once it passes max_bytes."""
+        scans = []
+        entries = DiskCache.entries
+
+        def spy(self):
+            scans.append(1)
+            return entries(self)
+
+        monkeypatch.setattr(DiskCache, "entries", spy)
+
+        # Entries written by an earlier run are found by the first scan
+        DiskCache(str(tmp_path)).put(key('{"n": -1}'), "x" * 98)
+        scans.clear()
+
+        cache = DiskCache(str(tmp_path), max_bytes=550)
+        value = "x" * 98
+
+        for n in range(4):
+            cache.put(key(f'{{"n": {n}}}'), value)
+
+        # Replacing an entry doesn't grow the total
+        cache.put(key('{"n": 0}'), value)
+
+        assert len(scans) == 1
+        assert cache.size == 500 and cache.stats()["evictions"] == 0
+
+        cache.put(key('{"n": 4}'), value)
+
+        assert len(scans) == 2
+        assert cache.stats()["evictions"] == 1
+        assert cache.size == sum(e[1] for e in entries(cache)) == 500
+
+    def test_corrupt_entry_is_a_miss(self, tmp_path):
+        """Test an unreadable entry is treated as missing."""
+        cache = DiskCache(str(tmp_path))
+        cache.put(key(), [1])
+
+        with open(cache.entry_path(key()), "w") as f:
+            f.write("{")
+
+        assert cache.get(key()) is None
+
+    def test_stale_temporary_files_removed(self, tmp_path):
+        """Test temporary files left by a dead writer are cleaned up."""
+        cache = DiskCache(str(tmp_path))
+        cache.put(key(), [1])
+
+        stale = os.path.join(
+            os.path.dirname(cache.entry_path(key())), ".x.tmp"
+        )
+        open(stale, "w").close()
+        old = time.time() - STALE_SECONDS - 1
+        os.utime(stale, (old, old))
+
+        cache.entries()
+
+        assert not os.path.exists(stale)
+
+    def test_default_dir(self, monkeypatch):
+        """Test the default directory follows XDG_CACHE_HOME."""
+        monkeypatch.setenv("XDG_CACHE_HOME", "/var/cache/x")
+        assert default_cache_dir() == "/var/cache/x/trustgraph-configurator"
+
+
+@pytest.mark.unit
+class TestPackagerDiskCache:
+    """Tests for renders through the disk cache."""
+
+    def test_artifacts_reused(
+            self, packager, primary_version, test_config_dir, tmp_path
+    ):
+        """Test a second run reads renders instead of evaluating them."""
+        config = (test_config_dir / "minimal.json").read_text()
+
+        first = packager(primary_version, "gcp-k8s", tmp_path)
+        resources = first.render_artifact(config, "resources")
+        tg_config = first.render_artifact(config, "tg-config")
+
+        second = packager(primary_version, "gcp-k8s", tmp_path)
+        assert second.render_artifact(config, "resources") == resources
+        assert second.render_artifact(config, "tg-config") == tg_config
+        assert renderers(second) == []
+
+        changed = json.loads(config)
+        changed[0]["parameters"]["temperature"] = 0.1
+        second.render_artifact(json.dumps(changed), "tg-config")
+        assert renderers(second) != []
+
+    def test_deployment_matches_uncached(
+            self, packager, primary_version, test_config_dir, tmp_path
+    ):
+        """Test cached deployments are the same as uncached ones."""
+        config = (test_config_dir / "minimal.json").read_text()
+
+        def entries(data):
+            z = zipfile.ZipFile(io.BytesIO(data))
+            return [(n, z.read(n)) for n in z.namelist()]
+
+        for platform in ["docker-compose", "minikube-k8s,docker-compose"]:
+
+            uncached = packager(primary_version, platform).generate(config)
+
+            cold = packager(primary_version, platform, tmp_path)
+            cold_data = cold.generate(config)
+
+            warm = packager(primary_version, platform, tmp_path)
+            warm_data = warm.generate(config)
+
+            assert entries(cold_data) == entries(uncached)
+            assert entries(warm_data) == entries(uncached)
+            assert renderers(warm) == []
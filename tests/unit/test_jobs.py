@@ -0,0 +1,311 @@
+"""
+Unit tests for the render job store and the job API.
+"""
+
+import asyncio
+import io
+import time
+import zipfile
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from trustgraph_configurator.api import Api, peer_socket
+from trustgraph_configurator.jobs import (
+    DONE, FAILED, RUNNING, JobStore, StoreFull, progress_stage
+)
+
+
+@pytest.mark.unit
+class TestJobStore:
+    """Tests for JobStore."""
+
+    def test_finish(self):
+        """Test a job holds its result once finished."""
+        store = JobStore()
+        job = store.create("key")
+
+        store.finish(job, b"data", { "compression": "stored" })
+
+        assert store.get(job.id).status == DONE
+        assert store.get(job.id).data == b"data"
+        assert store.stats()["bytes"] == 4
+
+    def test_failed(self):
+        """Test a failed job records its error."""
+        store = JobStore()
+        job = store.create("key")
+
+        store.finish(job, error="Render failed")
+
+        assert job.status == FAILED
+        assert job.describe()["error"] == "Render failed"
+
+    def test_ttl_expires_finished_jobs(self):
+        """Test finished jobs are dropped after the TTL."""
+        store = JobStore(ttl=0.01)
+        job = store.create("key")
+        running = store.create("key")
+
+        store.finish(job, b"data")
+        time.sleep(0.02)
+
+        assert store.get(job.id) is None
+        assert store.get(running.id) is running
+        assert store.stats()["expired"] == 1
+        assert store.stats()["bytes"] == 0
+
+    def test_job_limit_evicts_oldest_finished(self):
+        """Test new jobs evict the oldest finished ones."""
+        store = JobStore(max_jobs=2)
+        first = store.create("a")
+        second = store.create("b")
+        store.finish(first, b"1")
+        store.finish(second, b"2")
+
+        third = store.create("c")
+
+        assert store.get(first.id) is None
+        assert store.get(second.id) is second
+        assert store.get(third.id) is third
+
+    def test_full_of_running_jobs(self):
+        """Test the store refuses jobs when all are unfinished."""
+        store = JobStore(max_jobs=1)
+        store.create("a")
+
+        with pytest.raises(StoreFull):
+            store.create("b")
+
+    def test_byte_limit(self):
+        """Test results are evicted to stay within the byte limit, and
+        results bigger than it fail."""
+        store = JobStore(max_bytes=10)
+        first = store.create("a")
+        second = store.create("b")
+        big = store.create("c")
+
+        store.finish(first, b"x" * 6)
+        store.finish(second, b"x" * 6)
+        store.finish(big, b"x" * 11)
+
+        assert store.get(first.id) is None
+        assert store.get(second.id).status == DONE
+        assert big.status == FAILED
+        assert store.stats()["bytes"] == 6
+
+
+@pytest.mark.unit
+class TestProgress:
+    """Tests for job progress through the render stages."""
+
+    def test_progress_stage(self):
+        """Test render stages map to job stages."""
+        assert progress_stage(
+            "jsonnet", "config-to-tg-configuration.jsonnet"
+        ) == "tg-config"
+        assert progress_stage(
+            "jsonnet", "config-to-additionals.jsonnet"
+        ) == "additionals"
+        assert progress_stage(
+            "jsonnet", "config-to-docker-compose.jsonnet"
+        ) == "resources"
+        assert progress_stage("yaml", "resources.yaml") == "resources"
+        assert progress_stage(
+            "json", "trustgraph/config.json"
+        ) == "tg-config"
+        assert progress_stage("json", "azuredeploy.json") == "resources"
+        assert progress_stage("archive", "stored") == "zip"
+
+    def test_nested_stages(self):
+        """Test a stage stays running until its outer step ends."""
+        store = JobStore()
+        job = store.create("key")
+
+        job.progress("jsonnet", "config-to-platforms.jsonnet", None)
+        job.progress("jsonnet", "config-to-k8s.jsonnet", None)
+        job.progress("jsonnet", "config-to-k8s.jsonnet", 0.5)
+
+        stage = job.describe()["stages"][0]
+        assert stage["status"] == RUNNING
+        assert stage["steps"] == 2
+
+        job.progress("jsonnet", "config-to-platforms.jsonnet", 1.0)
+
+        stage = job.describe()["stages"][0]
+        assert stage["status"] == DONE
+        assert stage["seconds"] == 1.0
+
+
+@pytest.mark.unit
+class TestJobApi:
+    """Tests for the /api/jobs endpoints."""
+
+    @pytest.mark.parametrize("workers", [0, 1])
+    def test_job_lifecycle(self, workers, primary_version, test_config_dir):
+        """Test a job runs in the background and its result is
+        fetched once done."""
+        config = (test_config_dir / "minimal.json").read_text()
+        url = f"/api/jobs/docker-compose/{primary_version}"
+
+        async def run():
+            api = Api(render_workers=workers)
+            async with TestClient(TestServer(api.app)) as client:
+
+                created = await client.post(url, data=config)
+                body = await created.json()
+                assert created.status == 202
+                assert created.headers["Location"] == body["url"]
+
+                for i in range(600):
+                    status = await (await client.get(body["url"])).json()
+                    if status["status"] in (DONE, FAILED):
+                        break
+                    await asyncio.sleep(0.1)
+
+                result = await client.get(body["result"])
+                data = await result.read()
+
+                deleted = await client.delete(body["url"])
+                gone = await client.get(body["url"])
+
+                return status, result.status, data, deleted.status, gone
+
+        status, result, data, deleted, gone = asyncio.run(run())
+
+        assert status["status"] == DONE
+        stages = { s["stage"]: s["status"] for s in status["stages"] }
+        assert stages["resources"] == DONE
+        assert stages["zip"] == DONE
+        assert result == 200
+        assert "docker-compose.yaml" in zipfile.ZipFile(
+            io.BytesIO(data)
+        ).namelist()
+        assert deleted == 204
+        assert gone.status == 404
+
+    def test_failed_job_result(self, primary_version):
+        """Test a failed job's result is 410 with its status, not a
+        server error."""
+        url = f"/api/jobs/docker-compose/{primary_version}"
+
+        async def run():
+            api = Api(render_workers=0)
+            async with TestClient(TestServer(api.app)) as client:
+
+                created = await client.post(
+                    url, data='[{"name": "bogus"}]'
+                )
+                body = await created.json()
+
+                for i in range(600):
+                    status = await (await client.get(body["url"])).json()
+                    if status["status"] in (DONE, FAILED):
+                        break
+                    await asyncio.sleep(0.1)
+
+                result = await client.get(body["result"])
+                return result.status, await result.json()
+
+        status, body = asyncio.run(run())
+
+        assert status == 410
+        assert body["status"] == FAILED
+        assert body["error"]
+
+    def test_bad_request(self, primary_version):
+        """Test a bad config is rejected before creating a job."""
+
+        async def run():
+            api = Api()
+            async with TestClient(TestServer(api.app)) as client:
+                resp = await client.post(
+                    f"/api/jobs/docker-compose/{primary_version}",
+                    data="not json",
+                )
+                return resp.status, api.jobs.stats()["jobs"]
+
+        assert asyncio.run(run()) == (400, 0)
+
+    def test_forwarded_to_owner(
+            self, tmp_path, primary_version, test_config_dir
+    ):
+        """Test requests for another server process's job are answered
+        by that process, over its peer socket."""
+        config = (test_config_dir / "minimal.json").read_text()
+        peers = { "peer_dir": str(tmp_path), "render_workers": 0 }
+
+        async def run():
+
+            owner = Api(**peers, server_index=1)
+            runner = web.AppRunner(owner.app)
+            await runner.setup()
+            await web.UnixSite(runner, peer_socket(str(tmp_path), 1)).start()
+
+            try:
+
+                # Create the job on the owner
+                connector = aiohttp.UnixConnector(
+                    path=peer_socket(str(tmp_path), 1)
+                )
+                async with aiohttp.ClientSession(connector=connector) as s:
+                    created = await s.post(
+                        f"http://peer/api/jobs/docker-compose/"
+                        f"{primary_version}",
+                        data=config,
+                    )
+                    body = await created.json()
+
+                # Follow it through another server
+                other = Api(**peers, server_index=0)
+                async with TestClient(TestServer(other.app)) as client:
+
+                    for i in range(600):
+                        status = await (
+                            await client.get(body["url"])
+                        ).json()
+                        if status["status"] in (DONE, FAILED):
+                            break
+                        await asyncio.sleep(0.1)
+
+                    result = await client.get(body["result"])
+                    data = await result.read()
+                    deleted = await client.delete(body["url"])
+                    gone = await client.get(body["url"])
+                    lost = await client.get("/api/jobs/7-nope")
+
+                    return (
+                        body["id"], status, result.status, data,
+                        deleted.status, gone.status, lost.status,
+                        other.jobs.stats()["jobs"],
+                    )
+
+            finally:
+                await runner.cleanup()
+
+        id, status, result, data, deleted, gone, lost, held = asyncio.run(
+            run()
+        )
+
+        assert id.startswith("1-")
+        assert status["status"] == DONE
+        assert result == 200
+        assert "docker-compose.yaml" in zipfile.ZipFile(
+            io.BytesIO(data)
+        ).namelist()
+        assert (deleted, gone, lost) == (204, 404, 404)
+        assert held == 0
+
+    def test_unknown_job(self):
+        """Test unknown job ids are 404."""
+
+        async def run():
+            api = Api()
+            async with TestClient(TestServer(api.app)) as client:
+                a = await client.get("/api/jobs/nope")
+                b = await client.get("/api/jobs/nope/result")
+                return a.status, b.status
+
+        assert asyncio.run(run()) == (404, 404)
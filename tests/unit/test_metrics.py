@@ -0,0 +1,239 @@
+"""
+Unit tests for the Prometheus metrics registry and /metrics endpoint.
+"""
+
+import asyncio
+import json
+import os
+import time
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from trustgraph_configurator import Index
+from trustgraph_configurator.api import Api, peer_socket
+from trustgraph_configurator.metrics import Registry, merge
+
+
+def samples(text):
+    """Parse exposition text to a dict of sample line -> value"""
+    result = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            result[name] = float(value)
+    return result
+
+
+@pytest.mark.unit
+class TestRegistry:
+    """Tests for counters, gauges and histograms."""
+
+    def test_counter(self):
+        """Test counter samples per label set."""
+        registry = Registry()
+        c = registry.counter("requests_total", "Requests", ("status",))
+        c.inc(status=200)
+        c.inc(2, status=200)
+        c.inc(status=500)
+
+        text = registry.render()
+
+        assert "# TYPE requests_total counter" in text
+        assert samples(text) == {
+            'requests_total{status="200"}': 3,
+            'requests_total{status="500"}': 1,
+        }
+        assert c.get(status=200) == 3
+
+    def test_callback_gauge(self):
+        """Test a gauge read when scraped."""
+        registry = Registry()
+        value = [1]
+        registry.gauge("depth", "Depth", fn=lambda: value[0])
+
+        assert samples(registry.render()) == {"depth": 1}
+        value[0] = 5
+        assert samples(registry.render()) == {"depth": 5}
+
+    def test_histogram(self):
+        """Test cumulative buckets, sum and count."""
+        registry = Registry()
+        h = registry.histogram(
+            "seconds", "Time", ("stage",), buckets=(0.1, 1)
+        )
+        h.observe(0.05, stage="yaml")
+        h.observe(0.5, stage="yaml")
+        h.observe(5, stage="yaml")
+
+        assert samples(registry.render()) == {
+            'seconds_bucket{stage="yaml",le="0.1"}': 1,
+            'seconds_bucket{stage="yaml",le="1"}': 2,
+            'seconds_bucket{stage="yaml",le="+Inf"}': 3,
+            'seconds_sum{stage="yaml"}': 5.55,
+            'seconds_count{stage="yaml"}': 3,
+        }
+        assert h.count(stage="yaml") == 3
+
+    def test_label_escaping(self):
+        """Test quotes and backslashes in label values are escaped."""
+        registry = Registry()
+        c = registry.counter("c", "C", ("name",))
+        c.inc(name='a"b\\c')
+
+        assert 'c{name="a\\"b\\\\c"} 1' in registry.render()
+
+    def test_merge(self):
+        """Test servers' metrics merge under one header per metric, each
+        sample labelled with its server."""
+
+        def rendered(n):
+            registry = Registry()
+            registry.counter("c", "C", ("status",)).inc(n, status=200)
+            registry.gauge("depth", "Depth", fn=lambda: n)
+            return registry.render()
+
+        text = merge([(0, rendered(1)), (1, rendered(2))])
+
+        assert text.count("# HELP c C") == 1
+        assert text.count("# TYPE depth gauge") == 1
+        assert samples(text) == {
+            'c{server="0",status="200"}': 1,
+            'c{server="1",status="200"}': 2,
+            'depth{server="0"}': 1,
+            'depth{server="1"}': 2,
+        }
+
+        # Each metric's samples follow its own header
+        lines = text.splitlines()
+        assert lines.index('depth{server="1"} 2') > lines.index(
+            "# TYPE depth gauge"
+        ) > lines.index('c{server="1",status="200"} 2')
+
+
+@pytest.mark.unit
+class TestMetricsEndpoint:
+    """Tests for /metrics in the API."""
+
+    def test_render_metrics(self, primary_version, test_config_dir):
+        """Test request, per-stage render and cache metrics."""
+        config = (test_config_dir / "minimal.json").read_text()
+        url = f"/api/generate/docker-compose/{primary_version}"
+
+        async def run():
+            api = Api()
+            async with TestClient(TestServer(api.app)) as client:
+                assert (await client.post(url, data=config)).status == 200
+                assert (await client.post(url, data=config)).status == 200
+                await client.post(
+                    "/api/generate/bogus/unknown", data=config
+                )
+                resp = await client.get("/metrics")
+                return resp.headers["Content-Type"], await resp.text()
+
+        content_type, text = asyncio.run(run())
+
+        assert content_type.startswith("text/plain; version=0.0.4")
+
+        s = samples(text)
+
+        endpoint = "/api/generate/{platform}/{template}"
+        assert s[
+            f'tg_config_requests_total{{endpoint="{endpoint}",'
+            f'template="{primary_version}",platform="docker-compose",'
+            f'status="200"}}'
+        ] == 2
+
+        # Unknown templates and platforms don't make new series
+        assert any(
+            'template="other",platform="other"' in k for k in s
+        )
+
+        assert s[
+            f'tg_config_render_seconds_count{{template="{primary_version}",'
+            f'platform="docker-compose"}}'
+        ] == 1
+
+        stages = [
+            k for k in s
+            if k.startswith("tg_config_render_stage_seconds_count")
+        ]
+        assert any('stage="jsonnet"' in k for k in stages)
+        assert any(
+            'stage="yaml",name="docker-compose.yaml"' in k for k in stages
+        )
+        assert any('stage="archive",name="stored"' in k for k in stages)
+
+        assert s["tg_config_render_cache_hits_total"] == 1
+        assert s["tg_config_render_cache_misses_total"] == 1
+        assert s["tg_config_render_cache_hit_ratio"] == 0.5
+        assert s["tg_config_renders_in_flight"] == 0
+        assert s["tg_config_render_queue_depth"] == 0
+
+    def test_metrics_across_servers(self, tmp_path):
+        """Test a scrape of one server process includes the others',
+        fetched over their peer sockets and labelled by server."""
+        peers = { "peer_dir": str(tmp_path), "render_workers": 0 }
+
+        async def run():
+
+            other = Api(**peers, server_index=1)
+            runner = web.AppRunner(other.app)
+            await runner.setup()
+            await web.UnixSite(runner, peer_socket(str(tmp_path), 1)).start()
+
+            try:
+                api = Api(**peers, server_index=0)
+                async with TestClient(TestServer(api.app)) as client:
+                    await client.get("/api/versions")
+                    merged = await (await client.get("/metrics")).text()
+                    local = await (
+                        await client.get("/metrics?local=1")
+                    ).text()
+                    return merged, local
+            finally:
+                await runner.cleanup()
+
+        merged, local = asyncio.run(run())
+
+        assert merged.count("# TYPE tg_config_requests_total counter") == 1
+
+        s = samples(merged)
+        assert s['tg_config_render_limit{server="0"}'] > 0
+        assert s['tg_config_render_limit{server="1"}'] > 0
+        assert any(
+            k.startswith('tg_config_requests_total{server="0",') and
+            'endpoint="/api/versions"' in k
+            for k in s
+        )
+
+        assert "server=" not in local
+
+    def test_template_labels_follow_index(self, tmp_path, monkeypatch):
+        """Test templates added to index.json become label values once
+        it is reloaded, and removed ones stop being."""
+        # Index.path is set by the first load
+        Index.load()
+        index = json.loads(Index.path.read_text())
+        path = tmp_path / "index.json"
+        path.write_text(json.dumps(index))
+
+        monkeypatch.setattr(Index, "path", path)
+        monkeypatch.setattr(Index, "snapshot", None)
+
+        api = Api(render_workers=0)
+        known = index["templates"][0]["name"]
+
+        assert api.template_label("99.0") == "other"
+        assert api.template_label(known) == known
+
+        index["templates"] = [{
+            "name": "99.0", "description": "New", "version": "99.0.0",
+            "status": "stable",
+        }]
+        path.write_text(json.dumps(index))
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+
+        assert api.template_label("99.0") == "99.0"
+        assert api.template_label(known) == "other"
@@ -2,6 +2,9 @@
 Unit tests for Packager class.
 """
 
+import io
+import zipfile
+
 import pytest
 from trustgraph_configurator.packager import Packager
 
@@ -58,3 +61,110 @@ class TestPackager:
                 latest=False,
                 latest_stable=False
             )
+
+
+@pytest.mark.unit
+class TestTrustGraphConfigMemo:
+    """Tests for the per-generation trustgraph/config.json memo."""
+
+    def _count_renders(self, pkg):
+        calls = []
+        original = pkg.process_renderer
+
+        def spy(name):
+            calls.append(name)
+            return original(name)
+
+        pkg.process_renderer = spy
+        return calls
+
+    def test_docker_compose_renders_tg_config_once(
+            self, packager, primary_version, test_config_dir
+    ):
+        """Test that one generate evaluates the tg-config renderer once."""
+        pkg = packager(primary_version, "docker-compose")
+        calls = self._count_renders(pkg)
+
+        config = (test_config_dir / "minimal.json").read_text()
+        pkg.generate(config)
+
+        assert calls.count("config-to-tg-configuration.jsonnet") == 1
+
+    def test_memo_follows_config(
+            self, packager, primary_version, test_config_dir
+    ):
+        """Test that changing the config invalidates the memo."""
+        pkg = packager(primary_version, "docker-compose")
+        calls = self._count_renders(pkg)
+
+        config = (test_config_dir / "minimal.json").read_text()
+        pkg.config = config
+        first = pkg.generate_trustgraph_config(config)
+        assert pkg.generate_trustgraph_config(config) is first
+
+        pkg.config = config + "\n"
+        pkg.generate_trustgraph_config(pkg.config)
+
+        assert calls.count("config-to-tg-configuration.jsonnet") == 2
+
+
+@pytest.mark.unit
+class TestMultiPlatform:
+    """Tests for rendering several platforms from one config."""
+
+    def _packager(self, template, platform):
+        return Packager(
+            version=None,
+            template=template,
+            platform=platform,
+            latest=False,
+            latest_stable=False
+        )
+
+    def test_select_all(self, primary_version):
+        """Test that "all" selects every platform the template supports."""
+        packager = self._packager(primary_version, "all")
+        platforms = packager.select_platforms()
+        assert "docker-compose" in platforms
+        assert "eks-k8s" in platforms
+
+    def test_select_list(self, primary_version):
+        """Test that a comma-separated list is split."""
+        packager = self._packager(primary_version, "docker-compose, eks-k8s")
+        assert packager.select_platforms() == ["docker-compose", "eks-k8s"]
+
+    def test_bad_platform_in_list(self, primary_version):
+        """Test that an unknown platform in a list is rejected."""
+        packager = self._packager(primary_version, "docker-compose,bogus")
+        with pytest.raises(RuntimeError, match="Bad platform"):
+            packager.generate('[]')
+
+    def test_multi_zip_matches_single_platforms(
+            self, primary_version, test_config_dir
+    ):
+        """Test that each platform directory matches a single render."""
+        config = (test_config_dir / "minimal.json").read_text()
+
+        multi = zipfile.ZipFile(io.BytesIO(
+            self._packager(
+                primary_version, "docker-compose,eks-k8s"
+            ).generate(config)
+        ))
+
+        for platform in ["docker-compose", "eks-k8s"]:
+            single = zipfile.ZipFile(io.BytesIO(
+                self._packager(primary_version, platform).generate(config)
+            ))
+            for name in single.namelist():
+                assert multi.read(f"{platform}/{name}") == single.read(name)
+
+    def test_generate_each(self, primary_version, test_config_dir):
+        """Test that generate_each returns one zip per platform."""
+        config = (test_config_dir / "minimal.json").read_text()
+        packager = self._packager(primary_version, "docker-compose,eks-k8s")
+
+        zips = packager.generate_each(config)
+
+        assert set(zips.keys()) == {"docker-compose", "eks-k8s"}
+        names = zipfile.ZipFile(io.BytesIO(zips["eks-k8s"])).namelist()
+        assert names == ["resources.yaml"]
@@ -0,0 +1,111 @@
+"""
+Unit tests for render profiling: Packager.profile, tg-build-deployment
+--profile and the X-Profile API header.
+"""
+
+import json
+
+import pytest
+
+from trustgraph_configurator.api import PROFILE_HEADER
+
+
+@pytest.mark.unit
+class TestPackagerProfile:
+    """Tests for Packager.profile."""
+
+    def test_profile(self, packager, primary_version, test_config_dir):
+        """Test a render's stages, imports and memory are reported."""
+        config = (test_config_dir / "minimal.json").read_text()
+        pkg = packager(primary_version, "docker-compose")
+
+        pkg.generate_files(config)
+        profile = pkg.profile()
+
+        stages = { (s["stage"], s["name"]) for s in profile["stages"] }
+        assert ("yaml", "docker-compose.yaml") in stages
+        assert ("json", "trustgraph/config.json") in stages
+        assert any(stage == "jsonnet" for stage, name in stages)
+
+        assert profile["template"] == primary_version
+        assert profile["fetches"] > 0
+        assert profile["fetched_bytes"] > 0
+        assert profile["process_peak_rss_bytes"] > 0
+        assert 0 <= profile["peak_rss_growth_bytes"] <= (
+            profile["process_peak_rss_bytes"]
+        )
+        assert profile["seconds"] >= sum(profile["totals"].values())
+
+    def test_nested_stages_counted_once(
+            self, packager, primary_version, test_config_dir
+    ):
+        """Test totals only count outermost stages."""
+        config = (test_config_dir / "minimal.json").read_text()
+        pkg = packager(primary_version, "minikube-k8s,docker-compose")
+
+        pkg.generate_files(config)
+        profile = pkg.profile()
+
+        outer = sum(
+            s["seconds"] for s in profile["stages"]
+            if s["stage"] == "jsonnet" and s["depth"] == 0
+        )
+        assert profile["totals"]["jsonnet"] == pytest.approx(outer)
+
+    def test_reset_per_render(
+            self, packager, primary_version, test_config_dir
+    ):
+        """Test each render starts a fresh profile."""
+        config = (test_config_dir / "minimal.json").read_text()
+        pkg = packager(primary_version, "gcp-k8s")
+
+        pkg.render_artifact(config, "tg-config")
+        first = pkg.profile()
+        pkg.render_artifact(config, "tg-config")
+        second = pkg.profile()
+
+        assert len(second["stages"]) == len(first["stages"])
+        assert second["fetches"] == first["fetches"]
+
+
+@pytest.mark.unit
+class TestProfileOutput:
+    """Tests for profiles from the CLI and the API."""
+
+    def test_cli_profile(
+            self, run_configurator, primary_version, test_config_dir
+    ):
+        """Test --profile writes the profile as JSON to stderr."""
+        stdout, stderr, code = run_configurator([
+            "-t", primary_version, "-p", "gcp-k8s", "-R", "--profile",
+            "-i", str(test_config_dir / "minimal.json"),
+        ])
+
+        assert code == 0
+        assert "resources.yaml" in json.dumps(json.loads(stderr))
+        assert "kind:" in stdout
+
+    @pytest.mark.parametrize("url", [
+        "/api/generate/docker-compose/{v}",
+        "/api/resources/gcp-k8s/{v}",
+    ])
+    def test_api_profile(self, fetch, url, primary_version, test_config_dir):
+        """Test the profile header renders afresh and reports it."""
+        config = (test_config_dir / "minimal.json").read_text()
+        url = url.format(v=primary_version)
+
+        async def requests(client):
+            plain = await client.post(url, data=config)
+            await plain.read()
+            profiled = await client.post(
+                url, data=config, headers={ PROFILE_HEADER: "1" }
+            )
+            await profiled.read()
+            return plain, profiled
+
+        (plain, profiled), api = fetch(requests)
+
+        assert PROFILE_HEADER not in plain.headers
+        profile = json.loads(profiled.headers[PROFILE_HEADER])
+        assert any(s["stage"] == "jsonnet" for s in profile["stages"])
+        assert profiled.headers["Cache-Control"] == "no-store"
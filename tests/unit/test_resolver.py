@@ -0,0 +1,73 @@
+"""
+Unit tests for the template import resolver.
+"""
+
+import builtins
+import os
+
+import pytest
+
+from trustgraph_configurator.packager import Packager
+from trustgraph_configurator.resolver import Resolver
+
+
+@pytest.mark.unit
+class TestResolver:
+    """Tests for the Resolver class."""
+
+    def test_shared_per_template(self, primary_version):
+        """Test that one resolver is shared per template version."""
+        assert Resolver.get(primary_version) is Resolver.get(primary_version)
+
+    def test_resolves_relative_import(self, primary_version):
+        """Test that a relative import resolves to a normalized path."""
+        resolver = Resolver.get(primary_version)
+        dir = os.path.join(resolver.templates, "renderers") + "/"
+
+        path, content = resolver.resolve(dir, "../components.jsonnet")
+
+        assert path == os.path.join(resolver.templates, "components.jsonnet")
+        with open(path, "rb") as f:
+            assert content == f.read()
+
+    def test_falls_back_to_template_root(self, primary_version):
+        """Test that imports fall back to the template root directory."""
+        resolver = Resolver.get(primary_version)
+        dir = os.path.join(resolver.templates, "renderers") + "/"
+
+        path, content = resolver.resolve(dir, "components.jsonnet")
+
+        assert path == os.path.join(resolver.templates, "components.jsonnet")
+
+    def test_unknown_file_is_none(self, primary_version):
+        """Test that unresolvable imports return None."""
+        resolver = Resolver.get(primary_version)
+        assert resolver.resolve("", "no-such-file.jsonnet") is None
+
+    def test_repeat_render_does_no_file_io(
+            self, primary_version, test_config_dir, monkeypatch
+    ):
+        """Test that a warm resolver serves renders without disk reads."""
+        config = (test_config_dir / "minimal.json").read_text()
+
+        def packager():
+            return Packager(
+                version=None,
+                template=primary_version,
+                platform="docker-compose",
+                latest=False,
+                latest_stable=False
+            )
+
+        # Warm the resolver
+        packager().generate(config)
+
+        pkg = packager()
+
+        def no_open(*args, **kwargs):
+            raise AssertionError(f"Unexpected open: {args[0]}")
+
+        monkeypatch.setattr(builtins, "open", no_open)
+        monkeypatch.setattr(os.path, "isfile", no_open)
+
+        assert len(pkg.generate(config)) > 0
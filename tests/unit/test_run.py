@@ -60,3 +60,47 @@ class TestRun:
             generate_deployment()
 
         assert exc_info.value.code == 1
+
+    def test_batch_summary_empty_error(
+            self, run_configurator, monkeypatch, tmp_path
+    ):
+        """Test the batch summary prints an error with no message."""
+        from trustgraph_configurator import batch
+
+        def run_batch(entries, output_dir, workers, cache):
+            return {
+                "succeeded": 0, "failed": 1, "seconds": 0.1,
+                "results": [
+                    {"name": "a", "status": "error", "error": "",
+                     "seconds": 0.1},
+                ],
+            }
+
+        monkeypatch.setattr(batch, "run_batch", run_batch)
+
+        jsonl = tmp_path / "batch.jsonl"
+        jsonl.write_text('{"name": "a", "config": []}\n')
+
+        stdout, stderr, code = run_configurator([
+            '--batch', str(jsonl), '--output-dir', str(tmp_path),
+        ])
+
+        assert code == 1
+        assert "error  a 0.10s: unknown error" in stdout
+
+    @pytest.mark.parametrize("option", ["--profile", "--component-costs"])
+    def test_batch_rejects_single_render_reports(
+            self, run_configurator, option, tmp_path
+    ):
+        """Test options reporting on one render are refused in batch
+        mode rather than ignored."""
+        jsonl = tmp_path / "batch.jsonl"
+        jsonl.write_text('{"name": "a", "config": []}\n')
+
+        stdout, stderr, code = run_configurator([
+            '--batch', str(jsonl), '--output-dir', str(tmp_path), option,
+        ])
+
+        assert code == 2
+        assert f"{option} can't be used with --batch" in stderr
+        assert not (tmp_path / "a.zip").exists()
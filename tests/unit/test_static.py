@@ -0,0 +1,228 @@
+"""
+Unit tests for static resources, ETags and conditional requests.
+"""
+
+import asyncio
+import gzip
+
+import pytest
+
+from trustgraph_configurator.static import (
+    ENCODERS, Resource, ResourceStore, etag
+)
+
+
+@pytest.mark.unit
+class TestResourceStore:
+    """Tests for the ResourceStore class."""
+
+    def test_loads_tree(self, tmp_path):
+        """Test that files load with content types and ETags."""
+        (tmp_path / "docs").mkdir()
+        (tmp_path / "flow.yaml").write_text("a: 1\n")
+        (tmp_path / "docs" / "x.md").write_text("# X\n")
+
+        store = ResourceStore(tmp_path)
+
+        assert store.get("flow.yaml").content_type == "application/x-yaml"
+        assert store.get("docs/x.md").content_type == "text/markdown"
+        assert store.get("docs/x.md").etag == etag(b"# X\n")
+        assert store.get("missing") is None
+
+    def test_etag_is_strong_and_stable(self):
+        """Test ETag format and determinism."""
+        assert etag("a", "b") == etag(b"a", b"b")
+        assert etag("a", "b") != etag("ab")
+        assert etag("a").startswith('"') and not etag("a").startswith("W/")
+
+
+@pytest.mark.unit
+class TestConditionalRequests:
+    """Tests for ETag and If-None-Match handling in the API."""
+
+    @pytest.mark.parametrize("url", [
+        "/api/dialog-flow",
+        "/api/config-prepare",
+        "/api/docs-manifest",
+        "/api/versions",
+        "/api/latest",
+    ])
+    def test_get_revalidates(self, fetch, url):
+        """Test that a matching If-None-Match gets 304."""
+
+        async def requests(client):
+            first = await client.get(url)
+            tag = first.headers["ETag"]
+            body = await first.read()
+
+            second = await client.get(url, headers={"If-None-Match": tag})
+            weak = await client.get(
+                url, headers={"If-None-Match": f'"x", W/{tag}'}
+            )
+            other = await client.get(url, headers={"If-None-Match": '"x"'})
+
+            return first, body, second, weak, other
+
+        first, body, second, weak, other = fetch(requests)[0]
+
+        assert first.status == 200
+        assert len(body) > 0
+        assert "max-age" in first.headers["Cache-Control"]
+        assert second.status == 304
+        assert second.headers["ETag"] == first.headers["ETag"]
+        assert weak.status == 304
+        assert other.status == 200
+
+    def test_docs_fragment(self, fetch):
+        """Test docs fragments and missing paths."""
+
+        async def requests(client):
+            manifest = await client.get("/api/docs-manifest")
+            missing = await client.get("/api/docs/no/such.md")
+            traversal = await client.get("/api/docs/../index.json")
+            return manifest, missing, traversal
+
+        manifest, missing, traversal = fetch(requests)[0]
+        assert manifest.headers["Content-Type"].startswith(
+            "application/x-yaml"
+        )
+        assert missing.status == 404
+        assert traversal.status == 404
+
+    def test_generate_not_modified(
+            self, fetch, primary_version, test_config_dir
+    ):
+        """Test that a generated archive revalidates without
+        rendering."""
+        config = (test_config_dir / "minimal.json").read_text()
+        url = f"/api/generate/docker-compose/{primary_version}"
+
+        async def requests(client):
+            first = await client.post(url, data=config)
+            tag = first.headers["ETag"]
+
+            second = await client.post(
+                url, data=config, headers={"If-None-Match": tag}
+            )
+            changed = await client.post(
+                url + "?compression=deflate", data=config,
+                headers={"If-None-Match": tag}
+            )
+            return first, second, changed
+
+        first, second, changed = fetch(requests)[0]
+
+        assert first.status == 200
+        assert first.headers["Cache-Control"] == "private, no-cache"
+        assert second.status == 304
+        assert changed.status == 200
+        assert changed.headers["ETag"] != first.headers["ETag"]
+
+    @pytest.mark.parametrize("compression", ["stored", "deflate"])
+    def test_generate_etag_is_strong(
+            self, fetch, compression, primary_version, test_config_dir
+    ):
+        """Test a re-render, e.g. after the render cache drops the
+        archive, sends the same bytes under the same ETag."""
+        config = (test_config_dir / "minimal.json").read_text()
+        url = (
+            f"/api/generate/docker-compose/{primary_version}"
+            f"?compression={compression}"
+        )
+
+        async def requests(client):
+            response = await client.post(url, data=config)
+            return response.headers["ETag"], await response.read()
+
+        # A fresh Api each time, so nothing is served from a cache
+        first = fetch(requests)[0]
+        second = fetch(requests)[0]
+
+        assert second == first
+
+    def test_generate_etag_follows_deploy(
+            self, primary_version, monkeypatch
+    ):
+        """Test the ETag covers the template tree and the package
+        version, so a deploy which changes the output without a version
+        bump doesn't leave clients revalidating a stale archive."""
+        from trustgraph_configurator import api
+        from trustgraph_configurator.cache import RenderCache
+
+        key = RenderCache.key(
+            primary_version, "0.0.0", "docker-compose", "[]", "stored"
+        )
+
+        def tag(digest=None):
+            a = api.Api()
+            if digest is not None:
+                a.template_digests[primary_version] = digest
+            return asyncio.run(a.archive_etag(key))
+
+        first = tag()
+        assert tag() == first
+        assert tag("edited") != first
+
+        monkeypatch.setattr(api, "__version__", "99.0.0")
+        assert tag() != first
+
+
+@pytest.mark.unit
+class TestContentEncoding:
+    """Tests for serving pre-compressed resource variants."""
+
+    def test_select(self):
+        """Test Accept-Encoding negotiation."""
+        resource = Resource(b"x" * 1000, "text/plain")
+        first = next(iter(ENCODERS))
+
+        assert resource.select(None)[0] is None
+        assert resource.select("identity")[0] is None
+        assert resource.select("gzip")[0] == "gzip"
+        assert resource.select("gzip;q=0")[0] is None
+        assert resource.select("*")[0] == first
+        assert resource.select("deflate, gzip;q=0.5")[0] == "gzip"
+
+        encoding, body, tag = resource.select("gzip")
+        assert gzip.decompress(body) == resource.body
+        assert tag != resource.etag
+        assert tag in resource.etags()
+
+    def test_incompressible_has_no_variants(self):
+        """Test that variants are only kept when smaller."""
+        assert Resource(b"x", "text/plain").variants == {}
+
+    def test_gzip_response(self, fetch):
+        """Test that the API serves the gzip variant."""
+
+        async def requests(client):
+            plain = await client.get(
+                "/api/dialog-flow",
+                headers={"Accept-Encoding": "identity"}, auto_decompress=False,
+            )
+            gzipped = await client.get(
+                "/api/dialog-flow",
+                headers={"Accept-Encoding": "gzip"}, auto_decompress=False,
+            )
+            revalidated = await client.get(
+                "/api/dialog-flow",
+                headers={
+                    "Accept-Encoding": "gzip",
+                    "If-None-Match": plain.headers["ETag"],
+                },
+            )
+            return (
+                plain, await plain.read(), gzipped, await gzipped.read(),
+                revalidated,
+            )
+
+        plain, plain_body, gzipped, gzipped_body, revalidated = \
+            fetch(requests)[0]
+
+        assert "Content-Encoding" not in plain.headers
+        assert gzipped.headers["Content-Encoding"] == "gzip"
+        assert gzipped.headers["Vary"] == "Accept-Encoding"
+        assert len(gzipped_body) < len(plain_body)
+        assert gzip.decompress(gzipped_body) == plain_body
+        assert gzipped.headers["ETag"] != plain.headers["ETag"]
+        assert revalidated.status == 304
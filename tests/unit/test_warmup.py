@@ -0,0 +1,124 @@
+"""
+Unit tests for warm-up renders and the health endpoints.
+"""
+
+import asyncio
+import json
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from trustgraph_configurator import Index
+from trustgraph_configurator.api import Api
+from trustgraph_configurator.workers import RenderPool
+from trustgraph_configurator.warmup import (
+    DEFAULT_CONFIG, select_templates, warm_up_jobs
+)
+
+
+@pytest.mark.unit
+class TestWarmUpJobs:
+    """Tests for selecting the warm-up set."""
+
+    def test_select_templates(self):
+        """Test latest / latest-stable resolve, without duplicates."""
+        latest = Index.get_latest().name
+        stable = Index.get_latest_stable().name
+
+        assert select_templates("latest,latest-stable") == (
+            [latest] if latest == stable else [latest, stable]
+        )
+        assert select_templates(f"{latest},latest") == [latest]
+        assert select_templates("none") == []
+        assert select_templates("") == []
+
+    def test_unknown_template_raises(self):
+        """Test an unknown template is an error."""
+        with pytest.raises(RuntimeError, match="not known"):
+            select_templates("no-such-template")
+
+    def test_all_platforms(self):
+        """Test "all" covers every platform the template renders."""
+        jobs = warm_up_jobs("latest", "all")
+
+        platforms = [j["platform"] for j in jobs]
+        assert "docker-compose" in platforms
+        assert "minikube-k8s" in platforms
+        assert len(platforms) == len(set(platforms))
+
+        assert json.loads(jobs[0]["config"]) == json.loads(
+            json.dumps(DEFAULT_CONFIG)
+        )
+
+    def test_custom_config(self, test_config_dir):
+        """Test a supplied config is used, in canonical form."""
+        config = (test_config_dir / "minimal.json").read_text()
+
+        jobs = warm_up_jobs("latest", "docker-compose", config)
+
+        assert len(jobs) == 1
+        assert jobs[0]["config"] == json.dumps(
+            json.loads(config), sort_keys=True
+        )
+
+
+@pytest.mark.unit
+class TestWarmUp:
+    """Tests for warming up the render pool and readiness."""
+
+    def test_worker_ready_after_warm_up(self):
+        """Test workers take renders only once warm."""
+        jobs = warm_up_jobs("latest", "docker-compose")
+
+        async def run():
+            pool = RenderPool(workers=1, warm_up=jobs)
+            pool.start()
+            try:
+                assert not pool.stats()["ready"]
+                await asyncio.wait_for(pool.ready.wait(), 60)
+                archive = await pool.render(jobs[0])
+                return pool.stats(), archive
+            finally:
+                pool.stop()
+
+        stats, archive = asyncio.run(run())
+
+        assert stats["ready"]
+        assert stats["idle"] == 1
+        assert stats["warm_up_seconds"] > 0
+        assert archive.compressed > 0
+
+    def test_health_endpoints(self):
+        """Test /healthz and /readyz report 503 until warm."""
+
+        async def run():
+            api = Api(warm_up="latest", warm_up_platforms="docker-compose")
+            async with TestClient(TestServer(api.app)) as client:
+                before = await client.get("/readyz")
+                before_body = await before.json()
+                await asyncio.wait_for(api.render_pool.ready.wait(), 60)
+                health = await client.get("/healthz")
+                ready = await client.get("/readyz")
+                return before.status, before_body, health, ready
+
+        status, body, health, ready = asyncio.run(run())
+
+        assert status == 503
+        assert body["status"] == "warming"
+        assert body["warm_up_renders"] == 1
+        assert health.status == 200
+        assert ready.status == 200
+
+    def test_no_warm_up_is_ready(self):
+        """Test the service is ready at once with no warm-up set."""
+
+        async def run():
+            api = Api()
+            async with TestClient(TestServer(api.app)) as client:
+                resp = await client.get("/readyz")
+                return resp.status, await resp.json()
+
+        status, body = asyncio.run(run())
+
+        assert status == 200
+        assert body["warm_up_renders"] == 0
@@ -0,0 +1,98 @@
+"""
+Unit tests for render worker processes.
+"""
+
+import asyncio
+import io
+import zipfile
+
+import pytest
+
+from trustgraph_configurator.workers import RenderPool, RenderTimeout
+
+
+def job(config, primary_version, platform="docker-compose"):
+    return {
+        "template": primary_version,
+        "platform": platform,
+        "config": config,
+        "compression": "deflate",
+    }
+
+
+@pytest.mark.unit
+class TestRenderPool:
+    """Tests for RenderPool."""
+
+    @pytest.mark.parametrize("workers", [0, 1])
+    def test_render(self, workers, test_config_dir, primary_version):
+        """Test that a render returns an archive, and errors raise."""
+        config = (test_config_dir / "minimal.json").read_text()
+
+        async def run():
+            pool = RenderPool(workers=workers, timeout=60)
+            pool.start()
+            try:
+                archive = await pool.render(job(config, primary_version))
+                with pytest.raises(RuntimeError, match="Bad platform"):
+                    await pool.render(
+                        job(config, primary_version, "bogus")
+                    )
+                return archive
+            finally:
+                pool.stop()
+
+        archive = asyncio.run(run())
+
+        assert archive.stats()["compression"] == "deflate:6"
+        names = zipfile.ZipFile(
+            io.BytesIO(b"".join(archive.chunks()))
+        ).namelist()
+        assert "docker-compose.yaml" in names
+
+    def test_timeout_replaces_worker(self, test_config_dir, primary_version):
+        """Test that an overrunning render is killed, and the pool
+        recovers."""
+        config = (test_config_dir / "complex-rag.json").read_text()
+
+        async def run():
+            pool = RenderPool(workers=1, timeout=0.001)
+            pool.start()
+            try:
+                first = pool.all[0].process
+                with pytest.raises(RenderTimeout):
+                    await pool.render(job(config, primary_version))
+                assert not first.is_alive()
+                assert len(pool.all) == 1
+
+                pool.timeout = 60
+                return await pool.render(job(config, primary_version))
+            finally:
+                pool.stop()
+
+        archive = asyncio.run(run())
+        assert archive.compressed > 0
+
+    def test_recycle_after(self, test_config_dir, primary_version):
+        """Test a worker is replaced after its share of renders."""
+        config = (test_config_dir / "minimal.json").read_text()
+
+        async def run():
+            pool = RenderPool(workers=1, timeout=60, recycle_after=2)
+            pool.start()
+            try:
+                await pool.ready.wait()
+                first = pool.all[0].process
+                for i in range(3):
+                    await pool.render(job(config, primary_version))
+                first.join(10)
+                return first, pool.all[0].process, pool.stats()
+            finally:
+                pool.stop()
+
+        first, current, stats = asyncio.run(run())
+
+        assert not first.is_alive()
+        assert first.exitcode == 0
+        assert current is not first
+        assert stats["recycled"] == 1
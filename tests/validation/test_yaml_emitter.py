@@ -0,0 +1,87 @@
+"""
+Conformance tests for YAML emission: the libyaml and pure-Python dumpers
+must produce identical, valid output.
+"""
+
+import pytest
+import sys
+import yaml
+from pathlib import Path
+
+# Add parent directory to path for validators import
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from validators import docker_compose, kubernetes
+
+from trustgraph_configurator import Packager
+from trustgraph_configurator.emitter import CDumper, PythonDumper, dump
+
+
+def render_resources(platform, config_file, version):
+    packager = Packager(
+        version=None, template=version, platform=platform,
+        latest=False, latest_stable=False,
+    )
+    config = config_file.read_text()
+    packager.config = config
+    return packager.generate_resources(config)
+
+
+@pytest.mark.validation
+@pytest.mark.skipif(CDumper is None, reason="PyYAML built without libyaml")
+@pytest.mark.parametrize("platform,validate", [
+    ("docker-compose", docker_compose.validate_docker_compose_manifest),
+    ("minikube-k8s", kubernetes.validate_kubernetes_manifest),
+    ("eks-k8s", kubernetes.validate_kubernetes_manifest),
+])
+@pytest.mark.parametrize("config", [
+    "minimal.json", "complex-rag.json", "cloud-aws.json",
+])
+def test_dumpers_are_byte_identical(
+        platform, validate, config, test_config_dir, primary_version
+):
+    """Test that both dumpers emit the same bytes, and that the output
+    is valid and round-trips."""
+    data = render_resources(
+        platform, test_config_dir / config, primary_version
+    )
+
+    fast = dump(data, CDumper)
+    slow = dump(data, PythonDumper)
+
+    assert fast == slow
+    assert yaml.safe_load(fast) == data
+
+    is_valid, errors = validate(fast)
+
+    if not is_valid:
+        error_msg = "\n".join(errors)
+        pytest.fail(f"Semantic validation failed for {config}:\n{error_msg}")
+
+
+@pytest.mark.validation
+@pytest.mark.parametrize("dumper", [
+    pytest.param(
+        CDumper, id="libyaml",
+        marks=pytest.mark.skipif(CDumper is None, reason="No libyaml"),
+    ),
+    pytest.param(PythonDumper, id="python"),
+])
+def test_scalars_round_trip(dumper):
+    """Test scalars which need quoting or escaping."""
+    data = {
+        "bools": ["true", "false", "yes", "on", True, False],
+        "numbers": ["1", "1.5", "0x10", "1e3", 1, 1.5, -2],
+        "nulls": ["null", "~", "", None],
+        "text": [
+            "a: b", "- item", "# comment", "'quoted'", '"quoted"',
+            "line one\nline two\n", "  leading", "trailing  ",
+            "tab\there", "café", "x" * 500 + " " + "y" * 500,
+        ],
+        "empty": {"list": [], "dict": {}},
+        "z": {"nested": [{"b": 1, "a": [2, 3]}]},
+    }
+
+    out = dump(data, dumper)
+
+    assert yaml.safe_load(out) == data
+    assert out == dump(data, PythonDumper)
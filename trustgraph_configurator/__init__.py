@@ -1,10 +1,36 @@
 
 __version__ = "0.0.0"
 
-from . generator import Generator
-from . packager import Packager
-from . index import Index
-from . run import generate_deployment
-from . list import list_templates
-from . service import run_service
+import importlib
 
+# Package-level names, imported from their modules on first use (PEP
+# 562) so that a console script loads only what it runs: the CLIs
+# don't pay for aiohttp, and tg-show-config-params doesn't load the
+# Jsonnet VM
+LAZY = {
+    "Generator": "generator",
+    "Packager": "packager",
+    "Index": "index",
+    "generate_deployment": "run",
+    "list_templates": "list",
+    "run_service": "service",
+}
+
+__all__ = list(LAZY)
+
+def __getattr__(name):
+
+    if name not in LAZY:
+        raise AttributeError(
+            f"module {__name__!r} has no attribute {name!r}"
+        )
+
+    value = getattr(
+        importlib.import_module(f".{LAZY[name]}", __name__), name
+    )
+    globals()[name] = value
+
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
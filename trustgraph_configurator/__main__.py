@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-from . import generate_deployment
+from . run import generate_deployment
 
 if __name__ == '__main__':
     generate_deployment()
@@ -0,0 +1,129 @@
+"""
+Admission control for renders in tg-config-svc.
+
+At most `limit` renders run at once.  Up to `queue` more wait, first
+come first served, for a running render to finish.  Past that,
+requests are rejected at once with a Saturated exception carrying a
+Retry-After estimate.  The service answers these with 429, so a burst
+degrades into quick, retryable rejections instead of a growing backlog
+that times out at the front end.
+
+The Retry-After estimate assumes the queue ahead drains at the recent
+average render time per slot.  Queue times and rejections are counted
+for the service's metrics.
+"""
+
+import asyncio
+import collections
+import contextlib
+import logging
+import math
+import time
+
+logger = logging.getLogger("admission")
+logger.setLevel(logging.INFO)
+
+class Saturated(Exception):
+
+    def __init__(self, retry_after):
+        super().__init__(f"Saturated, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class Admission:
+
+    def __init__(self, limit, queue):
+
+        self.limit = limit
+        self.queue = queue
+
+        self.running = 0
+        self.waiters = collections.deque()
+
+        # Moving average of how long a slot is held
+        self.average = 1.0
+
+        self.admitted = 0
+        self.rejected = 0
+        self.queued = 0
+        self.queue_seconds = 0.0
+        self.queue_seconds_max = 0.0
+
+    def retry_after(self):
+        """Seconds until a new request would likely be admitted"""
+        ahead = len(self.waiters) + 1
+        return max(1, math.ceil(self.average * ahead / self.limit))
+
+    async def acquire(self):
+        """Wait for a render slot.  Raises Saturated if the queue is
+        full."""
+
+        if self.running < self.limit and not self.waiters:
+            self.running += 1
+            self.admitted += 1
+            return
+
+        if len(self.waiters) >= self.queue:
+            self.rejected += 1
+            raise Saturated(self.retry_after())
+
+        start = time.monotonic()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Slot handed over just as the wait was cancelled
+                self.release()
+            else:
+                self.waiters.remove(waiter)
+            raise
+
+        waited = time.monotonic() - start
+
+        self.admitted += 1
+        self.queued += 1
+        self.queue_seconds += waited
+        self.queue_seconds_max = max(self.queue_seconds_max, waited)
+
+        logger.debug(f"Admitted after {waited:.3f}s in the queue")
+
+    def release(self):
+        """Free a render slot, handing it to the longest waiter"""
+
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+        self.running -= 1
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+
+        await self.acquire()
+
+        start = time.monotonic()
+
+        try:
+            yield
+        finally:
+            held = time.monotonic() - start
+            self.average = 0.8 * self.average + 0.2 * held
+            self.release()
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "queue": self.queue,
+            "running": self.running,
+            "waiting": len(self.waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "queued": self.queued,
+            "queue_seconds": round(self.queue_seconds, 3),
+            "queue_seconds_max": round(self.queue_seconds_max, 3),
+        }
@@ -1,36 +1,252 @@
 
 from aiohttp import web
+import aiohttp
+import asyncio
 import yaml
 import zipfile
 from io import BytesIO
 import importlib.resources
 import json
+import os
+import time
 
+from . import __version__
 from . generator import Generator
-from . import Index, Packager
+from . index import Index
+from . packager import Packager
+from . cache import RenderCache, SingleFlight, canonical_config
+from . archive import Compression, stream_archive
+from . workers import RenderPool, RenderTimeout
+from . admission import Admission, Saturated
+from . metrics import Registry, merge
+from . warmup import warm_up_jobs
+from . jobs import JobStore, StoreFull, DONE, FAILED
+from . packager import PLATFORMS
+from . resolver import Resolver
+from . static import (
+    ResourceStore, accepted_encodings, etag, not_modified,
+    not_modified_response, validated_response,
+)
 
 import logging
 logger = logging.getLogger("api")
 logger.setLevel(logging.INFO)
 
+# Version information changes only with a deployment of the service
+INDEX_CACHE_CONTROL = "public, max-age=60"
+
+# Generated archives are per-user; clients revalidate with the ETag
+ARCHIVE_CACHE_CONTROL = "private, no-cache"
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# A render request with this header set renders afresh, bypassing the
+# render cache, and returns the render's profile (see Packager.profile)
+# as compact JSON in the same response header
+PROFILE_HEADER = "X-Profile"
+
+ARTIFACT_CONTENT_TYPES = {
+    "yaml": "application/x-yaml",
+    "json": "application/json",
+}
+
+# Media types accepted for each artifact format
+FORMAT_MEDIA_TYPES = {
+    "yaml": [
+        "application/x-yaml", "application/yaml", "text/yaml",
+        "text/x-yaml",
+    ],
+    "json": [ "application/json" ],
+}
+
+# Seconds to wait for another server process's metrics
+PEER_METRICS_TIMEOUT = 5
+
+# Response headers not copied from a forwarded job request's response
+HOP_HEADERS = {
+    "connection", "content-length", "date", "keep-alive", "server",
+    "transfer-encoding",
+}
+
+def peer_socket(peer_dir, index):
+    """Path of the Unix socket server process index listens on for job
+    requests forwarded by the others"""
+    return os.path.join(peer_dir, f"server-{index}.sock")
+
+def peer_indexes(peer_dir):
+    """Indexes of the server processes with a peer socket"""
+
+    indexes = []
+
+    for name in os.listdir(peer_dir):
+        prefix, sep, index = name.removesuffix(".sock").partition("-")
+        if prefix == "server" and index.isdigit():
+            indexes.append(int(index))
+
+    return sorted(indexes)
+
+def wants_profile(request):
+    value = request.headers.get(PROFILE_HEADER, "")
+    return value.lower() in ("1", "true", "yes")
+
+def profile_header(profile):
+    return json.dumps(profile, separators=(",", ":"))
+
+def negotiate_format(accept, default):
+    """The artifact format an Accept header prefers: the highest
+    q-value, the default format on a tie or with no preference"""
+
+    accepted = accepted_encodings(accept)
+
+    def quality(format):
+        q = [
+            accepted[t] for t in FORMAT_MEDIA_TYPES[format] if t in accepted
+        ]
+        if q:
+            return max(q)
+        return accepted.get(
+            "application/*", accepted.get("*/*", 1.0 if not accepted else 0)
+        )
+
+    ranked = sorted(
+        FORMAT_MEDIA_TYPES,
+        key = lambda f: (quality(f), f == default),
+        reverse = True,
+    )
+
+    if quality(ranked[0]) <= 0:
+        return None
+
+    return ranked[0]
+
 class Api:
     def __init__(self, **config):
 
         self.port = int(config.get("port", "8080"))
-        self.app = web.Application(middlewares=[])
+
+        # Seconds for in-flight requests to finish on shutdown
+        self.shutdown_timeout = float(config.get("shutdown_timeout", 60))
+
+        # Under a Supervisor, this server process's index and the
+        # directory of every server's peer socket, through which job
+        # requests reach the process holding the job
+        self.server_index = config.get("server_index")
+        self.peer_dir = config.get("peer_dir")
+
+        self.max_body_bytes = int(config.get("max_body_bytes", 1024 * 1024))
+
+        self.app = web.Application(
+            middlewares=[self.metrics_middleware],
+            client_max_size=self.max_body_bytes,
+        )
+
+        self.compression = Compression(config.get("compression"))
+
+        # Template version -> Resolver.digest, for archive ETags
+        self.template_digests = {}
+
+        self.render_cache = RenderCache(
+            max_entries = int(config.get("render_cache_entries", 128)),
+            max_bytes = int(
+                config.get("render_cache_bytes", 64 * 1024 * 1024)
+            ),
+        )
+
+        timeout = config.get("render_timeout")
+
+        # Renders run on every worker before the service is ready
+        warm_up = config.get("warm_up")
+
+        self.render_pool = RenderPool(
+            workers = int(config.get("render_workers", 0)),
+            timeout = float(timeout) if timeout else None,
+            warm_up = warm_up_jobs(
+                warm_up,
+                config.get("warm_up_platforms"),
+                config.get("warm_up_config"),
+            ) if warm_up else (),
+            recycle_after = int(config.get("recycle_after") or 0),
+        )
+
+        # Renders run at once defaults to one per worker
+        max_renders = int(
+            config.get("max_renders") or
+            self.render_pool.workers or
+            os.cpu_count()
+        )
+
+        max_queued = config.get("max_queued_renders")
+        if max_queued is None:
+            max_queued = 4 * max_renders
+
+        self.admission = Admission(
+            limit = max_renders, queue = int(max_queued),
+        )
+
+        self.flights = SingleFlight()
+
+        # Background renders for the job API
+        self.jobs = JobStore(
+            max_jobs = int(config.get("max_jobs", 64)),
+            max_bytes = int(config.get("job_store_bytes", 256 * 1024 * 1024)),
+            ttl = float(config.get("job_ttl", 600)),
+            prefix = (
+                "" if self.peer_dir is None else f"{self.server_index}-"
+            ),
+        )
+
+        self.setup_metrics()
+
+        self.app.on_startup.append(self.start_render_pool)
+        self.app.on_shutdown.append(self.cancel_jobs)
+        self.app.on_cleanup.append(self.stop_render_pool)
 
         self.app.add_routes([
             web.post("/api/generate/{platform}/{template}", self.generate)
         ])
 
+        artifacts = [
+            ("/api/resources/{platform}/{template}", self.get_resources),
+            ("/api/tg-config/{template}", self.get_tg_config),
+            ("/api/additionals/{template}", self.get_additionals),
+        ]
+
+        for path, handler in artifacts:
+            self.app.add_routes([
+                web.get(path, handler), web.post(path, handler),
+            ])
+
+        self.app.add_routes([
+            web.post("/api/jobs/{platform}/{template}", self.create_job),
+            web.get("/api/jobs/{id}", self.get_job),
+            web.get("/api/jobs/{id}/result", self.get_job_result),
+            web.delete("/api/jobs/{id}", self.delete_job),
+        ])
+
         self.ui = importlib.resources.files().joinpath("ui")
 
+        # Dialog flow resources, read once with their ETags
+        self.dialog = ResourceStore(
+            importlib.resources.files().joinpath("resources").joinpath(
+                "dialog"
+            )
+        )
+
+        # Index endpoint name -> (Index snapshot, body, ETag)
+        self.index_responses = {}
+
         self.app.add_routes([
             web.get("/api/latest-stable", self.latest_stable),
             web.get("/api/latest", self.latest),
             web.get("/api/versions", self.versions),
         ])
 
+        self.app.add_routes([
+            web.get("/metrics", self.get_metrics),
+            web.get("/healthz", self.healthz),
+            web.get("/readyz", self.readyz),
+        ])
+
         self.app.add_routes([
             web.get("/api/dialog-flow", self.get_dialog_flow),
             web.get("/api/config-prepare", self.get_config_prepare),
@@ -38,65 +254,384 @@ class Api:
             web.get("/api/docs/{path:.*}", self.get_docs_fragment),
         ])
 
-    def latest(self, request):
+    def setup_metrics(self):
 
-        latest = Index.get_latest()
+        self.metrics = Registry()
+        m = self.metrics
+
+        self.requests = m.counter(
+            "tg_config_requests_total", "HTTP requests",
+            ("endpoint", "template", "platform", "status"),
+        )
+
+        self.request_seconds = m.histogram(
+            "tg_config_request_duration_seconds", "HTTP request latency",
+            ("endpoint", "template", "platform", "status"),
+        )
+
+        self.render_seconds = m.histogram(
+            "tg_config_render_seconds",
+            "Render time, from dispatch to a worker to the built archive",
+            ("template", "platform"),
+        )
+
+        self.render_stage_seconds = m.histogram(
+            "tg_config_render_stage_seconds",
+            "Render time per stage: Jsonnet evaluation per renderer, YAML "
+            "serialization per file and archive assembly per compression",
+            ("stage", "name"),
+        )
+
+        cache = self.render_cache.stats
+        admission = self.admission.stats
+        pool = self.render_pool.stats
+        flights = self.flights.stats
+
+        def hit_ratio():
+            s = cache()
+            lookups = s["hits"] + s["misses"]
+            return s["hits"] / lookups if lookups else 0
+
+        m.counter(
+            "tg_config_render_cache_hits_total", "Render cache hits",
+            fn = lambda: cache()["hits"],
+        )
+        m.counter(
+            "tg_config_render_cache_misses_total", "Render cache misses",
+            fn = lambda: cache()["misses"],
+        )
+        m.counter(
+            "tg_config_render_cache_evictions_total",
+            "Render cache evictions",
+            fn = lambda: cache()["evictions"],
+        )
+        m.gauge(
+            "tg_config_render_cache_hit_ratio",
+            "Render cache hits over lookups",
+            fn = hit_ratio,
+        )
+        m.gauge(
+            "tg_config_render_cache_entries", "Archives in the render cache",
+            fn = lambda: cache()["entries"],
+        )
+        m.gauge(
+            "tg_config_render_cache_bytes", "Bytes in the render cache",
+            fn = lambda: cache()["bytes"],
+        )
+
+        m.gauge(
+            "tg_config_renders_in_flight", "Renders running",
+            fn = lambda: admission()["running"],
+        )
+        m.gauge(
+            "tg_config_render_queue_depth", "Renders waiting for a slot",
+            fn = lambda: admission()["waiting"],
+        )
+        m.gauge(
+            "tg_config_render_limit", "Renders allowed to run at once",
+            fn = lambda: admission()["limit"],
+        )
+        m.counter(
+            "tg_config_renders_rejected_total",
+            "Renders rejected with 429 because the queue was full",
+            fn = lambda: admission()["rejected"],
+        )
+        m.counter(
+            "tg_config_render_queue_seconds_total",
+            "Time renders spent waiting for a slot",
+            fn = lambda: admission()["queue_seconds"],
+        )
+
+        m.gauge(
+            "tg_config_render_workers", "Render worker processes",
+            fn = lambda: pool()["workers"],
+        )
+        m.gauge(
+            "tg_config_render_workers_idle", "Idle render worker processes",
+            fn = lambda: pool()["idle"],
+        )
+
+        m.counter(
+            "tg_config_render_workers_recycled_total",
+            "Render worker processes replaced after --recycle-after renders",
+            fn = lambda: pool()["recycled"],
+        )
+        m.gauge(
+            "tg_config_ready", "1 once the warm-up renders are done",
+            fn = lambda: 1 if pool()["ready"] else 0,
+        )
+        m.gauge(
+            "tg_config_warm_up_seconds", "Time taken by the warm-up",
+            fn = lambda: pool()["warm_up_seconds"] or 0,
+        )
+
+        jobs = self.jobs.stats
+
+        m.gauge(
+            "tg_config_jobs", "Render jobs held, by status",
+            ("status",),
+            fn = lambda: {
+                (status,): jobs()[status]
+                for status in ("queued", "running", "done", "failed")
+            },
+        )
+        m.gauge(
+            "tg_config_job_store_bytes", "Bytes of finished job archives",
+            fn = lambda: jobs()["bytes"],
+        )
+
+        m.counter(
+            "tg_config_renders_coalesced_total",
+            "Requests which joined an identical render in flight",
+            fn = lambda: flights()["coalesced"],
+        )
+
+    async def archive_etag(self, key):
+        """The ETag of a render cache key's output.  Besides the key, it
+        covers the template tree and the package version, so a deploy
+        which changes the output for the same request, by editing a
+        template or the code, changes the tag."""
+
+        template = key[0]
+
+        digest = self.template_digests.get(template)
+
+        if digest is None:
+            # Indexing and hashing the tree reads every file, so is kept
+            # off the event loop
+            digest = await asyncio.to_thread(
+                lambda: Resolver.get(template).digest()
+            )
+            self.template_digests[template] = digest
+
+        return etag(*key, digest, __version__)
+
+    def template_label(self, template):
+        if template is None:
+            return ""
+        # Template names are only used as label values if known, to
+        # bound the number of series.  They are looked up in the current
+        # Index snapshot, so follow index.json as it is reloaded.
+        if template in Index.load().template_names:
+            return template
+        return "other"
+
+    def platform_label(self, platform):
+        if platform is None:
+            return ""
+        if platform in PLATFORMS or platform == "all":
+            return platform
+        if "," in platform:
+            return "multi"
+        return "other"
+
+    @web.middleware
+    async def metrics_middleware(self, request, handler):
+        """Count requests and their latency"""
+
+        start = time.monotonic()
+
+        # Stays 499 if the client goes away first
+        status = 499
+
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        except Exception:
+            status = 500
+            raise
+        finally:
+
+            resource = request.match_info.route.resource
+
+            labels = {
+                "endpoint": (
+                    resource.canonical if resource is not None
+                    else "unmatched"
+                ),
+                "template": self.template_label(
+                    request.match_info.get("template")
+                ),
+                "platform": self.platform_label(
+                    request.match_info.get("platform")
+                ),
+                "status": status,
+            }
+
+            self.requests.inc(**labels)
+            self.request_seconds.observe(
+                time.monotonic() - start, **labels
+            )
+
+    async def get_metrics(self, request):
+        """Prometheus metrics, in the text exposition format.  Under a
+        Supervisor, those of every server process, fetched over their
+        peer sockets and labelled with the server index, unless ?local
+        asks for only this process's."""
+
+        text = self.metrics.render()
+
+        if self.peer_dir is not None and "local" not in request.query:
+            text = merge(await self.server_metrics(text))
+
+        return web.Response(
+            body = text.encode("utf-8"),
+            headers = {
+                "Content-Type": METRICS_CONTENT_TYPE,
+                "Cache-Control": "no-store",
+            },
+        )
+
+    async def server_metrics(self, own):
+        """(index, rendered metrics) of this and every other server
+        process which answers.  A server that doesn't, e.g. while being
+        restarted, is left out of the scrape."""
+
+        async def fetch(index):
+
+            connector = aiohttp.UnixConnector(
+                path = peer_socket(self.peer_dir, index)
+            )
+
+            try:
+                async with aiohttp.ClientSession(
+                        connector = connector,
+                        timeout = aiohttp.ClientTimeout(
+                            total = PEER_METRICS_TIMEOUT
+                        ),
+                ) as s:
+                    async with s.get("http://peer/metrics?local=1") as resp:
+                        resp.raise_for_status()
+                        return await resp.text()
+            except (aiohttp.ClientError, OSError, asyncio.TimeoutError) as e:
+                logger.info(f"Server {index} metrics unavailable: {e}")
+                return None
+
+        peers = [
+            i for i in peer_indexes(self.peer_dir) if i != self.server_index
+        ]
+
+        texts = await asyncio.gather(*[fetch(i) for i in peers])
+
+        return [(self.server_index, own)] + [
+            (i, text) for i, text in zip(peers, texts) if text is not None
+        ]
+
+    def health(self, status):
+
+        stats = self.render_pool.stats()
 
         return web.json_response(
             {
+                "status": status,
+                "workers": stats["workers"],
+                "warm_up_renders": stats["warm_up_renders"],
+                "warm_up_seconds": stats["warm_up_seconds"],
+            },
+            status = 200 if status == "ok" else 503,
+            headers = { "Cache-Control": "no-store" },
+        )
+
+    def healthz(self, request):
+        """Liveness: 200 once warm-up is done, 503 before"""
+
+        if not self.render_pool.stats()["ready"]:
+            return self.health("warming")
+
+        return self.health("ok")
+
+    def readyz(self, request):
+        """Readiness: as liveness, and 503 while the render queue is
+        full, so new requests go to other instances"""
+
+        if not self.render_pool.stats()["ready"]:
+            return self.health("warming")
+
+        a = self.admission.stats()
+        if a["running"] >= a["limit"] and a["waiting"] >= a["queue"]:
+            return self.health("saturated")
+
+        return self.health("ok")
+
+    async def start_render_pool(self, app):
+        self.render_pool.start()
+
+    async def cancel_jobs(self, app):
+        for id in list(self.jobs.jobs):
+            self.jobs.remove(id)
+
+    async def stop_render_pool(self, app):
+        self.render_pool.stop()
+
+    def latest(self, request):
+
+        def data():
+            latest = Index.get_latest()
+            return {
                 "template": latest.name,
                 "version": latest.version,
             }
-        )
 
-    def latest_stable(self, request):
+        return self.index_response(request, "latest", data)
 
-        latest = Index.get_latest_stable()
+    def latest_stable(self, request):
 
-        return web.json_response(
-            {
+        def data():
+            latest = Index.get_latest_stable()
+            return {
                 "template": latest.name,
                 "version": latest.version,
             }
-        )
+
+        return self.index_response(request, "latest-stable", data)
 
     def versions(self, request):
 
-        versions = Index.get_templates()
+        def data():
+            return [
+                {
+                    "template": v.name,
+                    "version": v.version,
+                    "description": v.description,
+                    "status": v.status,
+                }
+                for v in Index.get_templates()
+            ]
 
-        return web.json_response([
-            {
-                "template": v.name,
-                "version": v.version,
-                "description": v.description,
-                "status": v.status,
-            }
-            for v in versions
-        ])
+        return self.index_response(request, "versions", data)
 
-    def load_dialog_resource(self, filename):
-        """Load a dialog flow resource file from resources/dialog/"""
-        resources = importlib.resources.files().joinpath("resources").joinpath("dialog")
-        path = resources.joinpath(filename)
-        try:
-            return path.read_text()
-        except:
-            raise web.HTTPNotFound()
+    def index_response(self, request, name, data):
+        """JSON response for an index endpoint with an ETag, or 304.
+        The body is built once per load of index.json."""
+
+        snapshot = Index.load()
+        cached = self.index_responses.get(name)
+
+        if cached is None or cached[0] is not snapshot:
+            body = json.dumps(data()).encode("utf-8")
+            cached = (snapshot, body, etag(body))
+            self.index_responses[name] = cached
+
+        return validated_response(
+            request, cached[1], "application/json", INDEX_CACHE_CONTROL,
+            tag = cached[2],
+        )
 
     def get_dialog_flow(self, request):
         """Return dialog flow YAML"""
-        content = self.load_dialog_resource("trustgraph-flow.yaml")
-        return web.Response(text=content, content_type="application/x-yaml")
+        return self.dialog.response(request, "trustgraph-flow.yaml")
 
     def get_config_prepare(self, request):
         """Return config preparation JSONata transform"""
-        content = self.load_dialog_resource("trustgraph-output.jsonata")
-        return web.Response(text=content, content_type="text/plain")
+        return self.dialog.response(request, "trustgraph-output.jsonata")
 
     def get_docs_manifest(self, request):
         """Return documentation manifest YAML"""
-        content = self.load_dialog_resource("trustgraph-docs.yaml")
-        return web.Response(text=content, content_type="application/x-yaml")
+        return self.dialog.response(request, "trustgraph-docs.yaml")
 
     def get_docs_fragment(self, request):
         """Return a documentation markdown fragment"""
@@ -104,8 +639,7 @@ class Api:
         # Validate path to prevent directory traversal
         if ".." in path:
             raise web.HTTPNotFound()
-        content = self.load_dialog_resource(f"docs/{path}")
-        return web.Response(text=content, content_type="text/markdown")
+        return self.dialog.response(request, f"docs/{path}")
 
     def open(self, path):
 
@@ -143,9 +677,11 @@ class Api:
         except:
             raise web.HTTPNotFound()
 
-    async def generate(self, request):
-
-        logger.info("Generate...")
+    async def render_request(self, request, artifact=None, format=None):
+        """Validate a render request, returning its render cache key,
+        the render job and the compression.  Raises an HTTP error for a
+        bad request.  The config is the request body, or for a GET the
+        config query parameter."""
 
         try:
             platform = request.match_info["platform"]
@@ -155,52 +691,514 @@ class Api:
         try:
             template = request.match_info["template"]
         except:
-            return web.HTTPBadRequest()
+            raise web.HTTPBadRequest()
 
         logger.info(f"Generating for platform={platform} template={template}")
 
         try:
+            if "compression" in request.query:
+                compression = Compression(request.query["compression"])
+            else:
+                compression = self.compression
+        except RuntimeError as e:
+            logger.info(f"{e}")
+            raise web.HTTPBadRequest()
+
+        if (
+                request.content_length is not None and
+                request.content_length > self.max_body_bytes
+        ):
+            logger.info(f"Request body too large")
+            raise web.HTTPRequestEntityTooLarge(
+                max_size = self.max_body_bytes,
+                actual_size = request.content_length,
+            )
+
+        if request.method == "GET":
+
+            config = request.query.get("config")
 
-            config = await request.text()
+            if config is None:
+                logger.info(f"No config")
+                raise web.HTTPBadRequest()
 
-            # **************************************************************
-            # This is a security boundary!  This is used by jsonnet, so if
-            # a user can provide jsonnet, they can execute anything server
-            # side.
-            # **************************************************************
+            if len(config) > self.max_body_bytes:
+                logger.info(f"Config too large")
+                raise web.HTTPRequestEntityTooLarge(
+                    max_size = self.max_body_bytes,
+                    actual_size = len(config),
+                )
+
+        else:
 
-            # This verifies/forces that the input is JSON.  Important because
-            # input is user-supplied, don't want to trust it.
             try:
-                dec = json.loads(config)
-                config = json.dumps(dec)
-            except:
-                # Incorrectly formatted stuff is not our problem,
-                logger.info(f"Bad JSON")
-                return web.HTTPBadRequest()
-
-            logger.info(f"Config: {config}")
-
-            pkg = Packager(
-                version = None,      # Use version from template configuration
-                template = template,
-                platform = platform,
-                latest = False,
-                latest_stable = False
+                config = await request.text()
+            except web.HTTPRequestEntityTooLarge:
+                logger.info(f"Request body too large")
+                raise
+
+        # ******************************************************************
+        # This is a security boundary!  This is used by jsonnet, so if
+        # a user can provide jsonnet, they can execute anything server
+        # side.
+        # ******************************************************************
+
+        # This verifies/forces that the input is JSON.  Important because
+        # input is user-supplied, don't want to trust it.
+        # Keys are sorted so that equivalent configs share a
+        # render cache entry.
+        try:
+            config = canonical_config(config)
+        except:
+            # Incorrectly formatted stuff is not our problem,
+            logger.info(f"Bad JSON")
+            raise web.HTTPBadRequest()
+
+        logger.info(f"Config: {config}")
+
+        # Use version from template configuration
+        try:
+            template, version = Packager.select(None, template, False, False)
+        except Exception as e:
+            logging.error(f"Exception: {e}")
+            raise web.HTTPInternalServerError()
+
+        job = {
+            "template": template,
+            "platform": platform,
+            "config": config,
+            "compression": str(compression),
+        }
+
+        if wants_profile(request):
+            job["profile"] = True
+
+        if artifact is not None:
+            job["artifact"] = artifact
+            job["format"] = format
+            artifact = f"{artifact}.{format}"
+
+        key = RenderCache.key(
+            template, version, platform, config, compression, artifact
+        )
+
+        return key, job, compression
+
+    async def generate(self, request):
+
+        logger.info("Generate...")
+
+        try:
+            key, job, compression = await self.render_request(request)
+        except web.HTTPException as e:
+            return e
+
+        try:
+
+            # The archive's ETag is known from the request, so a client
+            # with a current copy is answered without rendering.  This
+            # answers a POST with 304 rather than 412: it is a cache
+            # validation, not an update precondition.  The tag is strong
+            # as archives are reproducible (see archive.entry_time): a
+            # re-render of the same key gives the same bytes.
+            tag = await self.archive_etag(key)
+            profile = job.get("profile")
+
+            if not profile and not_modified(request, tag):
+                logger.info("Not modified")
+                return not_modified_response(tag, ARCHIVE_CACHE_CONTROL)
+
+            data = None if profile else self.render_cache.get(key)
+
+            if data is not None:
+
+                logger.info("Render cache hit")
+
+                return web.Response(
+                    body = data,
+                    content_type = compression.content_type,
+                    headers = {
+                        "X-Compression": str(compression),
+                        "ETag": tag,
+                        "Cache-Control": ARCHIVE_CACHE_CONTROL,
+                    },
+                )
+
+            if profile:
+                # Profiled renders are never shared
+                archive = await self.render(key, job)
+            else:
+                # Identical requests in flight together share one render
+                archive = await self.flights.run(
+                    key, lambda: self.render(key, job)
+                )
+
+        except Saturated as e:
+            logger.info(f"{e}")
+            return web.HTTPTooManyRequests(
+                headers = { "Retry-After": str(e.retry_after) }
             )
 
-            data = pkg.generate(config)
+        except RenderTimeout as e:
+            logging.error(f"Exception: {e}")
+            return web.HTTPGatewayTimeout()
+
+        except Exception as e:
+            logging.error(f"Exception: {e}")
+            return web.HTTPInternalServerError()
+
+        return await self.send_archive(request, archive, compression, tag)
+
+    async def send_archive(self, request, archive, compression, tag):
+        """Stream a rendered archive to the client a part at a time,
+        with its compression stats, and profile if any, in the
+        headers"""
+
+        stats = archive.stats()
+
+        headers = {
+            "Content-Type": compression.content_type,
+            "Content-Length": str(stats["compressed"]),
+            "X-Compression": stats["compression"],
+            "X-Compression-Ratio": str(stats["ratio"]),
+            "X-Compression-Seconds": str(stats["seconds"]),
+            "X-Uncompressed-Length": str(stats["bytes"]),
+            "ETag": tag,
+            "Cache-Control": ARCHIVE_CACHE_CONTROL,
+        }
+
+        if archive.profile is not None:
+            headers[PROFILE_HEADER] = profile_header(archive.profile)
+            headers["Cache-Control"] = "no-store"
+
+        response = web.StreamResponse(headers = headers)
+        await response.prepare(request)
+
+        await stream_archive(archive, response)
+        await response.write_eof()
+
+        return response
+
+    async def get_resources(self, request):
+        """Only the platform resources, as YAML or JSON per the Accept
+        header or format query parameter"""
+
+        platform = request.match_info["platform"]
+
+        if platform == "all" or "," in platform:
+            logger.info("Resources are for a single platform")
+            return web.HTTPBadRequest()
+
+        default = "json" if platform == "aca" else "yaml"
+
+        format = request.query.get("format") or negotiate_format(
+            request.headers.get("Accept"), default
+        )
+
+        if format not in ARTIFACT_CONTENT_TYPES:
+            return web.HTTPNotAcceptable()
+
+        return await self.artifact(request, "resources", format)
+
+    async def get_tg_config(self, request):
+        """Only the TrustGraph configuration, as JSON"""
+        return await self.artifact(request, "tg-config", "json")
+
+    async def get_additionals(self, request):
+        """Only the list of additional config files, as JSON"""
+        return await self.artifact(request, "additionals", "json")
+
+    async def artifact(self, request, artifact, format):
+        """Render and send a single artifact, running only the renderers
+        it needs and skipping the archive"""
+
+        try:
+            key, job, compression = await self.render_request(
+                request, artifact, format
+            )
+        except web.HTTPException as e:
+            return e
+
+        content_type = ARTIFACT_CONTENT_TYPES[format]
+        tag = await self.archive_etag(key)
+
+        headers = {
+            "ETag": tag,
+            "Cache-Control": ARCHIVE_CACHE_CONTROL,
+            "Vary": "Accept",
+        }
+
+        profile = job.get("profile")
+
+        if not profile and not_modified(request, tag):
+            logger.info("Not modified")
+            return not_modified_response(
+                tag, ARCHIVE_CACHE_CONTROL, { "Vary": "Accept" }
+            )
+
+        try:
+
+            data = None if profile else self.render_cache.get(key)
+
+            if profile:
+                # Profiled renders are never shared
+                result = await self.render(key, job)
+                data = result.data
+                headers[PROFILE_HEADER] = profile_header(result.profile)
+                headers["Cache-Control"] = "no-store"
+            elif data is None:
+                result = await self.flights.run(
+                    key, lambda: self.render(key, job)
+                )
+                data = result.data
+            else:
+                logger.info("Render cache hit")
 
-            return web.Response(
-                body = data,
-                content_type = "application/octet-stream"
+        except Saturated as e:
+            logger.info(f"{e}")
+            return web.HTTPTooManyRequests(
+                headers = { "Retry-After": str(e.retry_after) }
             )
 
+        except RenderTimeout as e:
+            logging.error(f"Exception: {e}")
+            return web.HTTPGatewayTimeout()
+
         except Exception as e:
             logging.error(f"Exception: {e}")
             return web.HTTPInternalServerError()
 
-    def run(self):
+        return web.Response(
+            body = data,
+            content_type = content_type,
+            charset = "utf-8",
+            headers = headers,
+        )
+
+    async def create_job(self, request):
+        """Start a render in the background, returning its job id"""
+
+        try:
+            key, job, compression = await self.render_request(request)
+        except web.HTTPException as e:
+            return e
+
+        try:
+            j = self.jobs.create(key)
+        except StoreFull as e:
+            logger.info(f"{e}")
+            return web.HTTPTooManyRequests(
+                headers = { "Retry-After": str(self.admission.retry_after()) }
+            )
+
+        j.task = asyncio.ensure_future(self.run_job(j, key, job))
+
+        logger.info(f"Started job {j.id}")
+
+        url = f"/api/jobs/{j.id}"
+
+        return web.json_response(
+            { **j.describe(), "url": url, "result": url + "/result" },
+            status = 202,
+            headers = { "Location": url },
+        )
+
+    async def run_job(self, j, key, job):
+
+        try:
+
+            data = None
+            if not job.get("profile"):
+                data = self.render_cache.get(key)
+
+            if data is not None:
+                logger.info("Render cache hit")
+                self.jobs.finish(
+                    j, data, { "compression": job["compression"] }
+                )
+                return
+
+            # Jobs wait their turn rather than being turned away
+            while True:
+                try:
+                    archive = await self.render(key, job, j.progress)
+                    break
+                except Saturated as e:
+                    await asyncio.sleep(e.retry_after)
+
+            j.profile = archive.profile
+            self.jobs.finish(j, archive.getvalue(), archive.stats())
+
+        except asyncio.CancelledError:
+            raise
+
+        except RenderTimeout as e:
+            logging.error(f"Exception: {e}")
+            self.jobs.finish(j, error="Render timed out")
+
+        except Exception as e:
+            logging.error(f"Exception: {e}")
+            self.jobs.finish(j, error="Render failed")
+
+        logger.info(f"Job {j.id} {j.status}")
+
+    def job_owner(self, id):
+        """Index of the server process holding a job, if it is another
+        one"""
+
+        if self.peer_dir is None:
+            return None
+
+        index, sep, rest = id.partition("-")
+
+        if not sep or not index.isdigit():
+            return None
+
+        if int(index) == self.server_index:
+            return None
+
+        return int(index)
+
+    async def forward(self, request, owner):
+        """Pass a job request to the server process holding the job,
+        over its peer socket, and return its response.  A job whose
+        server has gone, taking its jobs with it, is 404."""
+
+        logger.info(f"Forwarding to server {owner}")
+
+        connector = aiohttp.UnixConnector(
+            path = peer_socket(self.peer_dir, owner)
+        )
+
+        try:
+
+            async with aiohttp.ClientSession(connector = connector) as s:
+                async with s.request(
+                        request.method, f"http://peer{request.rel_url}",
+                        headers = {
+                            k: v for k, v in request.headers.items()
+                            if k.lower() not in HOP_HEADERS | { "host" }
+                        },
+                        auto_decompress = False,
+                ) as resp:
+                    body = await resp.read()
+                    headers = {
+                        k: v for k, v in resp.headers.items()
+                        if k.lower() not in HOP_HEADERS
+                    }
+
+        except (aiohttp.ClientError, OSError) as e:
+            logger.info(f"Server {owner} unreachable: {e}")
+            return web.HTTPNotFound()
+
+        return web.Response(
+            status = resp.status, body = body, headers = headers
+        )
+
+    async def get_job(self, request):
+        """A job's status and progress"""
+
+        owner = self.job_owner(request.match_info["id"])
+        if owner is not None:
+            return await self.forward(request, owner)
+
+        j = self.jobs.get(request.match_info["id"])
+
+        if j is None:
+            return web.HTTPNotFound()
+
+        return web.json_response(
+            j.describe(), headers = { "Cache-Control": "no-store" }
+        )
+
+    async def get_job_result(self, request):
+        """A finished job's archive; 409 with its status until then, or
+        410 if it failed, as the request was fine but the result will
+        never exist"""
+
+        owner = self.job_owner(request.match_info["id"])
+        if owner is not None:
+            return await self.forward(request, owner)
+
+        j = self.jobs.get(request.match_info["id"])
+
+        if j is None:
+            return web.HTTPNotFound()
+
+        if j.status != DONE:
+            return web.json_response(
+                j.describe(),
+                status = 410 if j.status == FAILED else 409,
+                headers = { "Cache-Control": "no-store" },
+            )
+
+        compression = Compression(j.stats["compression"])
 
-        web.run_app(self.app, port=self.port)
+        headers = {
+            "X-Compression": str(compression),
+            "ETag": await self.archive_etag(j.key),
+            "Cache-Control": ARCHIVE_CACHE_CONTROL,
+        }
+
+        if "ratio" in j.stats:
+            headers["X-Compression-Ratio"] = str(j.stats["ratio"])
+            headers["X-Uncompressed-Length"] = str(j.stats["bytes"])
+
+        return web.Response(
+            body = j.data,
+            content_type = compression.content_type,
+            headers = headers,
+        )
+
+    async def delete_job(self, request):
+        """Cancel a job, or drop its result"""
+
+        owner = self.job_owner(request.match_info["id"])
+        if owner is not None:
+            return await self.forward(request, owner)
+
+        if self.jobs.remove(request.match_info["id"]) is None:
+            return web.HTTPNotFound()
+
+        return web.HTTPNoContent()
+
+    async def render(self, key, job, progress=None):
+        """Render a job off the event loop, on a worker process, once
+        admitted, and cache the archive"""
+
+        async with self.admission.slot():
+            start = time.monotonic()
+            archive = await self.render_pool.render(job, progress)
+            self.render_seconds.observe(
+                time.monotonic() - start,
+                template = job["template"],
+                platform = self.platform_label(job["platform"]),
+            )
+
+        for stage, name, seconds in archive.timings:
+            self.render_stage_seconds.observe(
+                seconds, stage = stage, name = name
+            )
+
+        if archive.compressed <= self.render_cache.max_bytes:
+            self.render_cache.put(key, archive.getvalue())
+
+        logger.debug(f"Render cache: {self.render_cache.stats()}")
+        logger.debug(f"Admission: {self.admission.stats()}")
+
+        return archive
+
+    def run(self, reuse_port=False):
+        """Serve until SIGINT or SIGTERM, then finish in-flight requests.
+        With reuse_port, several processes can share the port.  Under a
+        Supervisor, also serves the peer socket."""
+
+        path = None
+        if self.peer_dir is not None:
+            path = peer_socket(self.peer_dir, self.server_index)
+
+        web.run_app(
+            self.app, port=self.port, path=path, reuse_port=reuse_port,
+            shutdown_timeout=self.shutdown_timeout,
+        )
 
@@ -0,0 +1,418 @@
+"""
+Archive output for deployment packages.
+
+Packager renders a deployment to a list of (name, content) entries;
+this module packs those into the archive sent to the user, in one of
+three forms selected by a compression setting:
+
+    stored          zip, entries stored uncompressed (the default)
+    deflate[:N]     zip, entries deflated at level N (0-9, default 6)
+    zstd[:N]        tar compressed with zstd at level N (1-22,
+                    default 3), needs the optional zstandard package
+
+Zip entries of PARALLEL_BYTES or more are compressed concurrently on a
+shared thread pool (zlib releases the GIL), small ones inline.  Each
+entry is compressed before its header is written, so the zip needs no
+data descriptors.  write_archive writes each entry to the output file
+as soon as it is compressed, and zstd streams the tar through the
+compressor into the file, so the CLI never holds the whole archive.
+build keeps the parts, unjoined, for the service, which needs the
+final size for Content-Length.  Archives the service caches, or keeps
+as job results, are joined once by Archive.getvalue, which then sends
+the same buffer, so there is one copy in memory, not two.  zstd
+compresses the tar with its own worker threads.
+
+Every entry is stamped with the same time, SOURCE_DATE_EPOCH if set
+and otherwise 1980-01-01, the earliest a zip can record, so the same
+entries always make the same archive bytes.
+
+Every Archive records its uncompressed and compressed sizes and the
+time spent compressing, for choosing a setting.
+"""
+
+import concurrent.futures
+import importlib.util
+import io
+import logging
+import os
+import struct
+import tarfile
+import time
+import zlib
+
+logger = logging.getLogger("archive")
+logger.setLevel(logging.INFO)
+
+STORED = "stored"
+DEFLATE = "deflate"
+ZSTD = "zstd"
+
+# Entries at least this big are compressed on the thread pool
+PARALLEL_BYTES = 64 * 1024
+
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+END_RECORD = struct.Struct("<IHHHHIIH")
+
+ZIP_VERSION = 20
+ZIP_UTF8 = 0x800
+
+# 1980-01-01T00:00:00Z, the zip format's earliest time
+ZIP_EPOCH = 315532800
+
+pool = None
+
+def compression_pool():
+    """The shared thread pool used to compress large entries"""
+
+    global pool
+
+    if pool is None:
+        pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(8, os.cpu_count() or 1),
+            thread_name_prefix="compress",
+        )
+
+    return pool
+
+def have_zstandard():
+    """Whether the optional zstandard package can be imported, without
+    importing it"""
+    return importlib.util.find_spec("zstandard") is not None
+
+class Compression:
+    """A compression setting, parsed from e.g. "deflate:9" """
+
+    DEFAULT_LEVELS = { STORED: None, DEFLATE: 6, ZSTD: 3 }
+    LEVELS = { DEFLATE: range(0, 10), ZSTD: range(1, 23) }
+
+    def __init__(self, spec=STORED):
+
+        method, _, level = (spec or STORED).partition(":")
+
+        if method not in self.DEFAULT_LEVELS:
+            raise RuntimeError(f"Bad compression: {spec}")
+
+        if level == "":
+            level = self.DEFAULT_LEVELS[method]
+        else:
+            try:
+                level = int(level)
+            except ValueError:
+                raise RuntimeError(f"Bad compression level: {spec}")
+            if method == STORED or level not in self.LEVELS[method]:
+                raise RuntimeError(f"Bad compression level: {spec}")
+
+        # Checked here so a request for zstd without the package is
+        # refused before rendering, not once the archive is built
+        if method == ZSTD and not have_zstandard():
+            raise RuntimeError(
+                "zstd compression needs the zstandard package"
+            )
+
+        self.method = method
+        self.level = level
+
+    def __str__(self):
+        if self.level is None:
+            return self.method
+        return f"{self.method}:{self.level}"
+
+    @property
+    def extension(self):
+        return ".tar.zst" if self.method == ZSTD else ".zip"
+
+    @property
+    def content_type(self):
+        if self.method == ZSTD:
+            return "application/zstd"
+        return "application/octet-stream"
+
+class Entry:
+    """A zip entry, compressed and ready to write"""
+
+    def __init__(self, name, content, compression):
+
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+
+        self.name = name.encode("utf-8")
+        self.flags = 0 if name.isascii() else ZIP_UTF8
+        self.crc = zlib.crc32(content)
+        self.size = len(content)
+
+        if compression.method == DEFLATE:
+            c = zlib.compressobj(compression.level, zlib.DEFLATED, -15)
+            self.data = c.compress(content) + c.flush()
+            self.method = 8
+        else:
+            self.data = content
+            self.method = 0
+
+def prepare(files, compression):
+    """Futures of an Entry per (name, content), in order.  Large entries
+    are compressed on the thread pool, the rest before returning."""
+
+    futures = []
+
+    for name, content in files:
+
+        if (
+                compression.method == DEFLATE and
+                len(content) >= PARALLEL_BYTES
+        ):
+            futures.append(compression_pool().submit(
+                Entry, name, content, compression
+            ))
+            continue
+
+        future = concurrent.futures.Future()
+        future.set_result(Entry(name, content, compression))
+        futures.append(future)
+
+    return futures
+
+def entry_time():
+    """The time every entry is stamped with, as a Unix time"""
+
+    try:
+        t = int(os.environ["SOURCE_DATE_EPOCH"])
+    except (KeyError, ValueError):
+        t = ZIP_EPOCH
+
+    return max(t, ZIP_EPOCH)
+
+def dos_time(t):
+    t = time.gmtime(t)
+    date = (t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday
+    clock = t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2
+    return clock, date
+
+class Archive:
+    """A compressed archive of entries and its compression stats.
+    Parts are kept, and chunks() yields them, unless the Archive was
+    given a file object to write them to as they are produced."""
+
+    def __init__(self, compression, out=None):
+
+        self.compression = compression
+        self.out = out
+
+        # Uncompressed bytes, compressed bytes, and seconds spent
+        # compressing
+        self.size = 0
+        self.compressed = 0
+        self.seconds = 0.0
+
+        self.parts = []
+
+        # Stage timings of the render which produced the entries, as
+        # (stage, name, seconds), when known
+        self.timings = []
+
+        # The render's Packager.profile(), if the job asked for one
+        self.profile = None
+
+    def write(self, data):
+        """Add a part of the archive.  Also makes the Archive a file
+        object the zstd compressor can write to."""
+
+        self.compressed += len(data)
+
+        if self.out is None:
+            self.parts.append(bytes(data))
+        else:
+            self.out.write(data)
+
+        return len(data)
+
+    def chunks(self):
+        return iter(self.parts)
+
+    def getvalue(self):
+        """The kept parts as one bytes object.  They are joined once,
+        and replaced by the result, so the Archive never holds two
+        copies and later calls, and chunks(), share it."""
+
+        if len(self.parts) != 1:
+            self.parts = [b"".join(self.parts)]
+
+        return self.parts[0]
+
+    def stats(self):
+
+        compressed = self.compressed
+
+        return {
+            "compression": str(self.compression),
+            "bytes": self.size,
+            "compressed": compressed,
+            "ratio": round(self.size / compressed, 3) if compressed else 0,
+            "seconds": round(self.seconds, 3),
+        }
+
+    def describe(self):
+        s = self.stats()
+        return (
+            f"{s['compression']}: {s['bytes']} -> {s['compressed']} bytes "
+            f"(ratio {s['ratio']:.2f}) in {s['seconds']:.3f}s"
+        )
+
+def zip_archive(entries, archive):
+    """Lay out compressed entries as a zip, written to an Archive.
+    entries yields each Entry once it is compressed."""
+
+    clock, date = dos_time(entry_time())
+
+    central = []
+    offset = 0
+
+    for e in entries:
+
+        logger.info(f"Adding {e.name.decode('utf-8')}...")
+
+        if offset + len(e.data) > 0xffffffff or e.size > 0xffffffff:
+            raise RuntimeError("Deployment too large for a zip")
+
+        header = LOCAL_HEADER.pack(
+            0x04034b50, ZIP_VERSION, e.flags, e.method, clock, date,
+            e.crc, len(e.data), e.size, len(e.name), 0
+        )
+
+        central.append(CENTRAL_HEADER.pack(
+            0x02014b50, 3 << 8 | ZIP_VERSION, ZIP_VERSION, e.flags,
+            e.method, clock, date, e.crc, len(e.data), e.size,
+            len(e.name), 0, 0, 0, 0, 0o600 << 16, offset
+        ) + e.name)
+
+        archive.write(header + e.name)
+        archive.write(e.data)
+
+        archive.size += e.size
+        offset += len(header) + len(e.name) + len(e.data)
+
+    directory = b"".join(central)
+
+    archive.write(directory + END_RECORD.pack(
+        0x06054b50, 0, 0, len(central), len(central),
+        len(directory), offset, 0
+    ))
+
+    return archive
+
+def compressed(futures, archive):
+    """Each Entry from prepare's futures, in order, adding the time
+    spent waiting for them to the Archive's compression time"""
+
+    for future in futures:
+        start = time.monotonic()
+        entry = future.result()
+        archive.seconds += time.monotonic() - start
+        yield entry
+
+def zstd_archive(files, archive):
+    """A zstd-compressed tar of the entries, written to an Archive"""
+
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError(
+            "zstd compression needs the zstandard package"
+        )
+
+    start = time.monotonic()
+
+    compressor = zstandard.ZstdCompressor(
+        level=archive.compression.level, threads=-1
+    )
+
+    mtime = entry_time()
+
+    with compressor.stream_writer(archive, closefd=False) as z:
+        with tarfile.open(fileobj=z, mode="w|") as tar:
+            for name, content in files:
+
+                logger.info(f"Adding {name}...")
+
+                if isinstance(content, str):
+                    content = content.encode("utf-8")
+
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                info.mtime = mtime
+                info.mode = 0o644
+
+                tar.addfile(info, io.BytesIO(content))
+                archive.size += len(content)
+
+    archive.seconds = time.monotonic() - start
+
+    return archive
+
+def build(files, compression=None, out=None):
+    """Compress (name, content) entries into an Archive, written to the
+    file object out if given"""
+
+    archive = Archive(compression or Compression(), out)
+
+    if archive.compression.method == ZSTD:
+        zstd_archive(files, archive)
+    else:
+        start = time.monotonic()
+        futures = prepare(files, archive.compression)
+        archive.seconds = time.monotonic() - start
+        zip_archive(compressed(futures, archive), archive)
+
+    logger.info(f"Compression {archive.describe()}")
+
+    return archive
+
+async def build_async(files, compression=None):
+    """build, without blocking the event loop on compression"""
+
+    # Only the service builds archives asynchronously; importing asyncio
+    # here keeps it off the CLIs' start-up path
+    import asyncio
+
+    archive = Archive(compression or Compression())
+
+    if archive.compression.method == ZSTD:
+        await asyncio.get_running_loop().run_in_executor(
+            compression_pool(), zstd_archive, files, archive
+        )
+    else:
+        start = time.monotonic()
+        entries = [
+            await asyncio.wrap_future(f)
+            for f in prepare(files, archive.compression)
+        ]
+        archive.seconds = time.monotonic() - start
+        zip_archive(entries, archive)
+
+    logger.info(f"Compression {archive.describe()}")
+
+    return archive
+
+def write_archive(files, out, compression=None):
+    """Write an archive of (name, content) entries to a file object,
+    returning the Archive.  Each entry is written as soon as it is
+    compressed."""
+
+    archive = build(files, compression, out)
+
+    logger.info("Generation complete.")
+
+    return archive
+
+def archive_bytes(files, compression=None):
+    """An archive of (name, content) entries, as bytes"""
+    return build(files, compression).getvalue()
+
+async def stream_archive(archive, response):
+    """Write a built Archive to an object with an async write method,
+    e.g. a prepared aiohttp StreamResponse, a part at a time"""
+
+    for chunk in archive.chunks():
+        await response.write(chunk)
+
+    logger.info("Generation complete.")
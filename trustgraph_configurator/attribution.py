@@ -0,0 +1,228 @@
+"""
+Per-component render cost attribution, for tg-build-deployment
+--component-costs.
+
+decode-config.jsonnet folds every config entry into one patterns
+object before the engine walks it, so a slow render doesn't say which
+component's create() is to blame.  component_costs renders the
+artifact once per config entry with that entry alone, and then adds
+the entries one at a time, attributing to each entry the difference
+its addition made.  Each render reports its Jsonnet evaluation time,
+the resources emitted and the serialized output size.
+
+Most entries can't render alone (they need trustgraph-base and a
+pub/sub entry, say), so those report the error.  An entry which can't
+be added yet is retried after the next one is, which measures entries
+ahead of what they depend on; only entries which never render are
+left out.  The time of an empty config is the fixed cost shared by
+every render: importing the templates and the engine.  Timings are
+noisy at the millisecond level, so a cheap entry can show a small
+negative added time.
+"""
+
+import contextlib
+import json
+
+import tabulate
+
+def count_resources(output):
+    """Number of resources in a rendered artifact: a Kubernetes List's
+    items, an ARM template's resources, or otherwise the entries of
+    each section (compose services and volumes, TG config types)"""
+
+    if isinstance(output, list):
+        return len(output)
+
+    if not isinstance(output, dict):
+        return 1
+
+    for key in ["items", "resources"]:
+        if isinstance(output.get(key), list):
+            return len(output[key])
+
+    return sum(
+        len(v) for v in output.values() if isinstance(v, (dict, list))
+    )
+
+def measure(pkg, entries, artifact):
+    """Render an artifact for a list of config entries, returning a
+    dict of seconds, resources and bytes, or of the error"""
+
+    try:
+        text = pkg.render_artifact(json.dumps(entries), artifact, "json")
+    except Exception as e:
+        return { "error": str(e).strip().splitlines()[0] }
+
+    return {
+        "seconds": pkg.profile()["totals"].get("jsonnet", 0.0),
+        "resources": count_resources(json.loads(text)),
+        "bytes": len(text.encode("utf-8")),
+    }
+
+def difference(after, before):
+    """What was added between two measurements, or None if either
+    failed"""
+
+    if "error" in after or "error" in before:
+        return None
+
+    return {
+        k: after[k] - before[k]
+        for k in ["seconds", "resources", "bytes"]
+    }
+
+def labels(entries):
+    """Component names, numbered where a name appears more than once"""
+
+    names = [e.get("name", "?") for e in entries]
+
+    return [
+        f"{name}#{names[:n].count(name) + 1}" if names.count(name) > 1
+        else name
+        for n, name in enumerate(names)
+    ]
+
+@contextlib.contextmanager
+def uncached(pkg):
+    """Turn off the Packager's disk cache: a cached render would measure
+    nothing, and these partial configs aren't worth keeping"""
+
+    disk_cache, pkg.disk_cache = pkg.disk_cache, None
+
+    try:
+        yield pkg
+    finally:
+        pkg.disk_cache = disk_cache
+
+def component_costs(pkg, config, artifact="resources"):
+    """Attribute the cost of rendering an artifact ("resources" for
+    the Packager's platform, or "tg-config") to each entry of a config.
+    Returns a dict of the baseline (empty config) and full config
+    measurements, and a row per entry with its isolated and
+    incremental measurements, most expensive first."""
+
+    with uncached(pkg):
+        return attribute(pkg, config, artifact)
+
+def attribute(pkg, config, artifact):
+
+    entries = json.loads(config)
+
+    if not isinstance(entries, list):
+        raise RuntimeError("Config must be a list of components")
+
+    if artifact == "resources" and pkg.is_multi_platform():
+        raise RuntimeError("Component costs are for a single platform")
+
+    rows = [
+        {
+            "component": label,
+            "position": n,
+            "isolated": measure(pkg, [entries[n]], artifact),
+            "incremental": None,
+            "added": None,
+            "error": None,
+        }
+        for n, label in enumerate(labels(entries))
+    ]
+
+    baseline = measure(pkg, [], artifact)
+
+    # Entries are added in config order, but one which can't be added
+    # yet (it needs an entry further on) is retried after the next
+    # successful addition, until no more can be added.  Entries are
+    # kept in config order, as the later of two entries can override
+    # the earlier.
+    added = []
+    current = baseline
+    pending = list(range(len(entries)))
+
+    while pending:
+
+        for n in pending:
+
+            candidate = sorted(added + [n])
+            m = measure(pkg, [entries[i] for i in candidate], artifact)
+
+            if "error" in m:
+                rows[n]["error"] = m["error"]
+                continue
+
+            rows[n]["incremental"] = difference(m, current)
+            rows[n]["added"] = len(added)
+            rows[n]["error"] = None
+
+            added = candidate
+            current = m
+            pending.remove(n)
+            break
+
+        else:
+            # A whole pass added nothing
+            break
+
+    def cost(row):
+        for m in [row["incremental"], row["isolated"]]:
+            if m is not None and "seconds" in m:
+                return m["seconds"]
+        return float("-inf")
+
+    rows.sort(key=cost, reverse=True)
+
+    return {
+        "artifact": artifact,
+        "platform": pkg.platform if artifact == "resources" else None,
+        "baseline": baseline,
+        "total": current,
+        "unrendered": len(pending),
+        "components": rows,
+    }
+
+def format_costs(costs):
+    """component_costs as a table, with the baseline and total"""
+
+    def cells(m):
+        if m is None or "error" in m:
+            return ["-", "-", "-"]
+        return [f"{m['seconds']:.3f}", m["resources"], m["bytes"]]
+
+    def note(row):
+        if row["error"] is not None:
+            return f"Not added: {row['error']}"
+        if "error" in row["isolated"]:
+            return f"Alone: {row['isolated']['error']}"
+        return ""
+
+    table = [
+        [row["component"]] + cells(row["isolated"]) +
+        cells(row["incremental"]) + [note(row)]
+        for row in costs["components"]
+    ]
+
+    def summary(title, m):
+        if "error" in m:
+            return f"{title}: failed: {m['error']}"
+        return (
+            f"{title}: {m['seconds']:.3f}s, {m['resources']} resources, "
+            f"{m['bytes']} bytes"
+        )
+
+    return "\n".join([
+        tabulate.tabulate(
+            table,
+            headers=[
+                "component", "alone s", "resources", "bytes",
+                "added s", "+resources", "+bytes", "notes",
+            ],
+            tablefmt="simple",
+            maxcolwidths=[None] * 7 + [50],
+            disable_numparse=True,
+        ),
+        "",
+        summary("Empty config", costs["baseline"]),
+        summary(
+            "All added" if costs["unrendered"] == 0 else
+            f"All but {costs['unrendered']} added",
+            costs["total"]
+        ),
+    ])
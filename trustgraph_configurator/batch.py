@@ -0,0 +1,209 @@
+"""
+Batch rendering for `tg-build-deployment --batch`.
+
+Renders many configs in one invocation, spread over a pool of worker
+processes.  Each worker is long-lived, so template indexes and other
+per-process caches stay warm across the entries it renders.  Input is
+either a directory of config .json files, all rendered with the
+command-line template / platform, or a JSONL file with one entry per
+line:
+
+    {"name": "acme", "input": "acme/config.json",
+     "template": "2.7", "platform": "eks-k8s"}
+
+Entries give the config either as "input", a path relative to the
+JSONL file, or inline as "config".  "template", "version", "platform",
+"latest", "latest_stable" and "compression" default to the command-line
+values.  Each entry is written to <output-dir>/<name>.zip (or .tar.zst),
+so names can't contain a path separator or be "..", and a summary of
+successes, failures, timings and compression ratios to
+<output-dir>/summary.json.
+"""
+
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import time
+
+from . packager import Packager
+from . archive import write_archive
+
+FIELDS = [
+    "template", "version", "platform", "latest", "latest_stable",
+    "compression",
+]
+
+def valid_name(name):
+    """True if an entry name is a plain file name, so its output stays
+    in the output directory"""
+
+    if not isinstance(name, str) or name in ["", ".", ".."]:
+        return False
+
+    return not any(
+        sep in name for sep in [os.sep, os.altsep, "/"] if sep
+    )
+
+def load_batch(path, defaults):
+    """Read batch entries from a directory of configs or a JSONL file.
+    Returns a list of dicts with name, config and the Packager
+    arguments."""
+
+    entries = []
+
+    if os.path.isdir(path):
+
+        for file in sorted(os.listdir(path)):
+
+            if not file.endswith(".json"):
+                continue
+
+            with open(os.path.join(path, file)) as f:
+                config = f.read()
+
+            entries.append({
+                **defaults,
+                "name": file[:-len(".json")],
+                "config": config,
+            })
+
+        return entries
+
+    base = os.path.dirname(path)
+
+    with open(path) as f:
+
+        for n, line in enumerate(f, 1):
+
+            if not line.strip():
+                continue
+
+            try:
+                item = json.loads(line)
+            except Exception as e:
+                raise RuntimeError(f"{path}:{n}: Bad JSON: {e}")
+
+            if "config" in item:
+                config = json.dumps(item["config"])
+            elif "input" in item:
+                with open(os.path.join(base, item["input"])) as c:
+                    config = c.read()
+            else:
+                raise RuntimeError(f"{path}:{n}: No config or input")
+
+            entry = {
+                k: item.get(k, defaults.get(k))
+                for k in FIELDS
+            }
+            entry["name"] = item.get("name", f"entry-{n}")
+            entry["config"] = config
+
+            if not valid_name(entry["name"]):
+                raise RuntimeError(
+                    f"{path}:{n}: Bad name: {entry['name']!r}"
+                )
+
+            entries.append(entry)
+
+    names = [e["name"] for e in entries]
+    if len(set(names)) != len(names):
+        raise RuntimeError(f"{path}: Entry names must be unique")
+
+    return entries
+
+def init_worker():
+    # Per-entry progress and errors go in the summary, not the log
+    logging.disable(logging.ERROR)
+
+def render_entry(entry, output_dir, cache=None):
+    """Render one batch entry to <output_dir>/<name>.zip, returning its
+    summary record.  Runs in a worker process.  cache holds the
+    Packager's disk cache arguments, if any."""
+
+    start = time.monotonic()
+
+    result = {
+        "name": entry["name"],
+        "platform": entry.get("platform"),
+    }
+
+    try:
+
+        pkg = Packager(**{k: entry.get(k) for k in FIELDS}, **(cache or {}))
+
+        result["template"] = pkg.template
+        result["version"] = pkg.version
+
+        files = pkg.generate_files(entry["config"])
+
+        output = os.path.join(
+            output_dir, entry["name"] + pkg.compression.extension
+        )
+
+        with open(output, "wb") as f:
+            archive = write_archive(files, f, pkg.compression)
+
+        stats = archive.stats()
+
+        result["status"] = "ok"
+        result["output"] = output
+        result["bytes"] = stats["compressed"]
+        result["compression"] = stats
+
+    except Exception as e:
+
+        result["status"] = "error"
+        result["error"] = str(e)
+
+    result["seconds"] = round(time.monotonic() - start, 3)
+
+    return result
+
+def run_batch(entries, output_dir, workers=None, cache=None):
+    """Render entries over a pool of worker processes and write
+    summary.json.  Returns the summary."""
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    start = time.monotonic()
+
+    if workers == 1:
+
+        init_worker()
+
+        try:
+            results = [
+                render_entry(e, output_dir, cache) for e in entries
+            ]
+        finally:
+            logging.disable(logging.NOTSET)
+
+    else:
+
+        # Workers are spawned rather than forked: the Go runtime behind
+        # gojsonnet does not survive a fork of a process that loaded it.
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, initializer=init_worker,
+                mp_context=multiprocessing.get_context("spawn"),
+        ) as pool:
+            results = list(pool.map(
+                render_entry, entries, [output_dir] * len(entries),
+                [cache] * len(entries),
+            ))
+
+    elapsed = time.monotonic() - start
+
+    summary = {
+        "entries": len(results),
+        "succeeded": len([r for r in results if r["status"] == "ok"]),
+        "failed": len([r for r in results if r["status"] != "ok"]),
+        "seconds": round(elapsed, 3),
+        "results": results,
+    }
+
+    with open(os.path.join(output_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=4)
+
+    return summary
@@ -0,0 +1,219 @@
+"""
+Packed template bundles.
+
+A bundle is a single read-only file holding a template version's
+templates/<ver> and resources/<ver> trees, so the service can mmap one
+file per version instead of walking thousands of loose files.  Layout:
+
+    header   magic b"TGBUNDLE", format version, index length (<8sII)
+    index    UTF-8 JSON: {"files": {name: [offset, length]},
+                          "dirs": [name, ...],
+                          "source": fingerprint}
+    data     file contents, concatenated
+
+Names are "templates/<rel>" or "resources/<rel>", relative to the
+version directory.  Offsets are from the start of the file.  The
+source fingerprint (see fingerprint) identifies the loose files the
+bundle was packed from: where they are still present, as in a source
+checkout, Resolver only uses a bundle whose fingerprint matches them,
+so edits to templates/ or resources/ are never hidden by a stale
+bundle.
+
+Run as a script to pack every version of a package tree, e.g. at
+build time:
+
+    python3 trustgraph_configurator/bundle.py trustgraph_configurator
+
+With --prune, the packed templates/<ver> and resources/<ver> trees are
+then deleted, for a throwaway build tree whose wheel should ship only
+the bundles (see Containerfile).
+
+This module only uses the standard library so the build step can run
+before the package's dependencies are installed.
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+
+MAGIC = b"TGBUNDLE"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sII")
+
+TREES = ["templates", "resources"]
+
+def bundle_path(package_dir, template):
+    return os.path.join(package_dir, "bundles", f"{template}.tgb")
+
+def fingerprint(templates, resources):
+    """Hex digest of the name, size and modification time of every file
+    in a version's templates and resources trees.  Only stats the
+    files, so it is cheap enough to check each time a version is
+    loaded; a copy which loses modification times only costs falling
+    back to the loose files."""
+
+    h = hashlib.sha256()
+
+    for tree, top in zip(TREES, [templates, resources]):
+        for root, subdirs, files in os.walk(top):
+            subdirs.sort()
+            rel_root = os.path.relpath(root, top)
+            for file in sorted(files):
+                st = os.stat(os.path.join(root, file))
+                name = os.path.normpath(os.path.join(tree, rel_root, file))
+                h.update(
+                    f"{name}\0{st.st_size}\0{st.st_mtime_ns}\0".encode(
+                        "utf-8"
+                    )
+                )
+
+    return h.hexdigest()
+
+def pack(templates, resources, output):
+    """Pack the templates and resources directories of one version
+    into a bundle file at output"""
+
+    contents = []
+    dirs = []
+
+    source = fingerprint(templates, resources)
+
+    for tree, top in zip(TREES, [templates, resources]):
+        for root, subdirs, files in os.walk(top):
+            subdirs.sort()
+            rel_root = os.path.relpath(root, top)
+            dirs.append(os.path.normpath(os.path.join(tree, rel_root)))
+            for file in sorted(files):
+                with open(os.path.join(root, file), "rb") as f:
+                    contents.append((
+                        os.path.normpath(os.path.join(tree, rel_root, file)),
+                        f.read()
+                    ))
+
+    # Offsets depend on the index length, and the index holds the
+    # offsets, so lay out relative offsets and shift once the index
+    # size is known.  The shift can lengthen the index, hence the loop.
+    base = 0
+
+    while True:
+
+        files = {}
+        offset = base
+        for name, data in contents:
+            files[name] = [offset, len(data)]
+            offset += len(data)
+
+        index = json.dumps(
+            {"files": files, "dirs": dirs, "source": source},
+            sort_keys=True
+        ).encode("utf-8")
+
+        start = HEADER.size + len(index)
+        if start == base:
+            break
+        base = start
+
+    tmp = output + ".tmp"
+
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(index)))
+        f.write(index)
+        for name, data in contents:
+            f.write(data)
+
+    os.replace(tmp, output)
+
+class Bundle:
+
+    def __init__(self, path):
+
+        self.path = path
+
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.view = memoryview(self.mmap)
+
+        magic, version, length = HEADER.unpack_from(self.mmap, 0)
+
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise RuntimeError(f"Bad template bundle {path}")
+
+        index = json.loads(
+            bytes(self.view[HEADER.size:HEADER.size + length])
+        )
+
+        self.index = index["files"]
+        self.dirs = index["dirs"]
+
+        # None for bundles packed before fingerprints were recorded
+        self.source = index.get("source")
+
+    def files(self):
+        """Yield (name, content) for every file, where content is a
+        memoryview slice of the mapped bundle"""
+        for name, (offset, length) in self.index.items():
+            yield name, self.view[offset:offset + length]
+
+def pack_all(package_dir, prune=False):
+
+    templates = os.path.join(package_dir, "templates")
+    resources = os.path.join(package_dir, "resources")
+
+    os.makedirs(os.path.join(package_dir, "bundles"), exist_ok=True)
+
+    for template in sorted(os.listdir(templates)):
+
+        if not os.path.isdir(os.path.join(templates, template)):
+            continue
+
+        output = bundle_path(package_dir, template)
+
+        pack(
+            os.path.join(templates, template),
+            os.path.join(resources, template),
+            output
+        )
+
+        print(f"Wrote {output}.")
+
+        if prune:
+            shutil.rmtree(os.path.join(templates, template))
+            shutil.rmtree(
+                os.path.join(resources, template), ignore_errors=True
+            )
+            print(f"Removed the {template} templates and resources.")
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        prog="bundle",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    parser.add_argument(
+        'package_dir',
+        nargs='?',
+        default=os.path.dirname(os.path.abspath(__file__)),
+        help=f'Package directory containing templates/ and resources/ '
+        f'(default: this module\'s directory)'
+    )
+
+    parser.add_argument(
+        '--prune',
+        action='store_true',
+        help=f'Delete each version\'s templates and resources once packed, '
+        f'in a build tree which should ship only the bundles'
+    )
+
+    args = parser.parse_args()
+
+    pack_all(args.package_dir, prune=args.prune)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+In-memory render cache for tg-config-svc.
+
+Maps a (template, version, platform, compression, config hash) key to
+the finished deployment archive so identical generate requests are served without
+re-running the Jsonnet renderers.  The cache is a bounded LRU, limited
+both by entry count and by the total size of the cached bytes, and
+keeps hit / miss / eviction counters.
+
+SingleFlight covers the gap before a render lands in the cache: while
+a render for a key is in flight, identical requests wait on it rather
+than starting their own, and all receive its result.
+"""
+
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger("cache")
+logger.setLevel(logging.INFO)
+
+def canonical_config(config):
+    """Return the canonical JSON form of a config string: parsed and
+    re-serialized with sorted keys.  Raises ValueError on bad JSON."""
+    return json.dumps(json.loads(config), sort_keys=True)
+
+def config_hash(config):
+    """SHA-256 hex digest of a canonical config string"""
+    return hashlib.sha256(config.encode("utf-8")).hexdigest()
+
+class RenderCache:
+
+    def __init__(self, max_entries=128, max_bytes=64 * 1024 * 1024):
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.entries = collections.OrderedDict()
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(
+            template, version, platform, config, compression="stored",
+            artifact=None,
+    ):
+        """Cache key for a canonical config string.  A single artifact
+        (e.g. "resources.yaml") is keyed by it in place of the
+        compression."""
+        return (
+            template, version, platform, artifact or str(compression),
+            config_hash(config)
+        )
+
+    def get(self, key):
+
+        data = self.entries.get(key)
+
+        if data is None:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+
+        return data
+
+    def put(self, key, data):
+
+        # Entries which could never fit are not cached at all
+        if self.max_entries < 1 or len(data) > self.max_bytes:
+            return
+
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key))
+
+        self.entries[key] = data
+        self.size += len(data)
+
+        while (
+                len(self.entries) > self.max_entries or
+                self.size > self.max_bytes
+        ):
+            old_key, old = self.entries.popitem(last=False)
+            self.size -= len(old)
+            self.evictions += 1
+            logger.debug("Evicted %s", old_key)
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+class SingleFlight:
+
+    def __init__(self):
+
+        # Key -> task running the render
+        self.flights = {}
+
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key, fn):
+        """Await fn() for a key, or the call already in flight for it.
+        The call is shielded so one waiter going away doesn't cancel it
+        for the others."""
+
+        flight = self.flights.get(key)
+
+        if flight is None:
+
+            flight = asyncio.ensure_future(fn())
+            self.flights[key] = flight
+            self.started += 1
+
+            def done(f):
+                if self.flights.get(key) is f:
+                    del self.flights[key]
+                # Marks the exception retrieved if nobody awaited it
+                if not f.cancelled():
+                    f.exception()
+
+            flight.add_done_callback(done)
+
+        else:
+
+            self.coalesced += 1
+            logger.info("Joined in-flight render")
+
+        return await asyncio.shield(flight)
+
+    def stats(self):
+        return {
+            "in_flight": len(self.flights),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
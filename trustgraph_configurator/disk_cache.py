@@ -0,0 +1,244 @@
+"""
+On-disk render cache for tg-build-deployment.
+
+Deployment scripts often run tg-build-deployment several times for
+the same config (-O, then -R, then the full zip), and each process
+re-renders from scratch.  With --cache, the renderer outputs a run
+needs (the TrustGraph configuration, each platform's resources and the
+additionals list) are kept as JSON files in a cache directory, by
+default $XDG_CACHE_HOME/trustgraph-configurator, and later runs read
+them back instead of evaluating the Jsonnet again.
+
+Entries are content-addressed: the file name is a hash of the template,
+version, platform, artifact, a digest of the template tree (see
+Resolver.digest) and the canonical config, so an edited template or
+config never sees a stale entry.  Entries are written to a temporary
+file and renamed into place, so concurrent runs sharing the directory
+only ever read complete entries.  Once the directory holds more than
+max_bytes, the least recently used entries are deleted.
+
+The directory is only scanned on the first write and then when the
+cache's running total passes max_bytes.  The first scan seeds the
+total, and each write adds to it, so a write doesn't cost a stat of
+every entry.  Other runs' writes aren't counted until the next scan,
+which also corrects the total, so a shared directory can go past
+max_bytes by what they write in the meantime.
+
+The cache is best-effort: an unreadable or unwritable cache directory
+is logged and the render goes ahead without it.
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger("disk_cache")
+logger.setLevel(logging.INFO)
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Part of every key, bumped if the entry format changes
+FORMAT = 1
+
+# Temporary files older than this were left by a run which died
+# mid-write
+STALE_SECONDS = 3600
+
+def default_cache_dir():
+    """$XDG_CACHE_HOME/trustgraph-configurator, or ~/.cache/..."""
+
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+
+    return os.path.join(base, "trustgraph-configurator")
+
+class DiskCache:
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+
+        self.path = path
+        self.max_bytes = max_bytes
+
+        # Bytes of entries in the directory, as of the last scan plus
+        # this cache's writes since, or None before the first scan
+        self.size = None
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(template, version, platform, artifact, tree, config):
+        """Content address of a render.  The config is a JSON string,
+        hashed in canonical form; raises ValueError on bad JSON."""
+
+        doc = json.dumps({
+            "format": FORMAT,
+            "template": template,
+            "version": version,
+            "platform": platform,
+            "artifact": artifact,
+            "tree": tree,
+            "config": json.loads(config),
+        }, sort_keys=True)
+
+        return hashlib.sha256(doc.encode("utf-8")).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """The cached value for a key, or None"""
+
+        path = self.entry_path(key)
+
+        try:
+            with open(path, "rb") as f:
+                value = json.loads(f.read())
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Disk cache: can't read {path}: {e}")
+            self.misses += 1
+            return None
+
+        # The modification time orders entries for eviction
+        with contextlib.suppress(OSError):
+            os.utime(path)
+
+        self.hits += 1
+
+        return value
+
+    def put(self, key, value):
+
+        data = json.dumps(value).encode("utf-8")
+
+        if len(data) > self.max_bytes:
+            return
+
+        path = self.entry_path(key)
+
+        try:
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            # The entry being replaced, if any, no longer counts
+            try:
+                replaced = os.stat(path).st_size
+            except FileNotFoundError:
+                replaced = 0
+
+            fd, tmp = tempfile.mkstemp(
+                dir=os.path.dirname(path), prefix=".", suffix=".tmp"
+            )
+
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            except BaseException:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp)
+                raise
+
+        except OSError as e:
+            logger.warning(f"Disk cache: can't write {path}: {e}")
+            return
+
+        self.writes += 1
+
+        if self.size is None:
+            # The first scan counts this entry
+            self.evict()
+            return
+
+        self.size += len(data) - replaced
+
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        """(mtime, size, path) of each entry.  Removes stale temporary
+        files on the way."""
+
+        entries = []
+        now = time.time()
+
+        try:
+            subdirs = os.listdir(self.path)
+        except FileNotFoundError:
+            return entries
+
+        for sub in subdirs:
+
+            try:
+                files = os.scandir(os.path.join(self.path, sub))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+            with files:
+                for f in files:
+
+                    # Entries vanish as other runs evict them
+                    try:
+                        st = f.stat()
+                    except FileNotFoundError:
+                        continue
+
+                    if f.name.endswith(".tmp"):
+                        if now - st.st_mtime > STALE_SECONDS:
+                            with contextlib.suppress(OSError):
+                                os.unlink(f.path)
+                        continue
+
+                    if f.name.endswith(".json"):
+                        entries.append((st.st_mtime, st.st_size, f.path))
+
+        return entries
+
+    def evict(self):
+        """Delete the least recently used entries until the cache is
+        within max_bytes, and reset the running total to what is
+        left"""
+
+        try:
+            entries = self.entries()
+        except OSError as e:
+            logger.warning(f"Disk cache: can't scan {self.path}: {e}")
+            return
+
+        size = sum(e[1] for e in entries)
+
+        for mtime, length, path in sorted(entries):
+
+            if size <= self.max_bytes:
+                break
+
+            try:
+                os.unlink(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Disk cache: can't remove {path}: {e}")
+                continue
+
+            size -= length
+
+        self.size = size
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,76 @@
+"""
+YAML emission for docker-compose.yaml and resources.yaml.
+
+The renderers produce JSON-shaped data: dicts, lists, strings, numbers,
+booleans and nulls, with no shared references.  JsonDumper represents
+exactly those types with a direct type dispatch, skips the alias
+bookkeeping, and memoizes the implicit-tag resolution the serializer
+runs for every scalar.  It is built on libyaml's CSafeDumper when PyYAML
+has libyaml support, falling back to the pure-Python SafeDumper.
+
+Lines are not folded (the width is unbounded): libyaml and PyYAML's own
+emitter fold long quoted scalars at different points, and everything
+else they emit identically, so this keeps the output byte-for-byte the
+same whichever dumper is in use.
+"""
+
+import functools
+
+import yaml
+
+try:
+    from yaml import CSafeDumper
+except ImportError:
+    CSafeDumper = None
+
+WIDTH = 2 ** 31 - 1
+
+def json_dumper(base):
+    """A dumper class for JSON-shaped data built on a PyYAML dumper"""
+
+    class JsonDumper(base):
+
+        def ignore_aliases(self, data):
+            return True
+
+        def represent_data(self, data):
+
+            kind = type(data)
+
+            if kind is str:
+                return self.represent_str(data)
+
+            if kind is dict:
+                return self.represent_dict(data)
+
+            if kind is list:
+                return self.represent_list(data)
+
+            return super().represent_data(data)
+
+        @staticmethod
+        @functools.lru_cache(maxsize=8192)
+        def resolve_scalar(value, implicit):
+            return base.resolve(base, yaml.ScalarNode, value, implicit)
+
+        def resolve(self, kind, value, implicit):
+
+            if kind is yaml.ScalarNode:
+                return self.resolve_scalar(value, implicit)
+
+            return super().resolve(kind, value, implicit)
+
+    return JsonDumper
+
+PythonDumper = json_dumper(yaml.SafeDumper)
+
+if CSafeDumper is None:
+    CDumper = None
+    Dumper = PythonDumper
+else:
+    CDumper = json_dumper(CSafeDumper)
+    Dumper = CDumper
+
+def dump(data, dumper=None):
+    """Render JSON-shaped data as YAML"""
+    return yaml.dump(data, Dumper=dumper or Dumper, width=WIDTH)
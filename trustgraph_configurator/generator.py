@@ -27,7 +27,8 @@ class Generator:
         res = j.evaluate_snippet("config", config, import_callback=self.fetch)
         return json.loads(res)
 
-    def process_file(self, path):
-        content = path.read_text()
+    def process_file(self, path, content=None):
+        if content is None:
+            content = path.read_text()
         res = j.evaluate_snippet(str(path), content, import_callback=self.fetch)
         return json.loads(res)
@@ -1,7 +1,9 @@
 
 import dataclasses
-import importlib
+import importlib.resources
 import json
+import os
+import threading
 
 @dataclasses.dataclass
 class Platform:
@@ -29,18 +31,16 @@ def version_sort(x):
 def version_compare(a, b):
     return version_unpack(a) < version_unpack(b)
 
-class Index:
-
-    @staticmethod
-    def get_platforms():
+class Snapshot:
+    """The parsed index.json with its lookups precomputed, so repeated
+    Index calls don't re-read, re-parse or re-sort it"""
 
-        files = importlib.resources.files()
-        index = files.joinpath("templates").joinpath("index.json")
+    def __init__(self, ix, stamp):
 
-        with open(index) as f:
-            ix = json.load(f)
+        # (mtime, size) of the file this was read from
+        self.stamp = stamp
 
-        return [
+        self.platforms = [
             Platform(
                 name = v["name"],
                 description = v["description"]
@@ -48,16 +48,7 @@ class Index:
             for v in ix["platforms"]
         ]
 
-    @staticmethod
-    def get_templates():
-
-        files = importlib.resources.files()
-        index = files.joinpath("templates").joinpath("index.json")
-
-        with open(index) as f:
-            ix = json.load(f)
-
-        return [
+        self.templates = [
             Template(
                 name = v["name"],
                 description = v["description"],
@@ -67,16 +58,7 @@ class Index:
             for v in ix["templates"]
         ]
 
-    @staticmethod
-    def get_statuses():
-
-        files = importlib.resources.files()
-        index = files.joinpath("templates").joinpath("index.json")
-
-        with open(index) as f:
-            ix = json.load(f)
-
-        return [
+        self.statuses = [
             Status(
                 name = v["name"],
                 description = v["description"],
@@ -84,15 +66,77 @@ class Index:
             for v in ix["statuses"]
         ]
 
+        self.stable = [v for v in self.templates if v.status == "stable"]
+
+        # Name -> template.  Where a name appears more than once, the
+        # last entry wins, as it always has when selecting a version.
+        self.by_name = { v.name: v for v in self.templates }
+
+        self.platform_names = frozenset(v.name for v in self.platforms)
+        self.template_names = frozenset(v.name for v in self.templates)
+
+        latest = Index.sort_versions(self.templates)
+        self.latest = latest[-1] if latest else None
+
+        stable = Index.sort_versions(self.stable)
+        self.latest_stable = stable[-1] if stable else None
+
+class Index:
+
+    # Loaded on first use, and again whenever index.json changes
+    snapshot = None
+    path = None
+    lock = threading.Lock()
+
+    @staticmethod
+    def load():
+        """The current Snapshot of index.json, re-read only if the file
+        has changed since it was last read"""
+
+        if Index.path is None:
+            files = importlib.resources.files()
+            Index.path = files.joinpath("templates").joinpath("index.json")
+
+        st = os.stat(Index.path)
+        stamp = (st.st_mtime_ns, st.st_size)
+
+        snapshot = Index.snapshot
+        if snapshot is not None and snapshot.stamp == stamp:
+            return snapshot
+
+        with Index.lock:
+
+            snapshot = Index.snapshot
+            if snapshot is not None and snapshot.stamp == stamp:
+                return snapshot
+
+            with open(Index.path) as f:
+                snapshot = Snapshot(json.load(f), stamp)
+
+            Index.snapshot = snapshot
+
+        return snapshot
+
+    @staticmethod
+    def get_platforms():
+        return list(Index.load().platforms)
+
+    @staticmethod
+    def get_templates():
+        return list(Index.load().templates)
+
+    @staticmethod
+    def get_statuses():
+        return list(Index.load().statuses)
+
     @staticmethod
     def get_stable():
+        return list(Index.load().stable)
 
-        return [
-            v
-            for v in filter(
-                    lambda x: x.status == "stable", Index.get_templates()
-            )
-        ]
+    @staticmethod
+    def get_template(name):
+        """The template with this name, or None if it isn't known"""
+        return Index.load().by_name.get(name)
 
     @staticmethod
     def sort_versions(versions):
@@ -103,19 +147,19 @@ class Index:
 
     @staticmethod
     def get_latest():
-        v = Index.sort_versions(Index.get_templates())
+        v = Index.load().latest
 
-        if len(v) < 1:
+        if v is None:
             raise RuntimeError("No latest version")
 
-        return v[-1]
+        return v
 
     @staticmethod
     def get_latest_stable():
-        v = Index.sort_versions(Index.get_stable())
+        v = Index.load().latest_stable
 
-        if len(v) < 1:
+        if v is None:
             raise RuntimeError("No latest stable version")
 
-        return v[-1]
+        return v
 
@@ -0,0 +1,245 @@
+"""
+Render jobs for tg-config-svc's asynchronous API.
+
+A large multi-platform render can outlast a front end's request
+timeout.  POST /api/jobs/{platform}/{template} starts the render and
+returns a job id at once; GET /api/jobs/{id} reports the job's
+progress through the render stages, and GET /api/jobs/{id}/result
+fetches the archive once it is done.
+
+JobStore holds the jobs.  It is bounded by the number of jobs and the
+total size of the finished archives, evicting the oldest finished jobs
+to make room, and finished jobs expire a TTL after they finish.  Jobs
+live in the memory of the server process which created them; with
+several server processes, job ids start with that process's index so
+the others can forward requests for them to it (see Api.forward).
+"""
+
+import collections
+import logging
+import time
+import uuid
+
+logger = logging.getLogger("jobs")
+logger.setLevel(logging.INFO)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+def progress_stage(stage, name):
+    """The job stage a render stage (see Packager.stage) belongs to"""
+
+    if stage == "archive":
+        return "zip"
+
+    if stage == "json":
+        if name == "trustgraph/config.json":
+            return "tg-config"
+        if name == "additionals.json":
+            return "additionals"
+
+    if stage == "jsonnet":
+        if name == "config-to-tg-configuration.jsonnet":
+            return "tg-config"
+        if name == "config-to-additionals.jsonnet":
+            return "additionals"
+
+    # Platform renderers, the multi-platform renderer and YAML output
+    return "resources"
+
+class StoreFull(Exception):
+    pass
+
+class Job:
+
+    def __init__(self, key, prefix=""):
+
+        self.id = prefix + uuid.uuid4().hex
+        self.key = key
+        self.status = QUEUED
+        self.error = None
+
+        self.created = time.time()
+        self.finished = None
+        self.expires = None
+
+        # Job stage -> dict of status, steps started, steps running
+        # and seconds
+        self.stages = collections.OrderedDict()
+
+        # Archive bytes and stats, once done, and the render's profile
+        # if the job asked for one
+        self.data = None
+        self.stats = None
+        self.profile = None
+
+        self.task = None
+
+    @property
+    def size(self):
+        return len(self.data) if self.data is not None else 0
+
+    def progress(self, stage, name, seconds):
+        """Record a render stage starting (seconds None) or ending"""
+
+        self.status = RUNNING
+
+        s = self.stages.setdefault(
+            progress_stage(stage, name),
+            { "status": RUNNING, "seconds": 0.0, "steps": 0, "active": 0 },
+        )
+
+        # Stages nest: a renderer importing trustgraph/config.json runs
+        # the tg-config renderer inside its own evaluation
+        if seconds is None:
+            s["steps"] += 1
+            s["active"] += 1
+        else:
+            s["active"] -= 1
+            if s["active"] == 0:
+                s["seconds"] = round(s["seconds"] + seconds, 3)
+
+        s["status"] = RUNNING if s["active"] else DONE
+
+    def describe(self):
+
+        return {
+            "id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+            "expires": self.expires,
+            "stages": [
+                {
+                    "stage": stage,
+                    "status": s["status"],
+                    "steps": s["steps"],
+                    "seconds": s["seconds"],
+                }
+                for stage, s in self.stages.items()
+            ],
+            "archive": self.stats,
+            "profile": self.profile,
+        }
+
+class JobStore:
+
+    def __init__(
+            self, max_jobs=64, max_bytes=256 * 1024 * 1024, ttl=600,
+            prefix="",
+    ):
+
+        self.max_jobs = max_jobs
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        # Start of every job id
+        self.prefix = prefix
+
+        # Job id -> Job, oldest first
+        self.jobs = collections.OrderedDict()
+        self.size = 0
+
+        self.expired = 0
+        self.evicted = 0
+
+    def purge(self):
+        """Drop expired jobs"""
+
+        now = time.time()
+
+        for job in list(self.jobs.values()):
+            if job.expires is not None and job.expires <= now:
+                self.remove(job.id)
+                self.expired += 1
+
+    def evict(self, max_jobs, max_bytes):
+        """Drop the oldest finished jobs until within limits.  Returns
+        False if running jobs alone exceed them."""
+
+        for job in list(self.jobs.values()):
+
+            if len(self.jobs) <= max_jobs and self.size <= max_bytes:
+                return True
+
+            if job.finished is not None:
+                self.remove(job.id)
+                self.evicted += 1
+                logger.debug(f"Evicted job {job.id}")
+
+        return len(self.jobs) <= max_jobs and self.size <= max_bytes
+
+    def create(self, key):
+        """A new queued job.  Raises StoreFull if every slot is held by
+        an unfinished job."""
+
+        self.purge()
+
+        if not self.evict(self.max_jobs - 1, self.max_bytes):
+            raise StoreFull("Too many jobs in progress")
+
+        job = Job(key, self.prefix)
+        self.jobs[job.id] = job
+
+        return job
+
+    def get(self, id):
+        self.purge()
+        return self.jobs.get(id)
+
+    def remove(self, id):
+
+        job = self.jobs.pop(id, None)
+
+        if job is None:
+            return None
+
+        self.size -= job.size
+
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+
+        return job
+
+    def finish(self, job, data=None, stats=None, error=None):
+        """Mark a job done with its archive, or failed with an error"""
+
+        job.finished = time.time()
+        job.expires = job.finished + self.ttl
+
+        if job.id not in self.jobs:
+            # Removed while running
+            return
+
+        if error is None and len(data) > self.max_bytes:
+            error = "Result too large to hold"
+
+        if error is not None:
+            job.status = FAILED
+            job.error = error
+            return
+
+        job.status = DONE
+        job.data = data
+        job.stats = stats
+        self.size += job.size
+
+        self.evict(self.max_jobs, self.max_bytes)
+
+    def stats(self):
+
+        statuses = collections.Counter(j.status for j in self.jobs.values())
+
+        return {
+            "jobs": len(self.jobs),
+            "bytes": self.size,
+            "queued": statuses[QUEUED],
+            "running": statuses[RUNNING],
+            "done": statuses[DONE],
+            "failed": statuses[FAILED],
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
@@ -12,9 +12,7 @@ import logging
 import argparse
 import tabulate
 
-from . import Index
-
-from . import Generator, Packager
+from . index import Index
 
 def list_templates():
 
@@ -0,0 +1,226 @@
+"""
+Prometheus metrics for tg-config-svc.
+
+A small, dependency-free implementation of the Prometheus text
+exposition format: counters, gauges and histograms with labels, held in
+a Registry which renders them for the /metrics endpoint.  Counters and
+gauges can instead be read from a callback when scraped, which is how
+the render cache, admission and worker pool stats are exported.
+
+merge combines the rendered metrics of several server processes into
+one exposition, each sample labelled with its server's index, so a
+scrape reaching any process sees every process's series.
+"""
+
+import math
+import threading
+
+def format_labels(names, values):
+
+    if not names:
+        return ""
+
+    def escape(v):
+        return (
+            str(v).replace("\\", "\\\\").replace("\n", "\\n")
+            .replace('"', '\\"')
+        )
+
+    return "{" + ",".join(
+        f'{n}="{escape(v)}"' for n, v in zip(names, values)
+    ) + "}"
+
+def format_value(v):
+    if v == math.inf:
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+class Metric:
+
+    kind = None
+
+    def __init__(self, name, help, labels=(), fn=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.fn = fn
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def header(self):
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+    def samples(self):
+        """Label values -> value.  A metric with a callback reads it
+        when scraped: fn returns a number, or for a metric with labels
+        a dict of label value tuples to numbers."""
+
+        if self.fn is None:
+            with self.lock:
+                return dict(self.values)
+
+        values = self.fn()
+
+        if not self.labels:
+            return { (): values }
+
+        return values
+
+    def render(self):
+        lines = self.header()
+        for key, value in sorted(self.samples().items()):
+            lines.append(
+                f"{self.name}{format_labels(self.labels, key)} "
+                f"{format_value(value)}"
+            )
+        return lines
+
+class Counter(Metric):
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.samples().get(self.key(labels), 0)
+
+class Gauge(Metric):
+
+    kind = "gauge"
+
+class Histogram(Metric):
+
+    kind = "histogram"
+
+    BUCKETS = (
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60,
+    )
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, **labels):
+
+        key = self.key(labels)
+
+        with self.lock:
+
+            counts, total = self.values.get(
+                key, ([0] * len(self.buckets), 0.0)
+            )
+
+            for n, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[n] += 1
+
+            self.values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        counts, total = self.values.get(self.key(labels), ([0], 0.0))
+        return counts[-1]
+
+    def render(self):
+
+        lines = self.header()
+        names = self.labels + ("le",)
+
+        with self.lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(
+                        f"{self.name}_bucket"
+                        f"{format_labels(names, key + (format_value(bound),))}"
+                        f" {count}"
+                    )
+                labels = format_labels(self.labels, key)
+                lines.append(
+                    f"{self.name}_sum{labels} {format_value(total)}"
+                )
+                lines.append(f"{self.name}_count{labels} {counts[-1]}")
+
+        return lines
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.add(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.add(Histogram(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.add(Gauge(*args, **kwargs))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+def families(text):
+    """Rendered metrics split into (header lines, sample lines) per
+    metric, in order"""
+
+    result = []
+
+    for line in text.splitlines():
+        if not line:
+            continue
+        if line.startswith("# HELP"):
+            result.append(([line], []))
+        elif line.startswith("#"):
+            result[-1][0].append(line)
+        else:
+            result[-1][1].append(line)
+
+    return result
+
+def with_label(line, name, value):
+    """A sample line with a label added in front of its others"""
+
+    label = format_labels((name,), (value,))[1:-1]
+
+    metric, brace, rest = line.partition("{")
+    if brace:
+        return f"{metric}{{{label},{rest}"
+
+    metric, space, rest = line.partition(" ")
+    return f"{metric}{{{label}}} {rest}"
+
+def merge(rendered, label="server"):
+    """One exposition from (server, rendered metrics) pairs: each
+    metric's header once, followed by every server's samples, labelled
+    with the server"""
+
+    merged = {}
+
+    for server, text in rendered:
+        for header, samples in families(text):
+            entry = merged.setdefault(header[0], (header, []))
+            entry[1].extend(with_label(s, label, server) for s in samples)
+
+    lines = []
+    for header, samples in merged.values():
+        lines.extend(header)
+        lines.extend(samples)
+
+    return "\n".join(lines) + "\n"
@@ -7,34 +7,128 @@ the platform-specific renderer (config-to-docker-compose.jsonnet,
 config-to-<k8s-flavour>.jsonnet, etc.) and emits a zip containing
 the deployment artefacts: docker-compose.yaml or resources.yaml,
 plus any trustgraph/config.json and additional files declared by
-the template's config-to-additionals.jsonnet renderer.
-
-Also exposes write_tg_config / write_resources for writing a single
-artefact to stdout instead of producing a zip.
+the template's config-to-additionals.jsonnet renderer.  Renders
+produce a list of (name, content) entries, which are packed into a
+zip, or a zstd-compressed tar, with the configured compression (see
+archive.py).
+
+Also exposes render_artifact for rendering a single artefact (the
+resources, TrustGraph configuration or additionals) instead of the
+whole deployment, used by write_tg_config / write_resources to write
+one to stdout instead of producing a zip.
 """
 
 import pathlib
-import yaml
+import contextlib
 import json
 import logging
 import importlib.resources
-from io import BytesIO
-import zipfile
 import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
 
-from . import Generator
+from . generator import Generator
 from . index import Index
+from . archive import Compression, archive_bytes, write_archive
+from . emitter import dump
+from . resolver import Resolver
+from . disk_cache import DiskCache, DEFAULT_MAX_BYTES
 
 logger = logging.getLogger("packager")
 logger.setLevel(logging.INFO)
 
+COMPOSE_PLATFORMS = set(["docker-compose", "podman-compose"])
+
+K8S_PLATFORMS = set([
+    "minikube-k8s", "gcp-k8s", "aks-k8s", "eks-k8s",
+    "scw-k8s", "ovh-k8s", "ack-k8s"
+])
+
+PLATFORMS = COMPOSE_PLATFORMS | K8S_PLATFORMS | set(["aca"])
+
+def peak_rss():
+    """Peak resident set size of this process over its lifetime, in
+    bytes, or None where it can't be read"""
+
+    if resource is None:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Bytes on macOS, kilobytes elsewhere
+    return rss if sys.platform == "darwin" else rss * 1024
+
 class Packager:
 
     def __init__(
             self, version, template, platform,
-            latest, latest_stable,
+            latest, latest_stable, compression=None,
+            cache_dir=None, cache_bytes=DEFAULT_MAX_BYTES,
     ):
 
+        template, version = Packager.select(
+            version, template, latest, latest_stable
+        )
+
+        files = importlib.resources.files()
+
+        self.template = template
+        self.version = version
+        self.templates = files.joinpath("templates").joinpath(template)
+        self.resources = files.joinpath("resources").joinpath(template)
+        self.platform = platform
+        self.compression = Compression(compression)
+
+        # In-memory index of this version's template and resource files
+        self.resolver = Resolver.get(template)
+
+        # Rendered trustgraph/config.json for the current config, as a
+        # (config, object, serialized bytes) tuple.  Several renderers
+        # import the virtual trustgraph/config.json file, so it is
+        # evaluated once per config and reused.
+        self.tg_config_memo = None
+
+        # Renderer outputs kept across runs, if enabled (see
+        # disk_cache.py)
+        self.disk_cache = None
+        if cache_dir is not None:
+            self.disk_cache = DiskCache(cache_dir, cache_bytes)
+
+        # Platforms rendered by config-to-platforms.jsonnet, supplied to
+        # it as the virtual platforms.json file
+        self.render_platforms = []
+
+        # (stage, name, seconds) for each Jsonnet evaluation and YAML
+        # serialization of the last render, for the service's metrics.
+        # Renderers importing trustgraph/config.json include its time.
+        self.timings = []
+
+        # Called with (stage, name, None) as each stage starts, and
+        # (stage, name, seconds) as it ends, to report progress
+        self.progress = None
+
+        # For profile(): the last render's stages as (stage, name,
+        # start, seconds, depth), with start relative to the start of
+        # the render and depth counting the stages it runs inside, and
+        # the imports Jsonnet fetched, and the process's peak RSS when
+        # the render started
+        self.started = time.monotonic()
+        self.started_rss = peak_rss()
+        self.stages = []
+        self.depth = 0
+        self.fetches = 0
+        self.fetched_bytes = 0
+
+    @staticmethod
+    def select(version, template, latest, latest_stable):
+        """The (template, version) a Packager with these arguments
+        renders"""
+
         if latest:
             version = Index.get_latest().version
             template = Index.get_latest().name
@@ -49,39 +143,65 @@ class Packager:
             )
 
         if version is None:
-            versions = [
-                v
-                for v in Index.get_templates()
-                if v.name == template
-            ]
-            if len(versions) < 1:
+            known = Index.get_template(template)
+            if known is None:
                 raise RuntimeError(f"Template {template} not known")
-            version = versions[-1].version
+            version = known.version
 
-        files = importlib.resources.files()
+        return template, version
 
-        self.template = template
-        self.version = version
-        self.templates = files.joinpath("templates").joinpath(template)
-        self.resources = files.joinpath("resources").joinpath(template)
-        self.platform = platform
+    def begin(self):
+        """Reset the per-render state: the TG config memo, the timings
+        and the profile"""
+
+        self.tg_config_memo = None
+        self.timings = []
+
+        self.started = time.monotonic()
+        self.started_rss = peak_rss()
+        self.stages = []
+        self.fetches = 0
+        self.fetched_bytes = 0
 
     def fetch(self, dir, filename):
+        """Jsonnet import callback, counting the imports"""
+
+        path, content = self.fetch_file(dir, filename)
+
+        self.fetches += 1
+        self.fetched_bytes += len(content)
+
+        return path, content
+
+    def fetch_file(self, dir, filename):
 
         if filename == "trustgraph/config.json":
-            config = self.generate_trustgraph_config(self.config)
-            config = json.dumps(config)
             path = self.templates.joinpath(dir, filename)
-            return str(path), config.encode("utf-8")
+            return str(path), self.render_trustgraph_config()[2]
         
         if filename == "config.json":
             path = self.templates.joinpath(dir, filename)
             return str(path), self.config.encode("utf-8")
         
+        if filename == "platforms.json":
+            path = self.templates.joinpath(dir, filename)
+            return str(path), json.dumps(self.render_platforms).encode("utf-8")
+
         if filename == "version.jsonnet":
             path = self.templates.joinpath(dir, filename)
             return str(path), f"\"{self.version}\"".encode("utf-8")
 
+        if filename == "vertexai/private.json":
+            path = self.templates.joinpath(dir, filename)
+            private_json = "Put your GCP private.json here"
+            return str(path), private_json.encode("utf-8")
+
+        found = self.resolver.resolve(dir, filename)
+        if found is not None:
+            path, content = found
+            return path, bytes(content)
+
+        # Not in the template tree, fall back to the filesystem
         if dir:
             candidates = [
                 self.templates.joinpath(dir, filename),
@@ -96,10 +216,6 @@ class Packager:
 
         try:
 
-            if filename == "vertexai/private.json":
-                private_json = "Put your GCP private.json here"
-                return str(candidates[0]), (private_json.encode("utf-8"))
-
             for c in candidates:
                 logger.debug("Try: %s", c)
 
@@ -120,48 +236,281 @@ class Packager:
                 logger.debug("Loaded: %s", path)
                 return str(path), f.read()
 
+    def has_renderers_dir(self):
+        return self.resolver.isdir(self.templates.joinpath("renderers"))
+
+    def renderer_path(self, renderer_name):
+        if self.has_renderers_dir():
+            return self.templates.joinpath(f"renderers/{renderer_name}")
+        else:
+            return self.templates.joinpath(renderer_name)
+
+    def has_renderer(self, renderer_name):
+        return self.resolver.isfile(self.renderer_path(renderer_name))
+
     def process_renderer(self, renderer_name):
         gen = Generator(fetch=self.fetch)
-        renderers_dir = self.templates.joinpath("renderers")
-        if renderers_dir.exists():
-            path = self.templates.joinpath(f"renderers/{renderer_name}")
-            return gen.process_file(path)
-        else:
-            path = self.templates.joinpath(renderer_name)
-            return gen.process(path.read_text())
+        path = self.renderer_path(renderer_name)
+        content = self.resolver.read(path)
+        if content is None:
+            raise RuntimeError(f"Renderer {renderer_name} not found")
+        with self.stage("jsonnet", renderer_name):
+            if self.has_renderers_dir():
+                return gen.process_file(path, str(content, "utf-8"))
+            else:
+                return gen.process(str(content, "utf-8"))
+
+    def dump(self, name, data):
+        """Serialize an output file's data to YAML"""
+        with self.stage("yaml", name):
+            return dump(data)
+
+    def dump_json(self, name, data, indent):
+        """Serialize an output file's data to JSON"""
+        with self.stage("json", name):
+            return json.dumps(data, indent=indent)
+
+    @contextlib.contextmanager
+    def stage(self, stage, name):
+        """Time a render stage, reporting its progress"""
+
+        if self.progress:
+            self.progress(stage, name, None)
+
+        start = time.monotonic()
+        depth = self.depth
+        self.depth += 1
+
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            seconds = time.monotonic() - start
+            self.timings.append((stage, name, seconds))
+            self.stages.append(
+                (stage, name, start - self.started, seconds, depth)
+            )
+            if self.progress:
+                self.progress(stage, name, seconds)
+
+    def profile(self):
+        """Where the last render's time went: each stage, totals for
+        each kind of stage counting only the outermost stages, the
+        number and size of the imports fetched, and the process's
+        peak RSS and how far this render raised it"""
+
+        totals = {}
+
+        for stage, name, start, seconds, depth in self.stages:
+            if depth == 0:
+                totals[stage] = totals.get(stage, 0.0) + seconds
+
+        peak = peak_rss()
+
+        return {
+            "template": self.template,
+            "version": self.version,
+            "platform": self.platform,
+            "seconds": round(time.monotonic() - self.started, 6),
+            "stages": [
+                {
+                    "stage": stage,
+                    "name": name,
+                    "start": round(start, 6),
+                    "seconds": round(seconds, 6),
+                    "depth": depth,
+                }
+                for stage, name, start, seconds, depth in sorted(
+                    self.stages, key=lambda s: s[2]
+                )
+            ],
+            "totals": {
+                stage: round(seconds, 6)
+                for stage, seconds in totals.items()
+            },
+            "fetches": self.fetches,
+            "fetched_bytes": self.fetched_bytes,
+            # The lifetime peak of the process, which in a long-lived
+            # service worker may come from an earlier render, and how
+            # far this render raised it
+            "process_peak_rss_bytes": peak,
+            "peak_rss_growth_bytes": (
+                None if peak is None else peak - self.started_rss
+            ),
+        }
+
+    def disk_cache_key(self, artifact, platform):
+        """Disk cache key for an artifact of the current config"""
+        return DiskCache.key(
+            self.template, self.version, platform, artifact,
+            self.resolver.digest(), self.config,
+        )
+
+    def cached(self, artifact, platform, render):
+        """The output of render(), read from the disk cache if it has
+        it for the current config, and stored there if not"""
+
+        values = self.cached_parts([(artifact, platform)])
+
+        if values is not None:
+            return values[(artifact, platform)]
+
+        value = render()
+        self.cache_parts({ (artifact, platform): value })
+
+        return value
+
+    def cached_parts(self, parts):
+        """Dict of (artifact, platform) -> output from the disk cache,
+        or None unless it has every one of them"""
+
+        if self.disk_cache is None:
+            return None
+
+        values = {}
+
+        for artifact, platform in parts:
+
+            try:
+                key = self.disk_cache_key(artifact, platform)
+            except ValueError:
+                # Bad config JSON, which the render will report
+                return None
+
+            value = self.disk_cache.get(key)
+            if value is None:
+                return None
+
+            values[(artifact, platform)] = value
+
+        return values
+
+    def cache_parts(self, values):
+        """Store a dict of (artifact, platform) -> output in the disk
+        cache"""
+
+        if self.disk_cache is None:
+            return
+
+        for (artifact, platform), value in values.items():
+            try:
+                key = self.disk_cache_key(artifact, platform)
+            except ValueError:
+                return
+            self.disk_cache.put(key, value)
+
+    def render_trustgraph_config(self):
+        """Return the memoized (config, object, bytes) render of
+        trustgraph/config.json for self.config"""
+
+        memo = self.tg_config_memo
+
+        if memo is None or memo[0] != self.config:
+            tg_config = self.cached(
+                "tg-config", None,
+                lambda: self.process_renderer(
+                    "config-to-tg-configuration.jsonnet"
+                )
+            )
+            memo = (
+                self.config, tg_config,
+                json.dumps(tg_config).encode("utf-8"),
+            )
+            self.tg_config_memo = memo
+
+        return memo
 
     def generate_trustgraph_config(self, config):
         config = config.encode("utf-8")
-        return self.process_renderer("config-to-tg-configuration.jsonnet")
+        return self.render_trustgraph_config()[1]
 
     def generate_additionals(self, config):
         config = config.encode("utf-8")
-        return self.process_renderer("config-to-additionals.jsonnet")
+        return self.cached(
+            "additionals", None,
+            lambda: self.process_renderer("config-to-additionals.jsonnet")
+        )
 
-    def generate_resources(self, config):
+    def generate_resources(self, config, platform=None):
         config = config.encode("utf-8")
-        return self.process_renderer(f"config-to-{self.platform}.jsonnet")
-    
-    def write(self, config, output):
+        if platform is None:
+            platform = self.platform
+        return self.cached(
+            "resources", platform,
+            lambda: self.process_renderer(f"config-to-{platform}.jsonnet")
+        )
+
+    def is_multi_platform(self):
+        return self.platform == "all" or "," in self.platform
+
+    def select_platforms(self):
+        """Resolve the platform argument, which may be a single platform,
+        a comma-separated list or "all", to a list of platforms"""
+
+        if self.platform == "all":
+            return [
+                p.name
+                for p in Index.get_platforms()
+                if self.has_renderer(f"config-to-{p.name}.jsonnet")
+            ]
+
+        platforms = [p.strip() for p in self.platform.split(",")]
+
+        for p in platforms:
+            if p not in PLATFORMS:
+                raise RuntimeError("Bad platform")
+
+        return platforms
+
+    def write(self, config, output, split=False):
 
         try:
 
-            data = self.generate(config)
+            if split:
+                outputs = self.generate_each_files(config)
+            else:
+                outputs = { None: self.generate_files(config) }
 
             print("Writing output file...")
 
-            with open(output, "wb") as f:
-                f.write(data)
+            for platform, files in outputs.items():
+
+                if platform is None:
+                    path = output
+                else:
+                    path = self.split_path(output, platform)
+
+                with open(path, "wb") as f:
+                    with self.stage("archive", str(self.compression)):
+                        write_archive(files, f, self.compression)
 
-            print(f"Wrote {output}.")
+                print(f"Wrote {path}.")
 
         except Exception as e:
             logging.error(f"Exception: {e}")
             raise e
    
+    def split_path(self, output, platform):
+        """Output path for one platform's archive with --split"""
+
+        ext = self.compression.extension
+        if output.endswith(ext):
+            stem = output[:-len(ext)]
+        else:
+            stem, ext = os.path.splitext(output)
+
+        return f"{stem}-{platform}{ext}"
+
     def generate(self, config):
+        """The deployment archive, as bytes"""
+        return archive_bytes(self.generate_files(config), self.compression)
+
+    def generate_files(self, config):
+        """Render the deployment to a list of (name, content) zip
+        entries"""
 
         self.config = config
+        self.begin()
 
         logger.info(f"Generating for platform={self.platform} "
                     f"template={self.template} "
@@ -169,37 +518,190 @@ class Packager:
 
         try:
 
-            if self.platform in set(["docker-compose", "podman-compose"]):
-                data = self.generate_docker_compose(
+            if self.is_multi_platform():
+                files = self.generate_multi(config)
+            elif self.platform in COMPOSE_PLATFORMS:
+                files = self.generate_docker_compose(
                     "docker-compose", self.version, config
                 )
-            elif self.platform in set([
-                    "minikube-k8s", "gcp-k8s", "aks-k8s", "eks-k8s",
-                    "scw-k8s", "ovh-k8s", "ack-k8s"
-            ]):
-                data = self.generate_k8s(
+            elif self.platform in K8S_PLATFORMS:
+                files = self.generate_k8s(
                     self.platform, self.version, config
                 )
             elif self.platform == "aca":
-                data = self.generate_aca(
+                files = self.generate_aca(
                     self.platform, self.version, config
                 )
             else:
                 raise RuntimeError("Bad platform")
 
-            return data
+            return files
 
         except Exception as e:
             logging.error(f"Exception: {e}")
             raise e
+
+    def generate_platform_files(self, config):
+        """Render every selected platform from one config, returning a
+        dict of platform -> list of (name, content) zip entries.  The
+        decoded config and the TG config are shared across platforms."""
+
+        self.config = config
+
+        platforms = self.select_platforms()
+        version = self.version
+
+        compose = [p for p in platforms if p in COMPOSE_PLATFORMS]
+
+        if self.has_renderer("config-to-platforms.jsonnet"):
+
+            # All platforms from a single evaluation, unless the disk
+            # cache holds every part of it
+            parts = self.cached_parts(
+                [("resources", p) for p in platforms] +
+                [("tg-config", None), ("additionals", None)]
+            )
+
+            if parts is None:
+
+                self.render_platforms = platforms
+                rendered = self.process_renderer(
+                    "config-to-platforms.jsonnet"
+                )
+
+                parts = {
+                    ("resources", p): rendered["resources"][p]
+                    for p in platforms
+                }
+                parts[("tg-config", None)] = rendered["tgConfig"]
+                parts[("additionals", None)] = rendered["additionals"]
+
+                self.cache_parts(parts)
+
+            resources = { p: parts[("resources", p)] for p in platforms }
+            tg_config_json = parts[("tg-config", None)]
+            additionals = parts[("additionals", None)]
+            has_additionals = True
+
+        else:
+
+            # Older versions, one renderer per platform.  The TG config
+            # is still only rendered once, through the memo.
+            resources = {
+                p: self.generate_resources(config, p)
+                for p in platforms
+            }
+
+            tg_config_json = None
+            if compose and version[:2] != "0." and version[:3] != "1.0":
+                tg_config_json = self.generate_trustgraph_config(config)
+
+            has_additionals = self.has_renderer(
+                "config-to-additionals.jsonnet"
+            )
+
+            additionals = []
+            if compose and has_additionals:
+                additionals = self.generate_additionals(config)
+
+        files = {}
+
+        for p in platforms:
+            if p in COMPOSE_PLATFORMS:
+                files[p] = self.docker_compose_files(
+                    version, resources[p], tg_config_json,
+                    additionals, has_additionals
+                )
+            elif p in K8S_PLATFORMS:
+                files[p] = self.k8s_files(resources[p])
+            else:
+                files[p] = self.aca_files(resources[p])
+
+        return files
+
+    def generate_multi(self, config):
+        """Entries for a single zip holding each platform's deployment
+        in a directory named after the platform"""
+
+        files = self.generate_platform_files(config)
+
+        return [
+            (f"{platform}/{name}", content)
+            for platform, entries in files.items()
+            for name, content in entries
+        ]
+
+    def generate_each(self, config):
+        """One zip per platform, as a dict of platform -> zip"""
+
+        return {
+            platform: archive_bytes(entries, self.compression)
+            for platform, entries in self.generate_each_files(config).items()
+        }
+
+    def generate_each_files(self, config):
+        """Entries for one zip per platform, as a dict of platform ->
+        list of (name, content)"""
+
+        self.begin()
+
+        logger.info(f"Generating for platform={self.platform} "
+                    f"template={self.template} "
+                    f"version={self.version}")
+
+        return self.generate_platform_files(config)
     
+    def render_artifact(self, config, artifact, format=None):
+        """A single artifact of the deployment, serialized, running only
+        the renderers it needs: "resources", the platform resources as
+        YAML (JSON for aca) or in the given format, "tg-config", the
+        TrustGraph configuration, or "additionals", the additional
+        config files list, both as JSON"""
+
+        self.config = config
+        self.begin()
+
+        if artifact == "tg-config":
+            return self.dump_json(
+                "trustgraph/config.json",
+                self.generate_trustgraph_config(config), 4,
+            )
+
+        if artifact == "additionals":
+            if not self.has_renderer("config-to-additionals.jsonnet"):
+                raise RuntimeError(
+                    f"Template {self.template} has no additionals"
+                )
+            return self.dump_json(
+                "additionals.json", self.generate_additionals(config), 2
+            )
+
+        if artifact != "resources":
+            raise RuntimeError(f"Bad artifact: {artifact}")
+
+        if self.platform not in PLATFORMS:
+            raise RuntimeError("Bad platform")
+
+        if format is None:
+            format = "json" if self.platform == "aca" else "yaml"
+
+        if format not in ("json", "yaml"):
+            raise RuntimeError(f"Bad format: {format}")
+
+        processed = self.generate_resources(config)
+
+        if format == "json":
+            return self.dump_json("resources.json", processed, 2)
+
+        if self.platform in COMPOSE_PLATFORMS:
+            return self.dump("docker-compose.yaml", processed)
+
+        return self.dump("resources.yaml", processed)
+
     def write_tg_config(self, config):
         """Output only the TrustGraph configuration to stdout"""
         try:
-            self.config = config
-            tg_config_json = self.generate_trustgraph_config(config)
-            tg_config_file = json.dumps(tg_config_json, indent=4)
-            print(tg_config_file)
+            print(self.render_artifact(config, "tg-config"))
         except Exception as e:
             logging.error(f"Exception: {e}")
             raise e
@@ -207,25 +709,7 @@ class Packager:
     def write_resources(self, config):
         """Output only the platform resources to stdout"""
         try:
-            self.config = config
-            
-            if self.platform in set(["docker-compose", "podman-compose"]):
-                compose_json = self.generate_resources(config)
-                compose_file = yaml.dump(compose_json)
-                print(compose_file)
-            elif self.platform in set([
-                    "minikube-k8s", "gcp-k8s", "aks-k8s", "eks-k8s",
-                    "scw-k8s", "ovh-k8s", "ack-k8s"
-            ]):
-                processed = self.generate_resources(config)
-                y = yaml.dump(processed)
-                print(y)
-            elif self.platform == "aca":
-                processed = self.generate_resources(config)
-                print(json.dumps(processed, indent=2))
-            else:
-                raise RuntimeError("Bad platform")
-                
+            print(self.render_artifact(config, "resources"))
         except Exception as e:
             logging.error(f"Exception: {e}")
             raise e
@@ -233,98 +717,86 @@ class Packager:
     def generate_docker_compose(self, platform, version, config):
 
         compose_json = self.generate_resources(config)
-        compose_file = yaml.dump(compose_json)
 
         # Generate TG config for versions after 1.1...
+        tg_config_json = None
         if version[:2] != "0." and version[:3] != "1.0":
             tg_config_json = self.generate_trustgraph_config(config)
-            tg_config_file = json.dumps(tg_config_json, indent=4)
 
         # Check if config-to-additionals.jsonnet exists for this version
-        renderers_dir = self.templates.joinpath("renderers")
-        if renderers_dir.exists():
-            additionals_path = self.templates.joinpath("renderers/config-to-additionals.jsonnet")
-        else:
-            additionals_path = self.templates.joinpath("config-to-additionals.jsonnet")
-        has_additionals = os.path.isfile(additionals_path)
-
-        # Generate additional config files from configVolume parts (if supported)
-        additionals = self.generate_additionals(config) if has_additionals else []
-
-        mem = BytesIO()
-
-        with zipfile.ZipFile(mem, mode='w') as out:
+        has_additionals = self.has_renderer(
+            "config-to-additionals.jsonnet"
+        )
+
+        # Generate additional config files from configVolume parts (if
+        # supported)
+        additionals = (
+            self.generate_additionals(config) if has_additionals else []
+        )
+
+        return self.docker_compose_files(
+            version, compose_json, tg_config_json,
+            additionals, has_additionals
+        )
+
+    def docker_compose_files(
+            self, version, compose_json, tg_config_json,
+            additionals, has_additionals
+    ):
+        """Zip entries for a compose deployment"""
 
-            def output(name, content):
-                logger.info(f"Adding {name}...")
-                out.writestr(name, content)
+        entries = []
 
-            output("docker-compose.yaml", compose_file)
+        def output(name, content):
+            entries.append((name, content))
 
-            # Add seperate TG config for versions after 1.1...
-            if version[:2] != "0." and version[:3] != "1.0":
-                output("trustgraph/config.json", tg_config_file)
+        output(
+            "docker-compose.yaml",
+            self.dump("docker-compose.yaml", compose_json)
+        )
 
-            # Add generated config files from additionals (if available)
-            # Skip trustgraph/config.json since it's handled above
-            for item in additionals:
-                if item['path'] != 'trustgraph/config.json':
-                    output(item['path'], item['content'])
+        # Add seperate TG config for versions after 1.1...
+        if version[:2] != "0." and version[:3] != "1.0":
+            output(
+                "trustgraph/config.json",
+                self.dump_json("trustgraph/config.json", tg_config_json, 4)
+            )
 
-            # Fallback: Walk resources directory if additionals not available
-            # This maintains backward compatibility with older versions
-            if not has_additionals and os.path.isdir(self.resources):
-                for root, dirs, files in os.walk(self.resources):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        rel_path = os.path.relpath(file_path, self.resources)
-                        with open(file_path, 'r') as f:
-                            content = f.read()
-                        output(rel_path, content)
+        # Add generated config files from additionals (if available)
+        # Skip trustgraph/config.json since it's handled above
+        for item in additionals:
+            if item['path'] != 'trustgraph/config.json':
+                output(item['path'], item['content'])
 
-        logger.info("Generation complete.")
+        # Fallback: Add the resources tree if additionals not available
+        # This maintains backward compatibility with older versions.  The
+        # files come from the resolver's index, so are there when the
+        # version is served from a bundle with no loose tree
+        if not has_additionals:
+            for rel_path, content in self.resolver.resource_files():
+                output(rel_path, str(content, "utf-8"))
 
-        return mem.getvalue()
+        return entries
 
     def generate_k8s(self, platform, version, config):
 
         processed = self.generate_resources(config)
 
-        y = yaml.dump(processed)
-
-        mem = BytesIO()
-
-        with zipfile.ZipFile(mem, mode='w') as out:
-
-            def output(name, content):
-                logger.info(f"Adding {name}...")
-                out.writestr(name, content)
+        return self.k8s_files(processed)
 
-            fname = "resources.yaml"
-
-            output(fname, y)
-
-        logger.info("Generation complete.")
-
-        return mem.getvalue()
+    def k8s_files(self, processed):
+        """Zip entries for a Kubernetes deployment"""
+        return [("resources.yaml", self.dump("resources.yaml", processed))]
 
     def generate_aca(self, platform, version, config):
 
         processed = self.generate_resources(config)
 
-        j = json.dumps(processed, indent=2)
-
-        mem = BytesIO()
-
-        with zipfile.ZipFile(mem, mode='w') as out:
-
-            def output(name, content):
-                logger.info(f"Adding {name}...")
-                out.writestr(name, content)
-
-            output("azuredeploy.json", j)
-
-        logger.info("Generation complete.")
-
-        return mem.getvalue()
+        return self.aca_files(processed)
 
+    def aca_files(self, processed):
+        """Zip entries for an Azure Container Apps deployment"""
+        return [(
+            "azuredeploy.json",
+            self.dump_json("azuredeploy.json", processed, 2)
+        )]
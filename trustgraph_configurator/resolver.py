@@ -0,0 +1,210 @@
+"""
+Jsonnet import resolution for a template version.
+
+Reads every file under templates/<ver> and resources/<ver> into memory
+once, keyed by normalized path, and memoizes the result of resolving
+each (dir, filename) import against them.  If a packed bundle for the
+version exists (see bundle.py), it is mmapped instead and files are
+served as slices of the mapping, unless the loose files are present
+and have changed since the bundle was packed.  Packager.fetch layers
+the virtual files (config.json, version.jsonnet, trustgraph/config.json,
+vertexai/private.json) on top, so once a version is loaded repeated
+renders do no filesystem I/O.  Resolvers are shared process-wide,
+one per template version.
+"""
+
+import hashlib
+import importlib.resources
+import logging
+import os
+import threading
+
+from . bundle import Bundle, bundle_path, fingerprint
+
+logger = logging.getLogger("resolver")
+logger.setLevel(logging.INFO)
+
+def current_bundle(path, templates, resources):
+    """The bundle at path if it exists and, where the loose files it was
+    packed from are present, still matches them; otherwise None"""
+
+    if not os.path.isfile(path):
+        return None
+
+    if not os.path.isdir(templates):
+        # Installed with only the bundles
+        return path
+
+    source = fingerprint(str(templates), str(resources))
+
+    if Bundle(path).source != source:
+        logger.info(f"{path} is out of date, using {templates}")
+        return None
+
+    return path
+
+class Resolver:
+
+    resolvers = {}
+    lock = threading.Lock()
+
+    def __init__(self, templates, resources, bundle=None):
+
+        self.templates = os.path.normpath(str(templates))
+        self.resources = os.path.normpath(str(resources))
+
+        # Normalized path -> file content, bytes or a memoryview
+        self.files = {}
+
+        # Normalized directory paths
+        self.dirs = set()
+
+        # (dir, filename) -> (path, content) or None
+        self.table = {}
+
+        # SHA-256 of the files, computed on first use
+        self.tree_digest = None
+
+        if bundle:
+            self.load_bundle(bundle)
+        else:
+            self.load_tree()
+
+        logger.debug(
+            "Indexed %d files for %s", len(self.files), self.templates
+        )
+
+    def load_tree(self):
+
+        for top in [self.templates, self.resources]:
+            for root, dirs, files in os.walk(top):
+                self.dirs.add(os.path.normpath(root))
+                for file in files:
+                    path = os.path.join(root, file)
+                    with open(path, "rb") as f:
+                        self.files[path] = f.read()
+
+    def load_bundle(self, path):
+
+        self.bundle = Bundle(path)
+
+        tops = {
+            "templates": self.templates,
+            "resources": self.resources,
+        }
+
+        def local(name):
+            tree, _, rel = name.partition("/")
+            return os.path.normpath(os.path.join(tops[tree], rel))
+
+        for name in self.bundle.dirs:
+            self.dirs.add(local(name))
+
+        for name, content in self.bundle.files():
+            self.files[local(name)] = content
+
+    @staticmethod
+    def get(template):
+        """Return the shared resolver for a template version, indexing
+        it on first use"""
+
+        with Resolver.lock:
+
+            resolver = Resolver.resolvers.get(template)
+
+            if resolver is None:
+
+                files = importlib.resources.files()
+                templates = files.joinpath("templates").joinpath(template)
+                resources = files.joinpath("resources").joinpath(template)
+
+                bundle = current_bundle(
+                    bundle_path(str(files), template), templates, resources
+                )
+
+                resolver = Resolver(templates, resources, bundle = bundle)
+                Resolver.resolvers[template] = resolver
+
+            return resolver
+
+    def digest(self):
+        """Hex digest of every template and resource file's path and
+        content, identifying this version's tree for the disk cache
+        (see disk_cache.py).  Paths are relative to the package, so
+        the digest doesn't depend on where it is installed."""
+
+        if self.tree_digest is None:
+
+            top = os.path.dirname(os.path.dirname(self.templates))
+            h = hashlib.sha256()
+
+            for path in sorted(self.files):
+                name = os.path.relpath(path, top).encode("utf-8")
+                content = self.files[path]
+                h.update(b"%d:%s%d:" % (len(name), name, len(content)))
+                h.update(content)
+
+            self.tree_digest = h.hexdigest()
+
+        return self.tree_digest
+
+    def isfile(self, path):
+        return os.path.normpath(str(path)) in self.files
+
+    def isdir(self, path):
+        return os.path.normpath(str(path)) in self.dirs
+
+    def read(self, path):
+        """Content of an indexed file, or None"""
+        return self.files.get(os.path.normpath(str(path)))
+
+    def resource_files(self):
+        """(path relative to the resources tree, content) of each
+        indexed resource file, in path order"""
+
+        top = self.resources + os.sep
+
+        return [
+            (os.path.relpath(path, self.resources), content)
+            for path, content in sorted(self.files.items())
+            if path.startswith(top)
+        ]
+
+    def candidates(self, dir, filename):
+        """Paths tried for an import, in order of precedence"""
+
+        if dir:
+            return [
+                os.path.join(self.templates, dir, filename),
+                os.path.join(self.templates, filename),
+                os.path.join(self.resources, dir, filename),
+                os.path.join(self.resources, filename),
+            ]
+        else:
+            return [
+                os.path.join(self.templates, filename)
+            ]
+
+    def resolve(self, dir, filename):
+        """Resolve an import to (path, content), or None if no indexed
+        file matches"""
+
+        key = (dir, filename)
+
+        try:
+            return self.table[key]
+        except KeyError:
+            pass
+
+        found = None
+
+        for c in self.candidates(dir, filename):
+            path = os.path.normpath(c)
+            content = self.files.get(path)
+            if content is not None:
+                found = (path, content)
+                break
+
+        self.table[key] = found
+
+        return found
@@ -6,6 +6,9 @@ Packager to emit a deployment zip (default) or, with -O / -R, a
 single artefact (TrustGraph config JSON or the compose/k8s resources
 YAML) to stdout. Logging is suppressed when writing to stdout so the
 output remains machine-parseable.
+
+With --batch, renders a directory or JSONL file of configs across a
+pool of worker processes instead (see batch.py).
 """
 
 import json
@@ -13,7 +16,8 @@ import logging
 import argparse
 import sys
 
-from . import Generator, Packager
+from . packager import Packager
+from . disk_cache import DEFAULT_MAX_BYTES, default_cache_dir
 
 def generate_deployment():
 
@@ -35,8 +39,8 @@ def generate_deployment():
 
     parser.add_argument(
         '-o', '--output',
-        default="deploy.zip",
-        help=f'Output file name (default: deploy.zip)'
+        help=f'Output file name (default: deploy.zip, or deploy.tar.zst '
+        f'with zstd compression)'
     )
 
     parser.add_argument(
@@ -47,7 +51,24 @@ def generate_deployment():
     parser.add_argument(
         '-p', '--platform',
         default="docker-compose",
-        help=f'Platform (default: docker-compose)'
+        help=f'Platform, a comma-separated list of platforms, or "all" '
+        f'(default: docker-compose)'
+    )
+
+    parser.add_argument(
+        '--split',
+        action='store_true',
+        help="With several platforms, write one zip per platform named "
+        "<output>-<platform>.zip instead of a single zip",
+    )
+
+    parser.add_argument(
+        '-z', '--compression',
+        default="stored",
+        help=f'Archive compression: stored, deflate[:level] for a zip '
+        f'with deflated entries (level 0-9, default 6), or zstd[:level] '
+        f'for a zstd-compressed tar (level 1-22, default 3) '
+        f'(default: stored)'
     )
 
     parser.add_argument(
@@ -74,22 +95,101 @@ def generate_deployment():
         help="Output only resources (docker-compose.yaml or resources.yaml) to stdout",
     )
 
+    parser.add_argument(
+        '-b', '--batch',
+        help="Render a directory of config .json files, or a JSONL file "
+        "of entries, instead of a single -i input",
+    )
+
+    parser.add_argument(
+        '-j', '--workers',
+        type=int,
+        help=f'Number of worker processes for --batch (default: number '
+        f'of CPUs)'
+    )
+
+    parser.add_argument(
+        '--output-dir',
+        default="deploy",
+        help=f'Output directory for --batch (default: deploy)'
+    )
+
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help="Report where the render's time went, with import and "
+        "memory statistics, as JSON on stderr",
+    )
+
+    parser.add_argument(
+        '--component-costs',
+        action='store_true',
+        help="Instead of building, report the render time, resources and "
+        "output size each config entry accounts for, rendered alone and "
+        "added in turn, as a table on stdout.  Measures the platform "
+        "resources, or the TrustGraph configuration with -O.",
+    )
+
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        help="Keep renders in an on-disk cache, reused by later runs with "
+        "the same template and config (see --cache-dir)",
+    )
+
+    parser.add_argument(
+        '--cache-dir',
+        help=f'Directory for --cache, implies --cache (default: '
+        f'{default_cache_dir()})'
+    )
+
+    parser.add_argument(
+        '--cache-bytes',
+        type=int,
+        default=DEFAULT_MAX_BYTES,
+        help=f'Size limit of the --cache directory, beyond which the '
+        f'least recently used renders are removed (default: '
+        f'{DEFAULT_MAX_BYTES})'
+    )
+
     try:
 
         args = parser.parse_args()
         args = vars(args)
 
+        # Both report on a single render, which batch mode doesn't do
+        if args["batch"] is not None:
+            for option in ["profile", "component_costs"]:
+                if args[option]:
+                    parser.error(
+                        f"--{option.replace('_', '-')} can't be used "
+                        f"with --batch"
+                    )
+
+        if args["cache"] and args["cache_dir"] is None:
+            args["cache_dir"] = default_cache_dir()
+        del args["cache"]
+
+        if args["batch"] is not None:
+            generate_batch(args)
+            return
+
         input = args["input"]
 
         with open(input) as f:
             config = f.read()
 
         output = args["output"]
+        split = args["split"]
         output_tg_config = args.get("output_tg_config", False)
         output_resources = args.get("output_resources", False)
+        profile = args["profile"]
+        component_costs = args["component_costs"]
 
         # Configure logging only if not outputting to stdout
-        if not output_tg_config and not output_resources:
+        if component_costs:
+            logging.basicConfig(level=logging.WARNING, format='%(message)s')
+        elif not output_tg_config and not output_resources:
             logging.basicConfig(level=logging.INFO, format='%(message)s')
         else:
             # Suppress all logging when outputting to stdout
@@ -99,18 +199,88 @@ def generate_deployment():
         del args["output"]
         del args["output_tg_config"]
         del args["output_resources"]
+        del args["split"]
+        del args["batch"]
+        del args["workers"]
+        del args["output_dir"]
+        del args["profile"]
+        del args["component_costs"]
 
         a = Packager(**args)
-        
+
+        if output is None:
+            output = "deploy" + a.compression.extension
+
+        if component_costs:
+            write_component_costs(
+                a, config, "tg-config" if output_tg_config else "resources"
+            )
+            return
+
         if output_tg_config:
             a.write_tg_config(config)
         elif output_resources:
             a.write_resources(config)
         else:
-            a.write(config, output)
+            a.write(config, output, split=split)
+
+        if profile:
+            print(json.dumps(a.profile(), indent=2), file=sys.stderr)
 
     except Exception as e:
 
         print(f"Exception: {e}", file=sys.stderr)
         sys.exit(1)
 
+
+def write_component_costs(pkg, config, artifact):
+
+    # Imported here, as only this diagnostic uses tabulate
+    from . attribution import component_costs, format_costs
+
+    print(format_costs(component_costs(pkg, config, artifact)))
+
+def generate_batch(args):
+
+    # Imported here: the batch machinery (multiprocessing, the process
+    # pool) only costs start-up time for --batch runs
+    from . batch import FIELDS, load_batch, run_batch
+    from . archive import Compression
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    # Fail early on a bad --compression, rather than once per entry
+    Compression(args["compression"])
+
+    defaults = { k: args[k] for k in FIELDS }
+
+    entries = load_batch(args["batch"], defaults)
+
+    print(f"Rendering {len(entries)} entries...")
+
+    summary = run_batch(
+        entries, args["output_dir"], args["workers"],
+        cache = {
+            "cache_dir": args["cache_dir"],
+            "cache_bytes": args["cache_bytes"],
+        },
+    )
+
+    for r in summary["results"]:
+        if r["status"] == "ok":
+            print(
+                f"ok     {r['name']} {r['seconds']:.2f}s "
+                f"ratio {r['compression']['ratio']:.2f}"
+            )
+        else:
+            # First line only, the full error is in summary.json
+            error = (r["error"].splitlines() or ["unknown error"])[0]
+            print(f"error  {r['name']} {r['seconds']:.2f}s: {error}")
+
+    print(
+        f"{summary['succeeded']} succeeded, {summary['failed']} failed "
+        f"in {summary['seconds']:.2f}s."
+    )
+
+    if summary["failed"] > 0:
+        sys.exit(1)
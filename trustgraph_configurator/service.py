@@ -3,16 +3,168 @@ CLI entry point for `tg-config-svc`.
 
 Starts the aiohttp-based HTTP service (see api.py) that exposes the
 configurator as a REST API: POST /api/generate/{platform}/{template}
-to build a deployment zip from a supplied config, plus GET endpoints
+to build a deployment zip from a supplied config, or /api/jobs/... to
+build it in the background (see jobs.py), plus GET endpoints
 for version discovery and the bundled dialog-flow / docs resources.
+Renders run on a pool of worker processes (see workers.py), which are
+warmed up before /healthz and /readyz report ready (see warmup.py).
+With --workers, several server processes share the port (see
+supervisor.py).
 """
 
 import logging
+import argparse
+import os
 
-from . api import Api
+from . warmup import DEFAULT_TEMPLATES, DEFAULT_PLATFORMS
 
 def run_service():
 
+    parser = argparse.ArgumentParser(
+        prog="tg-config-svc",
+        description=__doc__
+    )
+
+    parser.add_argument(
+        '--render-cache-entries',
+        type=int,
+        default=128,
+        help=f'Maximum number of cached deployment zips, 0 disables '
+        f'the render cache (default: 128)'
+    )
+
+    parser.add_argument(
+        '--render-cache-bytes',
+        type=int,
+        default=64 * 1024 * 1024,
+        help=f'Maximum total size of cached deployment zips in bytes '
+        f'(default: 67108864)'
+    )
+
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=int(os.environ.get("PORT", 8080)),
+        help=f'Port to listen on (default: $PORT or 8080)'
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=int(os.environ.get("WEB_CONCURRENCY", 1)),
+        help=f'Number of server processes sharing the port with '
+        f'SO_REUSEPORT (default: $WEB_CONCURRENCY or 1)'
+    )
+
+    parser.add_argument(
+        '--shutdown-timeout',
+        type=float,
+        default=60,
+        help=f'Seconds in-flight requests have to finish on SIGTERM '
+        f'(default: 60)'
+    )
+
+    parser.add_argument(
+        '--render-workers',
+        type=int,
+        help=f'Number of render worker processes per server process, 0 '
+        f'renders on a thread in the server process (default: number '
+        f'of CPUs / --workers)'
+    )
+
+    parser.add_argument(
+        '--recycle-after',
+        type=int,
+        default=int(os.environ.get("TG_CONFIG_RECYCLE_AFTER", 0)),
+        help=f'Renders after which a render worker process is replaced, '
+        f'bounding Jsonnet heap growth, 0 never '
+        f'(default: $TG_CONFIG_RECYCLE_AFTER or 0)'
+    )
+
+    parser.add_argument(
+        '--render-timeout',
+        type=float,
+        default=60,
+        help=f'Seconds a render may take before its worker is killed, '
+        f'0 for no limit (default: 60)'
+    )
+
+    parser.add_argument(
+        '--max-renders',
+        type=int,
+        help=f'Maximum renders run at once (default: the number of '
+        f'render workers)'
+    )
+
+    parser.add_argument(
+        '--max-queued-renders',
+        type=int,
+        help=f'Maximum requests waiting for a render slot, beyond which '
+        f'requests get 429 Too Many Requests (default: 4 x --max-renders)'
+    )
+
+    parser.add_argument(
+        '--max-body-bytes',
+        type=int,
+        default=1024 * 1024,
+        help=f'Maximum request body size in bytes (default: 1048576)'
+    )
+
+    parser.add_argument(
+        '--compression',
+        default="stored",
+        help=f'Default archive compression, overridden per request by '
+        f'the compression query parameter: stored, deflate[:level] or '
+        f'zstd[:level] (default: stored)'
+    )
+
+    parser.add_argument(
+        '--max-jobs',
+        type=int,
+        default=64,
+        help=f'Maximum render jobs held by the job API, running or '
+        f'finished (default: 64)'
+    )
+
+    parser.add_argument(
+        '--job-store-bytes',
+        type=int,
+        default=256 * 1024 * 1024,
+        help=f'Maximum total size of finished job archives in bytes '
+        f'(default: 268435456)'
+    )
+
+    parser.add_argument(
+        '--job-ttl',
+        type=float,
+        default=600,
+        help=f'Seconds a finished job\'s result is kept (default: 600)'
+    )
+
+    parser.add_argument(
+        '--warm-up',
+        default=DEFAULT_TEMPLATES,
+        help=f'Templates each render worker renders before the service '
+        f'reports ready, comma-separated, with latest and latest-stable '
+        f'naming the current ones; none to disable '
+        f'(default: {DEFAULT_TEMPLATES})'
+    )
+
+    parser.add_argument(
+        '--warm-up-platforms',
+        default=DEFAULT_PLATFORMS,
+        help=f'Platforms rendered in the warm-up, comma-separated, or all '
+        f'(default: {DEFAULT_PLATFORMS})'
+    )
+
+    parser.add_argument(
+        '--warm-up-config',
+        help=f'Config JSON file rendered in the warm-up (default: a small '
+        f'built-in config)'
+    )
+
+    args = parser.parse_args()
+
     logging.basicConfig(
         level=logging.DEBUG,
         format="%(asctime)s %(levelname)s %(message)s"
@@ -20,7 +172,38 @@ def run_service():
 
     logging.info("Starting...")
 
-    a = Api(port=8080)
+    warm_up_config = None
+    if args.warm_up_config:
+        with open(args.warm_up_config) as f:
+            warm_up_config = f.read()
+
+    render_workers = args.render_workers
+    if render_workers is None:
+        render_workers = max(1, os.cpu_count() // max(1, args.workers))
+
+    config = dict(
+        port=args.port,
+        shutdown_timeout=args.shutdown_timeout,
+        recycle_after=args.recycle_after,
+        render_cache_entries=args.render_cache_entries,
+        render_cache_bytes=args.render_cache_bytes,
+        compression=args.compression,
+        render_workers=render_workers,
+        render_timeout=args.render_timeout,
+        max_renders=args.max_renders,
+        max_queued_renders=args.max_queued_renders,
+        max_body_bytes=args.max_body_bytes,
+        max_jobs=args.max_jobs,
+        job_store_bytes=args.job_store_bytes,
+        job_ttl=args.job_ttl,
+        warm_up=args.warm_up,
+        warm_up_platforms=args.warm_up_platforms,
+        warm_up_config=warm_up_config,
+    )
+
+    # Imported once the arguments are parsed, so --help and argument
+    # errors don't wait for aiohttp and the API to load
+    from . supervisor import serve
 
-    a.run()
+    serve(config, args.workers)
 
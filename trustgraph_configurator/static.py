@@ -0,0 +1,244 @@
+"""
+Static resources and HTTP validators for tg-config-svc.
+
+ResourceStore reads the dialog-flow resources (resources/dialog: the
+flow and docs manifests, the JSONata transform and the docs fragments)
+once at startup and gives each a strong ETag from its content, so
+requests are served from memory and clients holding a current copy get
+a 304 instead of the body.  Each resource is also compressed up front
+with gzip, and with brotli if the optional brotli package is
+installed, and the smallest variant the client's Accept-Encoding
+allows is sent.  Each variant has its own ETag.
+
+The helpers here build ETags and evaluate If-None-Match for any
+response, including the generated archives, whose ETag comes from the
+render cache key and so is known before rendering.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+
+from aiohttp import web
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger("static")
+logger.setLevel(logging.INFO)
+
+# Content encodings to prepare, in order of preference
+ENCODERS = {}
+
+if brotli is not None:
+    ENCODERS["br"] = lambda data: brotli.compress(data, quality=11)
+
+ENCODERS["gzip"] = lambda data: gzip.compress(data, 9, mtime=0)
+
+# Dialog resources change only with a deployment of the service
+RESOURCE_CACHE_CONTROL = "public, max-age=300"
+
+def etag(*parts):
+    """A strong ETag from the SHA-256 of some strings or bytes"""
+
+    h = hashlib.sha256()
+
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        h.update(part)
+        h.update(b"\0")
+
+    return '"' + h.hexdigest()[:32] + '"'
+
+def not_modified(request, tag):
+    """True if the request's If-None-Match matches an ETag"""
+
+    header = request.headers.get("If-None-Match")
+
+    if header is None:
+        return False
+
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        # If-None-Match uses weak comparison
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == tag:
+            return True
+
+    return False
+
+def not_modified_response(tag, cache_control, headers=None):
+    return web.Response(
+        status = 304,
+        headers = {
+            "ETag": tag, "Cache-Control": cache_control, **(headers or {})
+        },
+    )
+
+def accepted_encodings(header):
+    """Content encodings acceptable per an Accept-Encoding header, as a
+    dict of encoding -> q-value"""
+
+    accepted = {}
+
+    for item in (header or "").split(","):
+
+        encoding, _, params = item.strip().partition(";")
+        encoding = encoding.strip().lower()
+
+        if not encoding:
+            continue
+
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+
+        accepted[encoding] = q
+
+    return accepted
+
+def validated_response(
+        request, body, content_type, cache_control, charset="utf-8",
+        tag=None,
+):
+    """A response for body with an ETag, or 304 if the client's copy
+    is current"""
+
+    tag = tag or etag(body)
+
+    if not_modified(request, tag):
+        return not_modified_response(tag, cache_control)
+
+    return web.Response(
+        body = body,
+        content_type = content_type,
+        charset = charset,
+        headers = { "ETag": tag, "Cache-Control": cache_control },
+    )
+
+class Resource:
+
+    def __init__(self, body, content_type):
+
+        self.body = body
+        self.content_type = content_type
+        self.etag = etag(body)
+
+        # Encoding -> (body, ETag), for encodings which make it smaller
+        self.variants = {}
+
+        for encoding, compress in ENCODERS.items():
+            data = compress(body)
+            if len(data) < len(body):
+                self.variants[encoding] = (
+                    data, self.etag[:-1] + "-" + encoding + '"'
+                )
+
+    def select(self, accept_encoding):
+        """The (encoding, body, ETag) to send for an Accept-Encoding
+        header, encoding being None for the uncompressed body"""
+
+        accepted = accepted_encodings(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+
+        # Highest q-value first, then our preference
+        candidates = [
+            (-accepted.get(encoding, wildcard), n, encoding)
+            for n, encoding in enumerate(self.variants)
+            if accepted.get(encoding, wildcard) > 0
+        ]
+
+        if not candidates:
+            return None, self.body, self.etag
+
+        encoding = min(candidates)[2]
+        data, tag = self.variants[encoding]
+
+        return encoding, data, tag
+
+    def etags(self):
+        return [self.etag] + [tag for data, tag in self.variants.values()]
+
+class ResourceStore:
+
+    CONTENT_TYPES = {
+        ".yaml": "application/x-yaml",
+        ".jsonata": "text/plain",
+        ".md": "text/markdown",
+    }
+
+    def __init__(self, path):
+
+        self.resources = {}
+
+        path = str(path)
+
+        for root, dirs, files in os.walk(path):
+            for file in files:
+
+                full = os.path.join(root, file)
+                name = os.path.relpath(full, path).replace(os.sep, "/")
+
+                ext = os.path.splitext(file)[1]
+
+                with open(full, "rb") as f:
+                    self.resources[name] = Resource(
+                        f.read(),
+                        self.CONTENT_TYPES.get(ext, "text/plain"),
+                    )
+
+        size = sum(len(r.body) for r in self.resources.values())
+
+        logger.info(
+            f"Loaded {len(self.resources)} dialog resources, {size} bytes, "
+            f"with {', '.join(ENCODERS)} variants"
+        )
+
+    def get(self, name):
+        return self.resources.get(name)
+
+    def response(self, request, name):
+        """Serve a resource, with its ETag, or 404"""
+
+        resource = self.resources.get(name)
+
+        if resource is None:
+            raise web.HTTPNotFound()
+
+        encoding, body, tag = resource.select(
+            request.headers.get("Accept-Encoding")
+        )
+
+        headers = {
+            "ETag": tag,
+            "Cache-Control": RESOURCE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+
+        # Every variant is the same content, so any of their ETags
+        # validates the client's copy
+        if any(not_modified(request, t) for t in resource.etags()):
+            return not_modified_response(
+                tag, RESOURCE_CACHE_CONTROL, { "Vary": "Accept-Encoding" }
+            )
+
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+
+        return web.Response(
+            body = body,
+            content_type = resource.content_type,
+            charset = "utf-8",
+            headers = headers,
+        )
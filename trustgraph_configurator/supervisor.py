@@ -0,0 +1,151 @@
+"""
+Multi-process serving for tg-config-svc.
+
+With --workers N, the service runs N server processes, each with its
+own Api and render workers, all listening on the same port with
+SO_REUSEPORT so the kernel spreads connections across them.  This
+process supervises them: one that exits unexpectedly is restarted,
+and on SIGTERM or SIGINT each is sent SIGTERM, finishes its in-flight
+requests and exits.
+
+Caches and jobs are per server process, and a client's requests for a
+job can land on any of them.  Each server is given an index, which
+starts the ids of the jobs it creates, and also listens on a Unix
+socket in a directory shared by the servers; a server receiving a
+request for another's job forwards it there (see Api.forward).  A
+restarted server keeps its index, but the jobs it held are lost.
+Metrics are also per server process: a scrape reaching any server
+gathers the others' over the same sockets, each labelled with its
+index (see Api.get_metrics).
+
+Server processes are spawned rather than forked, like render workers
+(see workers.py): the Go runtime behind gojsonnet does not survive a
+fork of a process that has loaded it.
+"""
+
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import shutil
+import signal
+import tempfile
+import time
+
+from . api import Api
+
+logger = logging.getLogger("supervisor")
+logger.setLevel(logging.INFO)
+
+# A server exiting sooner than this after starting is restarted only
+# after a pause, so a server failing at startup doesn't spin
+MIN_UPTIME = 5
+
+def server_main(config, index):
+
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format="%(asctime)s %(levelname)s %(message)s"
+    )
+
+    Api(**config, server_index=index).run(reuse_port=True)
+
+class Supervisor:
+
+    def __init__(self, config, workers):
+
+        self.config = config
+        self.workers = workers
+        self.context = multiprocessing.get_context("spawn")
+
+        # Process -> (index, start time)
+        self.servers = {}
+        self.stopping = False
+
+        # Servers' peer sockets, created by run()
+        self.peer_dir = None
+
+    def start_server(self, index):
+
+        process = self.context.Process(
+            target=server_main,
+            args=({ **self.config, "peer_dir": self.peer_dir }, index),
+        )
+        process.start()
+
+        self.servers[process] = (index, time.monotonic())
+
+        logger.info(f"Started server {index}, pid {process.pid}")
+
+    def stop(self, signum, frame):
+        logger.info(f"Signal {signum}, stopping servers...")
+        self.stopping = True
+
+    def run(self):
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        self.peer_dir = tempfile.mkdtemp(prefix="tg-config-svc-")
+
+        for index in range(self.workers):
+            self.start_server(index)
+
+        while not self.stopping:
+
+            multiprocessing.connection.wait(
+                [p.sentinel for p in self.servers], timeout=1
+            )
+
+            for process, (index, started) in list(self.servers.items()):
+
+                if process.is_alive() or self.stopping:
+                    continue
+
+                del self.servers[process]
+
+                logger.error(
+                    f"Server {index}, pid {process.pid}, exited with "
+                    f"{process.exitcode}, restarting"
+                )
+
+                if time.monotonic() - started < MIN_UPTIME:
+                    time.sleep(MIN_UPTIME)
+
+                self.start_server(index)
+
+        self.shutdown()
+
+    def shutdown(self):
+        """SIGTERM every server, then wait for them to finish in-flight
+        requests, killing any that overrun the shutdown timeout"""
+
+        for process in self.servers:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+        deadline = (
+            time.monotonic() +
+            float(self.config.get("shutdown_timeout", 60)) + 5
+        )
+
+        for process in self.servers:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Killing server {process.pid}")
+                process.kill()
+                process.join()
+
+        shutil.rmtree(self.peer_dir, ignore_errors=True)
+
+        logger.info("Servers stopped")
+
+def serve(config, workers=1):
+    """Run the service, in this process or, with more than one worker,
+    in that many supervised server processes sharing the port"""
+
+    if workers <= 1:
+        Api(**config).run()
+        return
+
+    Supervisor(config, workers).run()
@@ -0,0 +1,134 @@
+"""
+Warm-up renders for tg-config-svc.
+
+A fresh instance serves its first requests slowly: the template tree
+isn't in the page cache, and each render worker has yet to build its
+template index (see resolver.py) and load the Jsonnet VM.  Before it
+reports ready, the service renders a warm-up set on every render
+worker: by default the latest and latest-stable templates for each
+platform in templates/index.json, with a small default config.
+
+The set is selected by a comma-separated list of templates, where
+"latest" and "latest-stable" name the current ones, and of platforms,
+where "all" means every platform the template can render.
+"""
+
+import json
+import logging
+
+from . index import Index
+from . packager import Packager
+from . cache import canonical_config
+
+logger = logging.getLogger("warmup")
+logger.setLevel(logging.INFO)
+
+LATEST = "latest"
+LATEST_STABLE = "latest-stable"
+
+DEFAULT_TEMPLATES = f"{LATEST},{LATEST_STABLE}"
+DEFAULT_PLATFORMS = "all"
+
+# A small deployment using the components most configs have
+DEFAULT_CONFIG = [
+    {
+        "name": "trustgraph-base",
+        "parameters": {}
+    },
+    {
+        "name": "pulsar",
+        "parameters": {}
+    },
+    {
+        "name": "cassandra",
+        "parameters": {}
+    },
+    {
+        "name": "embeddings-hf",
+        "parameters": {
+            "embeddings-model": "sentence-transformers/all-MiniLM-L6-v2"
+        }
+    },
+    {
+        "name": "openai",
+        "parameters": {
+            "model": "gpt-3.5-turbo",
+            "temperature": 0.7
+        }
+    },
+]
+
+def select_templates(spec):
+    """Template names for a warm-up template list, in order, without
+    duplicates"""
+
+    templates = []
+
+    for name in (spec or "").split(","):
+
+        name = name.strip()
+
+        if name == "" or name == "none":
+            continue
+
+        if name == LATEST:
+            name = Index.get_latest().name
+        elif name == LATEST_STABLE:
+            name = Index.get_latest_stable().name
+        else:
+            # Raises if unknown
+            name = Packager.select(None, name, False, False)[0]
+
+        if name not in templates:
+            templates.append(name)
+
+    return templates
+
+def warm_up_jobs(
+        templates=DEFAULT_TEMPLATES, platforms=DEFAULT_PLATFORMS,
+        config=None,
+):
+    """Render jobs (see workers.py) for a warm-up set.  config is JSON
+    text, defaulting to DEFAULT_CONFIG."""
+
+    if config is None:
+        config = json.dumps(DEFAULT_CONFIG)
+
+    # Canonical JSON, as the API renders
+    config = canonical_config(config)
+
+    jobs = []
+
+    for template in select_templates(templates):
+
+        for platform in (platforms or DEFAULT_PLATFORMS).split(","):
+
+            platform = platform.strip()
+
+            if platform == "all":
+                candidates = [p.name for p in Index.get_platforms()]
+            else:
+                candidates = [platform]
+
+            for p in candidates:
+
+                pkg = Packager(None, template, p, False, False)
+
+                if not pkg.has_renderer(f"config-to-{p}.jsonnet"):
+                    if platform != "all":
+                        logger.warning(
+                            f"Template {template} can't render {p}, "
+                            f"not warmed up"
+                        )
+                    continue
+
+                jobs.append({
+                    "template": template,
+                    "platform": p,
+                    "config": config,
+                    "compression": "stored",
+                })
+
+    logger.info(f"{len(jobs)} warm-up renders")
+
+    return jobs
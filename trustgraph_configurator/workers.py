@@ -0,0 +1,402 @@
+"""
+Render worker processes for tg-config-svc.
+
+Jsonnet evaluation is CPU-bound and holds the GIL, so running it on the
+aiohttp event loop stalls every other request.  RenderPool dispatches
+renders to long-lived worker processes instead, one render per worker
+at a time.  Workers keep their template indexes (see resolver.py) warm
+between renders, and a render that overruns its timeout is stopped by
+killing its worker, which is then replaced.
+
+A job is a dict of template, platform, config (canonical JSON) and
+compression; the result is the built Archive, carrying the render's
+stage timings.  A job with an artifact (see Packager.render_artifact)
+renders just that file instead, to an Artifact.  With no worker
+processes, jobs run on a thread in the service process: the loop stays
+responsive, but timeouts can't stop an evaluation.
+
+Workers are recycled after a configurable number of renders, which
+bounds the memory a long-lived Jsonnet VM accumulates.  Each worker
+renders the pool's warm-up jobs (see warmup.py) before it takes
+requests, including workers replacing killed or recycled ones; the
+pool's ready event is set once every starting worker is warm.
+
+Workers are spawned rather than forked: the Go runtime behind gojsonnet
+does not survive a fork of a process that has loaded it.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import time
+
+from . packager import Packager
+from . archive import build
+
+logger = logging.getLogger("workers")
+logger.setLevel(logging.INFO)
+
+class RenderTimeout(Exception):
+    pass
+
+class Artifact:
+    """A single rendered file, the result of an artifact job.  Has the
+    parts of Archive used to cache and send it."""
+
+    def __init__(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.data = data
+        self.timings = []
+        self.profile = None
+
+    def chunks(self):
+        return iter([self.data])
+
+    def getvalue(self):
+        return self.data
+
+    @property
+    def compressed(self):
+        return len(self.data)
+
+def render(job, progress=None):
+    """Render a job to an Archive.  progress, if given, is called as
+    each stage starts and ends (see Packager.stage).  A job with
+    profile set gets the render's Packager.profile() on the result."""
+
+    pkg = Packager(
+        version = None,      # Use version from template configuration
+        template = job["template"],
+        platform = job["platform"],
+        latest = False,
+        latest_stable = False,
+        compression = job.get("compression"),
+    )
+
+    pkg.progress = progress
+
+    if job.get("artifact"):
+        artifact = Artifact(pkg.render_artifact(
+            job["config"], job["artifact"], job.get("format")
+        ))
+        artifact.timings = pkg.timings
+        if job.get("profile"):
+            artifact.profile = pkg.profile()
+        return artifact
+
+    files = pkg.generate_files(job["config"])
+
+    with pkg.stage("archive", str(pkg.compression)):
+        archive = build(files, pkg.compression)
+
+    archive.timings = pkg.timings
+    if job.get("profile"):
+        archive.profile = pkg.profile()
+
+    return archive
+
+def warm_up(jobs):
+    """Render warm-up jobs, returning how many succeeded"""
+
+    done = 0
+
+    for job in jobs:
+        try:
+            render(job)
+            done += 1
+        except Exception as e:
+            logger.warning(
+                f"Warm-up of {job['template']} {job['platform']} "
+                f"failed: {e}"
+            )
+
+    return done
+
+def worker_main(conn, warm_up_jobs=()):
+
+    conn.send(("ready", warm_up(warm_up_jobs)))
+
+    while True:
+
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+
+        # Progress is sent back as ("progress", (stage, name, seconds))
+        # messages ahead of the result, if the job asks for it
+        progress = None
+        if job.get("progress"):
+            progress = lambda *event: conn.send(("progress", event))
+
+        try:
+            result = ("ok", render(job, progress))
+        except Exception as e:
+            result = ("error", str(e))
+
+        conn.send(result)
+
+class Worker:
+
+    def __init__(self, context, warm_up_jobs=()):
+
+        self.conn, child = context.Pipe()
+
+        self.process = context.Process(
+            target=worker_main, args=(child, warm_up_jobs), daemon=True,
+        )
+        self.process.start()
+
+        child.close()
+
+        self.renders = 0
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        self.conn.close()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+class RenderPool:
+
+    def __init__(
+            self, workers=0, timeout=None, warm_up=(), recycle_after=None,
+    ):
+
+        self.workers = workers
+        self.timeout = timeout
+        self.warm_up_jobs = list(warm_up)
+
+        # Renders after which a worker process is replaced
+        self.recycle_after = recycle_after
+        self.recycled = 0
+
+        self.context = multiprocessing.get_context("spawn")
+
+        self.idle = None
+        self.all = []
+
+        # Set when every starting worker has finished its warm-up
+        self.ready = None
+        self.warm = 0
+        self.warm_up_seconds = None
+        self.started = None
+        self.warming = set()
+        self.stopped = False
+
+        # Threads waiting on worker replies, or running renders when
+        # there are no worker processes
+        self.threads = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(workers, 1), thread_name_prefix="render",
+        )
+
+    def start(self):
+
+        self.idle = asyncio.Queue()
+        self.ready = asyncio.Event()
+        self.started = time.monotonic()
+
+        if self.workers < 1:
+            if self.warm_up_jobs:
+                self.track(self.warm_up_inline())
+            else:
+                self.set_ready()
+
+        for i in range(self.workers):
+            self.add_worker()
+
+        logger.info(
+            f"Started {self.workers} render workers, warming up with "
+            f"{len(self.warm_up_jobs)} renders"
+        )
+
+    def track(self, coro):
+        task = asyncio.ensure_future(coro)
+        self.warming.add(task)
+        task.add_done_callback(self.warming.discard)
+
+    def add_worker(self):
+        worker = Worker(self.context, self.warm_up_jobs)
+        self.all.append(worker)
+        self.track(self.wait_warm(worker))
+
+    async def warm_up_inline(self):
+        """Warm-up with no worker processes, on a thread"""
+
+        await asyncio.get_running_loop().run_in_executor(
+            self.threads, warm_up, self.warm_up_jobs
+        )
+
+        self.set_ready()
+
+    async def wait_warm(self, worker):
+        """Make a worker idle once its warm-up is done"""
+
+        try:
+            status, done = await asyncio.get_running_loop().run_in_executor(
+                self.threads, worker.conn.recv
+            )
+        except (EOFError, OSError) as e:
+            if not self.stopped:
+                logger.error(
+                    f"Worker {worker.process.pid} failed in warm-up: {e}"
+                )
+                self.replace(worker)
+            return
+
+        logger.debug(
+            f"Worker {worker.process.pid} warm, {done} of "
+            f"{len(self.warm_up_jobs)} warm-up renders succeeded"
+        )
+
+        self.idle.put_nowait(worker)
+
+        self.warm += 1
+        if self.warm >= self.workers:
+            self.set_ready()
+
+    def set_ready(self):
+
+        if self.ready.is_set():
+            return
+
+        self.warm_up_seconds = time.monotonic() - self.started
+        self.ready.set()
+
+        logger.info(f"Warm-up complete in {self.warm_up_seconds:.3f}s")
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "idle": self.idle.qsize() if self.idle else 0,
+            "ready": self.ready is not None and self.ready.is_set(),
+            "recycled": self.recycled,
+            "warm_up_renders": len(self.warm_up_jobs),
+            "warm_up_seconds": (
+                None if self.warm_up_seconds is None
+                else round(self.warm_up_seconds, 3)
+            ),
+        }
+
+    def stop(self):
+
+        self.stopped = True
+
+        for task in list(self.warming):
+            task.cancel()
+
+        for worker in self.all:
+            worker.stop()
+
+        self.all = []
+        self.threads.shutdown(wait=False, cancel_futures=True)
+
+    async def render(self, job, progress=None):
+        """Render a job, returning the Archive.  Raises RenderTimeout if
+        it overruns the timeout, or RuntimeError if the render fails.
+        progress, if given, is called on the event loop with each
+        stage's progress."""
+
+        loop = asyncio.get_running_loop()
+
+        if self.workers < 1:
+
+            if progress:
+                report = lambda *event: loop.call_soon_threadsafe(
+                    progress, *event
+                )
+            else:
+                report = None
+
+            return await loop.run_in_executor(
+                self.threads, render, job, report
+            )
+
+        worker = await self.idle.get()
+
+        start = time.monotonic()
+
+        async def receive():
+            while True:
+                status, result = await loop.run_in_executor(
+                    self.threads, worker.conn.recv
+                )
+                if status != "progress":
+                    return status, result
+                progress(*result)
+
+        try:
+
+            worker.conn.send({ **job, "progress": progress is not None })
+
+            status, result = await asyncio.wait_for(
+                receive(), self.timeout
+            )
+
+        except asyncio.TimeoutError:
+
+            logger.warning(
+                f"Render timed out after {self.timeout}s, killing worker "
+                f"{worker.process.pid}"
+            )
+            self.replace(worker)
+            raise RenderTimeout(f"Render timed out after {self.timeout}s")
+
+        except asyncio.CancelledError:
+
+            # The request went away mid-render, the worker is still busy
+            self.replace(worker)
+            raise
+
+        except (EOFError, OSError) as e:
+
+            logger.error(f"Worker {worker.process.pid} failed: {e}")
+            self.replace(worker)
+            raise RuntimeError("Render worker failed")
+
+        worker.renders += 1
+
+        if self.recycle_after and worker.renders >= self.recycle_after:
+            self.recycle(worker)
+        else:
+            self.idle.put_nowait(worker)
+
+        logger.debug(
+            f"Rendered on worker {worker.process.pid} in "
+            f"{time.monotonic() - start:.3f}s"
+        )
+
+        if status != "ok":
+            raise RuntimeError(result)
+
+        return result
+
+    def replace(self, worker):
+        worker.kill()
+        self.all.remove(worker)
+        self.add_worker()
+
+    def recycle(self, worker):
+        """Retire a worker which has done its share of renders, to bound
+        the growth of its Jsonnet heap, and start a fresh one"""
+
+        logger.info(
+            f"Recycling worker {worker.process.pid} after "
+            f"{worker.renders} renders"
+        )
+
+        self.all.remove(worker)
+        self.recycled += 1
+
+        # The worker exits once its pipe closes; don't wait on the loop
+        asyncio.get_running_loop().run_in_executor(None, worker.stop)
+
+        self.add_worker()